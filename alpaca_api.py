@@ -4,7 +4,8 @@ Alpaca integration helpers based on alpaca-py.
 
 This module provides:
 - a compatibility client used by the current codebase (REST + market data),
-- a lightweight trade-updates stream hub used to wait for order events.
+- a lightweight trade-updates stream hub used to wait for order events,
+- an optional stock market-data stream (trades + minute bars) for the engine.
 """
 
 from __future__ import annotations
@@ -16,19 +17,20 @@ import threading
 import time
 from collections import OrderedDict
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, List, Optional, Set
 
 import pandas as pd
 from alpaca.common.exceptions import APIError as AlpacaAPIError
 from alpaca.data.enums import Adjustment, DataFeed
 from alpaca.data.historical import CryptoHistoricalDataClient, StockHistoricalDataClient
+from alpaca.data.live import StockDataStream
 from alpaca.data.requests import CryptoLatestTradeRequest, StockBarsRequest, StockLatestTradeRequest
 from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
 from alpaca.trading.client import TradingClient
-from alpaca.trading.enums import AssetStatus, OrderSide, OrderType, TimeInForce
-from alpaca.trading.requests import GetAssetsRequest, LimitOrderRequest, MarketOrderRequest
+from alpaca.trading.enums import AssetStatus, OrderSide, OrderType, QueryOrderStatus, TimeInForce
+from alpaca.trading.requests import GetAssetsRequest, GetCalendarRequest, GetOrdersRequest, LimitOrderRequest, MarketOrderRequest
 from alpaca.trading.stream import TradingStream
 
 
@@ -43,6 +45,16 @@ TERMINAL_ORDER_EVENTS: Set[str] = {
     "order_replace_rejected",
 }
 
+# Order status -> trade-update event used when backfilling missed events over REST.
+BACKFILL_STATUS_EVENTS: Dict[str, str] = {
+    "filled": "fill",
+    "partially_filled": "partial_fill",
+    "canceled": "canceled",
+    "expired": "expired",
+    "rejected": "rejected",
+    "done_for_day": "done_for_day",
+}
+
 
 def is_paper_base_url(base_url: str) -> bool:
     return "paper-api.alpaca.markets" in (base_url or "")
@@ -166,6 +178,10 @@ class LegacyCompatibleAlpacaClient:
     def get_asset(self, symbol_or_asset_id: str):
         return self.trading.get_asset(symbol_or_asset_id)
 
+    def get_calendar(self, start=None, end=None):
+        req = GetCalendarRequest(start=start, end=end)
+        return self.trading.get_calendar(filters=req)
+
     def submit_order(self, **kwargs):
         symbol = kwargs.get("symbol")
         side = _parse_order_side(kwargs.get("side"))
@@ -224,6 +240,22 @@ class LegacyCompatibleAlpacaClient:
         price = float(getattr(trade, "price", getattr(trade, "p", 0.0)) or 0.0)
         return SimpleNamespace(price=price, p=price)
 
+    def get_latest_trades_multi(self, symbols: List[str]) -> Dict[str, SimpleNamespace]:
+        """Latest trade for several symbols in one request; missing symbols are omitted."""
+        wanted = [symbol for symbol in dict.fromkeys(symbols) if symbol]
+        if not wanted:
+            return {}
+        req = StockLatestTradeRequest(symbol_or_symbols=wanted)
+        resp = self.stock_data.get_stock_latest_trade(req)
+        out: Dict[str, SimpleNamespace] = {}
+        for symbol in wanted:
+            trade = resp.get(symbol) if isinstance(resp, dict) else None
+            if trade is None:
+                continue
+            price = float(getattr(trade, "price", getattr(trade, "p", 0.0)) or 0.0)
+            out[symbol] = SimpleNamespace(price=price, p=price)
+        return out
+
     def get_latest_crypto_trade(self, symbol: str, _exchange: Optional[str] = None):
         req = CryptoLatestTradeRequest(symbol_or_symbols=[symbol])
         resp = self.crypto_data.get_crypto_latest_trade(req)
@@ -233,17 +265,17 @@ class LegacyCompatibleAlpacaClient:
         price = float(getattr(trade, "price", getattr(trade, "p", 0.0)) or 0.0)
         return SimpleNamespace(price=price, p=price)
 
-    def get_bars(
+    def _bars_request(
         self,
-        symbol: str,
+        symbols: List[str],
         timeframe: str,
-        start: Optional[str] = None,
-        end: Optional[str] = None,
-        adjustment: str = "raw",
-        feed: Optional[str] = None,
-    ):
+        start: Optional[str],
+        end: Optional[str],
+        adjustment: str,
+        feed: Optional[str],
+    ) -> pd.DataFrame:
         req = StockBarsRequest(
-            symbol_or_symbols=[symbol],
+            symbol_or_symbols=symbols,
             timeframe=_parse_timeframe(timeframe),
             start=pd.Timestamp(start).to_pydatetime() if start else None,
             end=pd.Timestamp(end).to_pydatetime() if end else None,
@@ -251,16 +283,50 @@ class LegacyCompatibleAlpacaClient:
             feed=_parse_stock_feed(feed),
         )
         bars = self.stock_data.get_stock_bars(req)
-        df = bars.df.copy()
-        if df.empty:
-            return BarsResult(df)
-        if isinstance(df.index, pd.MultiIndex):
-            # Index format is usually [symbol, timestamp] for multi-symbol responses.
-            if "symbol" in df.index.names:
-                df = df.xs(symbol, level="symbol")
-            else:
-                df = df.reset_index().query("symbol == @symbol").set_index("timestamp")
-        return BarsResult(df)
+        return bars.df.copy()
+
+    @staticmethod
+    def _bars_for_symbol(df: pd.DataFrame, symbol: str) -> pd.DataFrame:
+        if df.empty or not isinstance(df.index, pd.MultiIndex):
+            return df
+        # Index format is usually [symbol, timestamp] for multi-symbol responses.
+        if "symbol" in df.index.names:
+            if symbol not in df.index.get_level_values("symbol"):
+                return df.iloc[0:0].droplevel("symbol")
+            return df.xs(symbol, level="symbol")
+        return df.reset_index().query("symbol == @symbol").set_index("timestamp")
+
+    def get_bars(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        adjustment: str = "raw",
+        feed: Optional[str] = None,
+    ):
+        df = self._bars_request([symbol], timeframe, start, end, adjustment, feed)
+        return BarsResult(self._bars_for_symbol(df, symbol))
+
+    def get_bars_multi(
+        self,
+        symbols: List[str],
+        timeframe: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        adjustment: str = "raw",
+        feed: Optional[str] = None,
+    ) -> Dict[str, BarsResult]:
+        """Bars for several symbols in one request, keyed by symbol.
+
+        Every requested symbol gets an entry; symbols without data map to an
+        empty frame so callers can tell "no bars" from "not requested".
+        """
+        wanted = [symbol for symbol in dict.fromkeys(symbols) if symbol]
+        if not wanted:
+            return {}
+        df = self._bars_request(wanted, timeframe, start, end, adjustment, feed)
+        return {symbol: BarsResult(self._bars_for_symbol(df, symbol)) for symbol in wanted}
 
 
 @dataclass
@@ -271,35 +337,167 @@ class TradeUpdateEvent:
     timestamp: Optional[datetime]
     price: Optional[float]
     qty: Optional[float]
+    symbol: Optional[str] = None
+    side: Optional[str] = None
+    position_qty: Optional[float] = None
+    filled_avg_price: Optional[float] = None
     received_at: float = field(default_factory=time.time)
 
 
+def _event_from_order(order) -> Optional[TradeUpdateEvent]:
+    status = getattr(order, "status", None)
+    status = str(getattr(status, "value", status) or "").lower()
+    event_name = BACKFILL_STATUS_EVENTS.get(status)
+    order_id = str(getattr(order, "id", "") or "")
+    if not event_name or not order_id:
+        return None
+    filled_avg_price = _optional_float(getattr(order, "filled_avg_price", None))
+    side = getattr(order, "side", None)
+    return TradeUpdateEvent(
+        order_id=order_id,
+        event=event_name,
+        status=status,
+        timestamp=(
+            getattr(order, "filled_at", None)
+            or getattr(order, "canceled_at", None)
+            or getattr(order, "expired_at", None)
+            or getattr(order, "failed_at", None)
+            or getattr(order, "updated_at", None)
+        ),
+        price=filled_avg_price,
+        qty=_optional_float(getattr(order, "filled_qty", None)),
+        symbol=str(getattr(order, "symbol", "") or "") or None,
+        side=str(getattr(side, "value", side) or "").lower() or None,
+        filled_avg_price=filled_avg_price,
+    )
+
+
+def _optional_float(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _ConnectionAwareTradingStream(TradingStream):
+    """TradingStream that reports each (re)subscription and each socket close."""
+
+    def __init__(
+        self,
+        *args,
+        on_connected: Optional[Callable[[], None]] = None,
+        on_disconnected: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self._on_connected = on_connected
+        self._on_disconnected = on_disconnected
+
+    async def _subscribe_trade_updates(self) -> None:
+        await super()._subscribe_trade_updates()
+        if self._on_connected and self._trade_updates_handler:
+            self._on_connected()
+
+    async def close(self) -> None:
+        await super().close()
+        if self._on_disconnected:
+            self._on_disconnected()
+
+
 class _TradeUpdatesRunner:
-    def __init__(self, api_key: str, api_secret: str, base_url: str, logger: logging.Logger):
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        base_url: str,
+        logger: logging.Logger,
+        on_event: Optional[Callable[[TradeUpdateEvent], None]] = None,
+    ):
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = base_url
         self.paper = is_paper_base_url(base_url)
         self.logger = logger
+        self._on_event = on_event
         self._lock = threading.Lock()
         self._latest_by_order: "OrderedDict[str, TradeUpdateEvent]" = OrderedDict()
         self._waiters: Dict[str, List[threading.Event]] = {}
         self._event_ttl_sec = int(os.getenv("TRADE_UPDATES_EVENT_TTL_SEC", "3600"))
         self._max_events = int(os.getenv("TRADE_UPDATES_MAX_EVENTS", "500"))
+        self._backfill_sec = float(os.getenv("TRADE_UPDATES_BACKFILL_SEC", "900"))
         self._thread: Optional[threading.Thread] = None
         self._stop_signal = threading.Event()
+        # Set once the stream is subscribed and missed events are backfilled.
         self._stream_ready = threading.Event()
         self._stream: Optional[TradingStream] = None
+        self._rest: Optional[TradingClient] = None
+        self._disconnected_at: Optional[datetime] = None
+        self.connected_at: Optional[datetime] = None
+        self.connects = 0
+        self.backfilled = 0
 
     def _build_stream(self) -> TradingStream:
-        stream = TradingStream(
+        stream = _ConnectionAwareTradingStream(
             api_key=self.api_key,
             secret_key=self.api_secret,
             paper=self.paper,
+            on_connected=self._on_connected,
+            on_disconnected=self._on_disconnected,
         )
         stream.subscribe_trade_updates(self._on_trade_update)
         return stream
 
+    @property
+    def ready(self) -> bool:
+        return self._stream_ready.is_set()
+
+    def wait_ready(self, timeout_sec: float) -> bool:
+        return self._stream_ready.wait(timeout_sec)
+
+    def _on_connected(self) -> None:
+        # Runs on the stream's event loop; the REST backfill must not block it.
+        threading.Thread(target=self._backfill, name="trade-updates-backfill", daemon=True).start()
+
+    def _on_disconnected(self) -> None:
+        if self._stream_ready.is_set():
+            self._disconnected_at = datetime.now(timezone.utc)
+        self._stream_ready.clear()
+
+    def _backfill(self) -> None:
+        """Replay terminal order states from REST for the window the stream could not see."""
+        now = datetime.now(timezone.utc)
+        since = now - timedelta(seconds=self._backfill_sec)
+        if self._disconnected_at is not None:
+            since = min(since, self._disconnected_at - timedelta(seconds=self._backfill_sec))
+        replayed = 0
+        try:
+            if self._rest is None:
+                self._rest = TradingClient(api_key=self.api_key, secret_key=self.api_secret, paper=self.paper)
+            orders = self._rest.get_orders(
+                filter=GetOrdersRequest(status=QueryOrderStatus.ALL, after=since, limit=500, nested=False)
+            )
+            for order in orders or []:
+                event = _event_from_order(order)
+                if event is None:
+                    continue
+                with self._lock:
+                    known = self._latest_by_order.get(event.order_id)
+                if known is not None and known.event in TERMINAL_ORDER_EVENTS:
+                    continue
+                self._record(event)
+                replayed += 1
+        except Exception as exc:
+            self.logger.warning(f"[ALPACA_STREAM] trade_updates backfill failed: {exc}")
+        self.connects += 1
+        self.backfilled += replayed
+        self.connected_at = now
+        self._disconnected_at = None
+        self._stream_ready.set()
+        if replayed:
+            self.logger.info(f"[ALPACA_STREAM] Backfilled {replayed} order event(s) missed while disconnected.")
+
     async def _on_trade_update(self, update):
         order = getattr(update, "order", None)
         order_id = str(getattr(order, "id", "") or "")
@@ -330,6 +528,22 @@ class _TradeUpdatesRunner:
                 qty = float(raw_qty)
             except Exception:
                 qty = None
+        position_qty = None
+        raw_position_qty = getattr(update, "position_qty", None)
+        if raw_position_qty is not None:
+            try:
+                position_qty = float(raw_position_qty)
+            except Exception:
+                position_qty = None
+        filled_avg_price = None
+        raw_avg_price = getattr(order, "filled_avg_price", None)
+        if raw_avg_price is not None:
+            try:
+                filled_avg_price = float(raw_avg_price)
+            except Exception:
+                filled_avg_price = None
+        side = getattr(order, "side", None)
+        side = str(getattr(side, "value", side) or "").lower() or None
 
         payload = TradeUpdateEvent(
             order_id=order_id,
@@ -338,7 +552,15 @@ class _TradeUpdatesRunner:
             timestamp=ts,
             price=price,
             qty=qty,
+            symbol=str(getattr(order, "symbol", "") or "") or None,
+            side=side,
+            position_qty=position_qty,
+            filled_avg_price=filled_avg_price,
         )
+        self._record(payload)
+
+    def _record(self, payload: TradeUpdateEvent) -> None:
+        order_id = payload.order_id
         with self._lock:
             self._latest_by_order[order_id] = payload
             self._latest_by_order.move_to_end(order_id)
@@ -346,6 +568,11 @@ class _TradeUpdatesRunner:
             waiters = list(self._waiters.get(order_id, []))
         for waiter in waiters:
             waiter.set()
+        if self._on_event:
+            try:
+                self._on_event(payload)
+            except Exception as exc:
+                self.logger.warning(f"[ALPACA_STREAM] trade_updates listener failed: {exc}")
 
     def start(self) -> None:
         with self._lock:
@@ -360,12 +587,11 @@ class _TradeUpdatesRunner:
         while not self._stop_signal.is_set():
             try:
                 self._stream = self._build_stream()
-                self._stream_ready.set()
                 self._stream.run()
             except Exception as exc:
                 self.logger.error(f"[ALPACA_STREAM] trade_updates stream error: {exc}")
             finally:
-                self._stream_ready.clear()
+                self._on_disconnected()
                 self._stream = None
             if not self._stop_signal.is_set():
                 time.sleep(2)
@@ -442,6 +668,7 @@ class TradeUpdatesHub:
         self.logger = logger or logging.getLogger(__name__)
         self._lock = threading.Lock()
         self._runners: Dict[str, _TradeUpdatesRunner] = {}
+        self._listeners: List[Callable[[str, TradeUpdateEvent], None]] = []
 
     def _key(self, api_key: str, base_url: str) -> str:
         return f"{api_key}:{base_url}"
@@ -451,10 +678,61 @@ class TradeUpdatesHub:
         with self._lock:
             runner = self._runners.get(cache_key)
             if runner is None:
-                runner = _TradeUpdatesRunner(api_key, api_secret, base_url, self.logger)
+                runner = _TradeUpdatesRunner(
+                    api_key,
+                    api_secret,
+                    base_url,
+                    self.logger,
+                    on_event=lambda event: self._dispatch(cache_key, event),
+                )
                 self._runners[cache_key] = runner
         return runner
 
+    def add_listener(self, callback: Callable[[str, TradeUpdateEvent], None]) -> None:
+        """Call ``callback(account_key, event)`` for every trade update of every account."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _dispatch(self, account_key: str, event: TradeUpdateEvent) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(account_key, event)
+
+    def ensure_stream(self, api_key: str, api_secret: str, base_url: str) -> str:
+        """Start the account's trade-updates stream if needed; returns its account key."""
+        self._get_runner(api_key, api_secret, base_url).start()
+        return self._key(api_key, base_url)
+
+    def warm_up(self, accounts) -> int:
+        """Start streams for ``(api_key, api_secret, base_url)`` accounts; returns how many were new."""
+        started = 0
+        for api_key, api_secret, base_url in accounts:
+            with self._lock:
+                known = self._key(api_key, base_url) in self._runners
+            self.ensure_stream(api_key, api_secret, base_url)
+            started += 0 if known else 1
+        return started
+
+    def is_ready(self, api_key: str, base_url: str) -> bool:
+        with self._lock:
+            runner = self._runners.get(self._key(api_key, base_url))
+        return bool(runner and runner.ready)
+
+    def readiness(self) -> List[Dict]:
+        with self._lock:
+            runners = list(self._runners.values())
+        return [
+            {
+                "account": f"{runner.api_key[:4]}...{runner.api_key[-2:]}",
+                "ready": runner.ready,
+                "connected_at": runner.connected_at.isoformat() if runner.connected_at else None,
+                "connects": runner.connects,
+                "backfilled_events": runner.backfilled,
+            }
+            for runner in runners
+        ]
+
     def wait_for_order(
         self,
         api_key: str,
@@ -471,3 +749,161 @@ class TradeUpdatesHub:
             runners = list(self._runners.values())
         for runner in runners:
             runner.stop()
+
+
+def _stream_timestamp(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    try:
+        ts = pd.Timestamp(value)
+    except Exception:
+        return None
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.to_pydatetime()
+
+
+class _ConnectionAwareStockDataStream(StockDataStream):
+    """StockDataStream that reports every (re)connection.
+
+    alpaca-py reconnects internally, and messages sent while the socket was down
+    are lost. Subscriptions are re-sent right after each successful auth, so
+    that hook tells the consumer where continuous coverage starts again.
+    """
+
+    def __init__(self, *args, on_connected: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_connected = on_connected
+
+    async def _send_subscribe_msg(self) -> None:
+        await super()._send_subscribe_msg()
+        if self._on_connected:
+            self._on_connected()
+
+
+class MarketDataStream:
+    """Background stock data websocket for trades and minute bars.
+
+    Runs on its own thread and rebuilds the stream after errors the same way
+    the trade-updates runner does. Messages are handed to plain callbacks:
+    ``on_trade(symbol, price, ts)``, ``on_bar(symbol, ts, open, high, low,
+    close, volume)`` (regular and updated minute bars) and ``on_connected()``.
+    Changing the symbol set restarts the stream with the new subscriptions.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        feed: Optional[str],
+        logger: logging.Logger,
+        on_trade: Optional[Callable] = None,
+        on_bar: Optional[Callable] = None,
+        on_connected: Optional[Callable[[], None]] = None,
+        url_override: Optional[str] = None,
+    ):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.feed = _parse_stock_feed(feed) or DataFeed.IEX
+        self.logger = logger
+        self.on_trade = on_trade
+        self.on_bar = on_bar
+        self.on_connected = on_connected
+        self.url_override = url_override or os.getenv("ALPACA_DATA_STREAM_URL") or None
+        self._lock = threading.Lock()
+        self._symbols: tuple = ()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_signal = threading.Event()
+        self._stream: Optional[StockDataStream] = None
+
+    @property
+    def symbols(self) -> tuple:
+        return self._symbols
+
+    def _build_stream(self) -> StockDataStream:
+        stream = _ConnectionAwareStockDataStream(
+            api_key=self.api_key,
+            secret_key=self.api_secret,
+            raw_data=True,
+            feed=self.feed,
+            url_override=self.url_override,
+            on_connected=self.on_connected,
+        )
+        symbols = self._symbols
+        stream.subscribe_trades(self._on_trade_msg, *symbols)
+        stream.subscribe_bars(self._on_bar_msg, *symbols)
+        stream.subscribe_updated_bars(self._on_bar_msg, *symbols)
+        return stream
+
+    async def _on_trade_msg(self, msg):
+        if not self.on_trade:
+            return
+        try:
+            price = float(msg.get("p") or 0.0)
+        except (TypeError, ValueError):
+            return
+        if price > 0:
+            self.on_trade(str(msg.get("S") or "").upper(), price, _stream_timestamp(msg.get("t")))
+
+    async def _on_bar_msg(self, msg):
+        if not self.on_bar:
+            return
+        ts = _stream_timestamp(msg.get("t"))
+        if ts is None:
+            return
+        try:
+            values = [float(msg.get(key) or 0.0) for key in ("o", "h", "l", "c", "v")]
+        except (TypeError, ValueError):
+            return
+        self.on_bar(str(msg.get("S") or "").upper(), ts, *values)
+
+    def set_symbols(self, symbols) -> None:
+        wanted = tuple(sorted({str(symbol).upper() for symbol in symbols if symbol}))
+        with self._lock:
+            if wanted == self._symbols:
+                return
+            self._symbols = wanted
+            stream = self._stream
+        if not wanted:
+            self.stop()
+            return
+        if stream is not None:
+            # The run loop rebuilds the stream with the new subscriptions.
+            self._stop_stream(stream)
+        self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if not self._symbols:
+                return
+            self._stop_signal.clear()
+            self._thread = threading.Thread(target=self._run_forever, name="alpaca-market-data", daemon=True)
+            self._thread.start()
+
+    def _run_forever(self) -> None:
+        while not self._stop_signal.is_set():
+            try:
+                self._stream = self._build_stream()
+                self._stream.run()
+            except Exception as exc:
+                self.logger.error(f"[ALPACA_STREAM] market data stream error: {exc}")
+            finally:
+                self._stream = None
+            if not self._stop_signal.is_set():
+                time.sleep(2)
+
+    @staticmethod
+    def _stop_stream(stream: StockDataStream) -> None:
+        try:
+            stream.stop()
+        except Exception:
+            pass
+
+    def stop(self) -> None:
+        self._stop_signal.set()
+        stream = self._stream
+        if stream:
+            self._stop_stream(stream)
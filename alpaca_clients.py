@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Process-wide pool of authenticated Alpaca clients.
+
+Building a ``LegacyCompatibleAlpacaClient`` means two Fernet decrypts plus new
+TradingClient/data clients, each with its own ``requests.Session`` (and so
+new TLS connections on first use). The engine did that every tick, the bot on
+every webhook and ``trade_db`` for every close. ``AlpacaClientRegistry``
+builds one client per credential set and hands the same instance (and its
+keep-alive sessions) to every caller:
+
+* Users are looked up by a fingerprint of their *encrypted* key fields, so a
+  hit needs no decryption. Saving new keys changes the fingerprint; the next
+  lookup decrypts once, builds a new client and drops the old one if no other
+  user still shares it.
+* Clients themselves are keyed by a hash of the plaintext credentials and base
+  URL, so users sharing an Alpaca account share one client.
+* ``stats()`` reports lookups, builds and the urllib3 pool counters of the
+  pooled sessions (HTTP requests sent vs. connections opened).
+
+``trade_updates`` is the process-wide ``TradeUpdatesHub`` for the same
+reason: Alpaca allows one trade_updates socket per account, so the bot's
+order paths and ``trade_db``'s fill waits share one stream per account
+instead of each module opening its own.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from alpaca_api import LegacyCompatibleAlpacaClient, TradeUpdatesHub
+from utils import decrypt_data
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(str(part or "") for part in parts).encode("utf-8")).hexdigest()
+
+
+class AlpacaClientRegistry:
+    def __init__(self, max_clients: int = 32):
+        self.max_clients = max(1, int(max_clients))
+        self._lock = threading.Lock()
+        # user_id -> (encrypted fingerprint, api_key, api_secret)
+        self._users: Dict[int, Tuple[str, str, str]] = {}
+        self._clients: "OrderedDict[str, LegacyCompatibleAlpacaClient]" = OrderedDict()
+        self._counters = {"lookups": 0, "hits": 0, "builds": 0, "decrypts": 0, "invalidations": 0}
+
+    def credentials(self, user) -> Optional[Tuple[str, str]]:
+        """Decrypted ``(api_key, api_secret)`` for ``user``; None when not configured."""
+        fingerprint = _digest(user.encrypted_alpaca_key, user.encrypted_alpaca_secret)
+        with self._lock:
+            cached = self._users.get(user.id)
+            if cached and cached[0] == fingerprint:
+                return cached[1], cached[2]
+        api_key = decrypt_data(user.encrypted_alpaca_key)
+        api_secret = decrypt_data(user.encrypted_alpaca_secret)
+        with self._lock:
+            self._counters["decrypts"] += 1
+            previous = self._users.pop(user.id, None)
+            if api_key and api_secret:
+                self._users[user.id] = (fingerprint, api_key, api_secret)
+            if previous:
+                self._counters["invalidations"] += 1
+                self._drop_unshared(previous[1], previous[2])
+        if not api_key or not api_secret:
+            return None
+        return api_key, api_secret
+
+    def client_for_user(self, user, base_url: str) -> Optional[LegacyCompatibleAlpacaClient]:
+        creds = self.credentials(user)
+        if not creds:
+            return None
+        return self.client_for_keys(creds[0], creds[1], base_url)
+
+    def client_for_keys(self, api_key: str, api_secret: str, base_url: str) -> LegacyCompatibleAlpacaClient:
+        key = _digest(api_key, api_secret, base_url)
+        with self._lock:
+            self._counters["lookups"] += 1
+            client = self._clients.get(key)
+            if client is not None:
+                self._counters["hits"] += 1
+                self._clients.move_to_end(key)
+                return client
+        client = LegacyCompatibleAlpacaClient(api_key, api_secret, base_url)
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                return existing
+            self._counters["builds"] += 1
+            self._clients[key] = client
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        return client
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Forget one user's (or every) cached credentials and unshared clients."""
+        with self._lock:
+            targets = list(self._users) if user_id is None else [user_id]
+            for uid in targets:
+                previous = self._users.pop(uid, None)
+                if previous:
+                    self._counters["invalidations"] += 1
+                    self._drop_unshared(previous[1], previous[2])
+            if user_id is None:
+                self._clients.clear()
+
+    def _drop_unshared(self, api_key: str, api_secret: str) -> None:
+        # Caller holds the lock.
+        if any(entry[1] == api_key and entry[2] == api_secret for entry in self._users.values()):
+            return
+        for key, client in list(self._clients.items()):
+            if client.api_key == api_key and client.api_secret == api_secret:
+                del self._clients[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            clients = list(self._clients.values())
+            stats["clients"] = len(clients)
+            stats["users"] = len(self._users)
+        http_requests = 0
+        connections = 0
+        for client in clients:
+            for rest in (client.trading, client.stock_data, client.crypto_data):
+                session = getattr(rest, "_session", None)
+                for adapter in getattr(session, "adapters", {}).values():
+                    pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+                    if pools is None:
+                        continue
+                    # urllib3's RecentlyUsedContainer refuses plain iteration.
+                    for pool_key in pools.keys():
+                        pool = pools.get(pool_key)
+                        http_requests += getattr(pool, "num_requests", 0)
+                        connections += getattr(pool, "num_connections", 0)
+        stats["http_requests"] = http_requests
+        stats["http_connections"] = connections
+        stats["http_connection_reuse"] = round(1.0 - connections / http_requests, 4) if http_requests else None
+        return stats
+
+
+alpaca_clients = AlpacaClientRegistry()
+trade_updates = TradeUpdatesHub(logger=logging.getLogger("trades_logger"))
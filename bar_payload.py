@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Compact, checksummed OHLCV bar payloads for remote optimizer jobs.
+
+Remote jobs used to carry their bars as a CSV string inside the job JSON, so
+every ``remote_jobs/next`` response shipped megabytes of text that the worker
+wrote back to disk and the optimizer parsed again. Bars are now stored once
+as a compressed numpy ``.npz`` (int64 UTC nanosecond timestamps plus float64
+open/high/low/close/volume columns) named after the SHA-256 of those arrays:
+
+* The digest depends only on the bar values, so re-fetching the same symbol
+  and window yields the same name and workers that cached it download nothing.
+* ``load_bars_npz`` recomputes the digest, so a truncated or corrupted
+  download is rejected instead of optimized.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+PAYLOAD_VERSION = b"bars-npz-v1"
+BAR_COLUMNS = ("open", "high", "low", "close", "volume")
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_bars_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(str(value or "")))
+
+
+def bars_to_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Arrays for a frame indexed by timestamp (or with a ``timestamp`` column)."""
+    frame = df.set_index("timestamp") if "timestamp" in df.columns else df
+    index = pd.DatetimeIndex(pd.to_datetime(frame.index, utc=True)).as_unit("ns")
+    order = np.argsort(index.asi8, kind="stable")
+    arrays = {"timestamp": np.ascontiguousarray(index.asi8[order], dtype="<i8")}
+    for column in BAR_COLUMNS:
+        values = frame[column].to_numpy(dtype="float64") if column in frame.columns else np.zeros(len(frame))
+        arrays[column] = np.ascontiguousarray(values[order], dtype="<f8")
+    return arrays
+
+
+def bars_digest(arrays: Dict[str, np.ndarray]) -> str:
+    digest = hashlib.sha256(PAYLOAD_VERSION)
+    for column in ("timestamp",) + BAR_COLUMNS:
+        digest.update(column.encode("ascii"))
+        digest.update(arrays[column].tobytes())
+    return digest.hexdigest()
+
+
+def write_bars_npz(df: pd.DataFrame, directory: str) -> Tuple[str, str, int]:
+    """Store ``df`` as ``<digest>.npz`` in ``directory``; returns ``(digest, path, rows)``."""
+    arrays = bars_to_arrays(df)
+    digest = bars_digest(arrays)
+    path = os.path.join(directory, f"{digest}.npz")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    return digest, path, len(arrays["timestamp"])
+
+
+def load_bars_npz(path, expected_digest: Optional[str] = None) -> pd.DataFrame:
+    """Frame indexed by UTC timestamp; raises ValueError if the checksum does not match."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {column: data[column] for column in ("timestamp",) + BAR_COLUMNS}
+    digest = bars_digest(arrays)
+    if expected_digest is None:
+        name = os.path.basename(str(path))[:-4]
+        expected_digest = name if is_bars_digest(name) else None
+    if expected_digest is not None and digest != expected_digest:
+        raise ValueError(f"Bar payload checksum mismatch for {path}: expected {expected_digest}, got {digest}")
+    index = pd.to_datetime(arrays["timestamp"], utc=True)
+    index.name = "timestamp"
+    return pd.DataFrame({column: arrays[column] for column in BAR_COLUMNS}, index=index)
+
+
+def read_bars_csv(path) -> pd.DataFrame:
+    """Legacy ``timestamp,open,high,low,close[,volume]`` bars file as a frame."""
+    df = pd.read_csv(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    return df.set_index("timestamp")
+
+
+def bars_to_csv(df: pd.DataFrame) -> str:
+    out = df.rename_axis("timestamp").reset_index()
+    return out[["timestamp", *BAR_COLUMNS]].to_csv(index=False)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Rolling per-(symbol, fetch timeframe, feed) bar store for the live engine.
+
+The local strategy engine needs the last few hundred closed bars of every
+universe symbol on every tick, yet at most one new bar closes between ticks.
+Instead of re-downloading the whole lookback window each time, the store keeps
+the history in memory, persists it under ``instance/bar_cache/`` and only asks
+Alpaca for bars newer than the last cached timestamp (minus a small overlap so
+late revisions of the most recent bars are still picked up).
+
+Files per key:
+
+* ``<SYMBOL>__<TF>__<FEED>.csv`` - append-only bar rows. Duplicate timestamps
+  are resolved on load (last write wins) and the file is compacted once it
+  grows well past the in-memory window.
+* ``<SYMBOL>__<TF>__<FEED>.meta.json`` - the oldest timestamp the cached
+  history is known to cover, so a weekend or holiday at the start of the
+  window is not mistaken for missing data.
+
+Only closed bars are stored. Disk problems are logged and degrade to the
+in-memory copy; they never raise into the trading loop.
+
+Full (cold-start) fetches go through the shared ``BarWarehouse`` when one is
+attached, so a restart or a new universe symbol reuses history the optimizer
+or the dashboard already downloaded and only the uncovered tail hits Alpaca.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from bar_warehouse import alpaca_fetcher, create_bar_warehouse
+from misc.pine_optimizer import timeframe_seconds
+
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def _safe_token(value: str) -> str:
+    cleaned = re.sub(r"[^A-Za-z0-9._-]", "", str(value or ""))
+    return cleaned or "NA"
+
+
+def _to_utc(value) -> datetime:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.tz_convert("UTC").to_pydatetime()
+
+
+def empty_bars() -> pd.DataFrame:
+    index = pd.DatetimeIndex([], tz="UTC", name="timestamp")
+    return pd.DataFrame({col: pd.Series([], dtype=float, index=index) for col in BAR_COLUMNS})
+
+
+def normalize_bars(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Return OHLCV float bars on a sorted, unique, UTC ``DatetimeIndex``."""
+    if df is None or df.empty:
+        return empty_bars()
+    out = df.copy()
+    if "volume" not in out.columns:
+        out["volume"] = 0.0
+    out = out[BAR_COLUMNS].astype(float)
+    out.index = pd.to_datetime(out.index, utc=True)
+    out.index.name = "timestamp"
+    out = out[~out.index.duplicated(keep="last")]
+    return out.sort_index()
+
+
+@dataclass
+class _BarSeries:
+    frame: pd.DataFrame = field(default_factory=empty_bars)
+    covered_from: Optional[datetime] = None
+    version: int = 0
+    file_rows: int = 0
+
+
+class BarStore:
+    def __init__(self, base_dir: str, logger=None, overlap_bars: int = 5, persist: bool = True, warehouse=None):
+        self.base_dir = base_dir
+        self.warehouse = warehouse
+        self.logger = logger
+        self.overlap_bars = max(0, int(overlap_bars))
+        self.persist = bool(persist)
+        self._lock = threading.RLock()
+        self._series: Dict[Tuple[str, str, str], _BarSeries] = {}
+        self.stats = {"full_fetches": 0, "incremental_fetches": 0, "rows_fetched": 0, "warehouse_seeds": 0}
+        if self.persist:
+            try:
+                os.makedirs(self.base_dir, exist_ok=True)
+            except Exception as exc:
+                self._warn("failed to create bar cache dir %s: %s", self.base_dir, exc)
+
+    # -- paths -----------------------------------------------------------------
+    @staticmethod
+    def _key(symbol: str, fetch_tf: str, feed: str) -> Tuple[str, str, str]:
+        return (str(symbol or "").upper(), str(fetch_tf), str(feed or "").lower())
+
+    def _stem(self, key: Tuple[str, str, str]) -> str:
+        return os.path.join(self.base_dir, "__".join(_safe_token(part) for part in key))
+
+    def _warn(self, msg, *args):
+        if self.logger:
+            self.logger.warning("[BAR_STORE] " + msg, *args)
+
+    # -- persistence -----------------------------------------------------------
+    def _load(self, key: Tuple[str, str, str]) -> _BarSeries:
+        series = self._series.get(key)
+        if series is not None:
+            return series
+        series = _BarSeries()
+        if self.persist:
+            stem = self._stem(key)
+            try:
+                if os.path.exists(f"{stem}.meta.json"):
+                    with open(f"{stem}.meta.json", "r", encoding="utf-8") as fh:
+                        meta = json.load(fh)
+                    if meta.get("covered_from"):
+                        series.covered_from = _to_utc(meta["covered_from"])
+                if series.covered_from is not None and os.path.exists(f"{stem}.csv"):
+                    raw = pd.read_csv(f"{stem}.csv", index_col="timestamp")
+                    series.file_rows = len(raw)
+                    series.frame = normalize_bars(raw)
+            except Exception as exc:
+                self._warn("failed to load %s: %s", stem, exc)
+                series = _BarSeries()
+        self._series[key] = series
+        return series
+
+    def _rewrite(self, key: Tuple[str, str, str], series: _BarSeries) -> None:
+        if not self.persist:
+            return
+        stem = self._stem(key)
+        try:
+            tmp_csv = f"{stem}.csv.tmp"
+            series.frame.to_csv(tmp_csv, index_label="timestamp")
+            os.replace(tmp_csv, f"{stem}.csv")
+            tmp_meta = f"{stem}.meta.json.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as fh:
+                json.dump({"covered_from": series.covered_from.isoformat() if series.covered_from else None}, fh)
+            os.replace(tmp_meta, f"{stem}.meta.json")
+            series.file_rows = len(series.frame)
+        except Exception as exc:
+            self._warn("failed to write %s: %s", stem, exc)
+
+    def _append(self, key: Tuple[str, str, str], series: _BarSeries, rows: pd.DataFrame) -> None:
+        if not self.persist or rows.empty:
+            return
+        if series.file_rows > 2 * len(series.frame) + 1000:
+            self._rewrite(key, series)
+            return
+        stem = self._stem(key)
+        try:
+            rows.to_csv(f"{stem}.csv", mode="a", header=False)
+            series.file_rows += len(rows)
+        except Exception as exc:
+            self._warn("failed to append %s: %s", stem, exc)
+
+    # -- fetch planning --------------------------------------------------------
+    def plan_fetch(self, symbol: str, fetch_tf: str, feed: str, start: datetime) -> Tuple[datetime, bool]:
+        """Return ``(request_start, full)`` for the next Alpaca request of a key.
+
+        A full request is needed when nothing is cached yet or the window now
+        starts before the cached coverage; otherwise only the tail after the
+        last cached bar (minus the overlap) is requested.
+        """
+        key = self._key(symbol, fetch_tf, feed)
+        with self._lock:
+            series = self._load(key)
+            if series.covered_from is None or series.frame.empty or start < series.covered_from:
+                return start, True
+            last = series.frame.index[-1].to_pydatetime()
+        overlap = timedelta(seconds=timeframe_seconds(fetch_tf) * self.overlap_bars)
+        return max(start, last - overlap), False
+
+    def ingest(
+        self,
+        symbol: str,
+        fetch_tf: str,
+        feed: str,
+        bars: Optional[pd.DataFrame],
+        request_start: datetime,
+        window_start: datetime,
+        now: datetime,
+        full: bool,
+    ) -> None:
+        """Merge bars returned for ``[request_start, now]`` into the store."""
+        key = self._key(symbol, fetch_tf, feed)
+        fresh = normalize_bars(bars)
+        bar_delta = pd.Timedelta(seconds=timeframe_seconds(fetch_tf))
+        fresh = fresh[fresh.index + bar_delta <= pd.Timestamp(now)]
+        request_ts = pd.Timestamp(request_start)
+        with self._lock:
+            series = self._load(key)
+            self.stats["full_fetches" if full else "incremental_fetches"] += 1
+            self.stats["rows_fetched"] += len(fresh)
+            if full:
+                series.frame = fresh
+                series.covered_from = _to_utc(request_start)
+                series.version += 1
+                self._rewrite(key, series)
+                return
+            existing_tail = series.frame[series.frame.index >= request_ts]
+            if fresh.equals(existing_tail):
+                self._trim(key, series, window_start)
+                return
+            changed = fresh[~fresh.index.isin(existing_tail.index)]
+            overlap = fresh[fresh.index.isin(existing_tail.index)]
+            if not overlap.empty:
+                revised = overlap.ne(existing_tail.loc[overlap.index]).any(axis=1)
+                changed = pd.concat([overlap[revised], changed])
+            series.frame = pd.concat([series.frame[series.frame.index < request_ts], fresh])
+            series.version += 1
+            self._trim(key, series, window_start)
+            self._append(key, series, changed)
+
+    def _trim(self, key: Tuple[str, str, str], series: _BarSeries, window_start: datetime) -> None:
+        # Drop history older than the window once it exceeds a day of slack, so
+        # memory and the on-disk file stay bounded as the window slides forward.
+        cutoff = pd.Timestamp(window_start)
+        if series.frame.empty or series.frame.index[0] >= cutoff - pd.Timedelta(days=1):
+            return
+        series.frame = series.frame[series.frame.index >= cutoff]
+        series.covered_from = _to_utc(window_start)
+        series.version += 1
+        self._rewrite(key, series)
+
+    def window(self, symbol: str, fetch_tf: str, feed: str, start: datetime) -> Tuple[pd.DataFrame, int]:
+        """Return ``(bars since start, version)`` from memory without any request."""
+        key = self._key(symbol, fetch_tf, feed)
+        with self._lock:
+            series = self._load(key)
+            frame = series.frame
+            version = series.version
+        return frame[frame.index >= pd.Timestamp(start)], version
+
+    def fetch(self, api, symbol: str, fetch_tf: str, feed: str, start: datetime, now: datetime) -> Tuple[pd.DataFrame, int]:
+        """Top up a key from Alpaca and return ``(bars since start, version)``."""
+        request_start, full = self.plan_fetch(symbol, fetch_tf, feed, start)
+        bars = None
+        if full and self.warehouse is not None:
+            try:
+                bars = self.warehouse.ensure(alpaca_fetcher(api), symbol, fetch_tf, feed, request_start, now, now=now)
+                with self._lock:
+                    self.stats["warehouse_seeds"] += 1
+            except Exception as exc:
+                self._warn("warehouse seed failed for %s %s, fetching directly: %s", symbol, fetch_tf, exc)
+        if bars is None:
+            bars = api.get_bars(
+                symbol,
+                fetch_tf,
+                start=request_start.isoformat().replace("+00:00", "Z"),
+                end=now.isoformat().replace("+00:00", "Z"),
+                adjustment="raw",
+                feed=feed,
+            ).df
+        self.ingest(symbol, fetch_tf, feed, bars, request_start, start, now, full)
+        return self.window(symbol, fetch_tf, feed, start)
+
+
+def create_bar_store(instance_path: str, logger=None) -> Optional[BarStore]:
+    if os.getenv("LOCAL_STRATEGY_BAR_CACHE_ENABLED", "true").strip().lower() not in ("1", "true", "yes", "y", "on"):
+        return None
+    base_dir = os.getenv("LOCAL_STRATEGY_BAR_CACHE_DIR", os.path.join(instance_path, "bar_cache"))
+    try:
+        overlap_bars = max(0, int(os.getenv("LOCAL_STRATEGY_BAR_CACHE_OVERLAP_BARS", "5")))
+    except (TypeError, ValueError):
+        overlap_bars = 5
+    persist = os.getenv("LOCAL_STRATEGY_BAR_CACHE_PERSIST", "true").strip().lower() in ("1", "true", "yes", "y", "on")
+    return BarStore(base_dir=base_dir, logger=logger, overlap_bars=overlap_bars, persist=persist,
+                    warehouse=create_bar_warehouse(instance_path, logger))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Shared on-disk warehouse of historical Alpaca bars.
+
+The optimizer, the dashboard's remote-job bar preparation and the live
+engine's cold-start warmup used to download the same history independently,
+and nothing was reused between optimizer runs. ``BarWarehouse`` keeps one
+copy per (feed, symbol, timeframe) under ``instance/bar_warehouse/``:
+
+* ``<FEED>/<SYMBOL>/<TF>/<YYYY-MM-DD>.npy`` - the closed bars of one UTC day
+  as a structured array (int64 ns timestamp plus float64 OHLCV fields), which
+  loads without any parsing.
+* ``<FEED>/<SYMBOL>/<TF>/coverage.json`` - the time ranges already fetched
+  from Alpaca. Days with no bars (weekends, holidays) are covered too, so
+  they are not mistaken for gaps.
+
+``ensure`` compares a requested range with the coverage, fetches only the
+missing ranges and returns the bars from disk; a fully covered range needs no
+network call (and no credentials - the fetcher is only called for gaps).
+Only bars that had closed at fetch time are stored, and the last
+``settle_bars`` closed bars are stored but not marked covered: Alpaca may
+publish the latest bar late or revise it, so a range ending near "now" is
+re-fetched from there on the next call instead of keeping a permanent hole.
+``store`` records bars fetched elsewhere (the engine's batched warmup) under
+the same rules.
+
+Writes are atomic per file. Two processes topping up the same key at once
+can lose one coverage update, which only costs a refetch of that range.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+BAR_COLUMNS = ("open", "high", "low", "close", "volume")
+_TF_SECONDS = {"Min": 60, "Hour": 3600, "Day": 86400, "Week": 604800}
+PARTITION_DTYPE = np.dtype([("timestamp", "<i8")] + [(col, "<f8") for col in BAR_COLUMNS])
+
+# fetcher(symbol, timeframe, feed, start, end) -> bars indexed by timestamp
+Fetcher = Callable[[str, str, str, datetime, datetime], pd.DataFrame]
+
+
+def _safe_token(value: str) -> str:
+    cleaned = re.sub(r"[^A-Za-z0-9._-]", "", str(value or ""))
+    return cleaned or "NA"
+
+
+def _utc(value) -> datetime:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.tz_convert("UTC").to_pydatetime()
+
+
+def bar_seconds(timeframe: str) -> int:
+    m = re.fullmatch(r"(\d+)(Min|Hour|Day|Week)", str(timeframe or ""))
+    if not m:
+        raise ValueError(f"Unsupported warehouse timeframe: {timeframe}")
+    return int(m.group(1)) * _TF_SECONDS[m.group(2)]
+
+
+def _empty() -> pd.DataFrame:
+    index = pd.DatetimeIndex([], tz="UTC", name="timestamp")
+    return pd.DataFrame({col: pd.Series([], dtype=float, index=index) for col in BAR_COLUMNS})
+
+
+def _normalize(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    if df is None or df.empty:
+        return _empty()
+    out = df.set_index("timestamp") if "timestamp" in df.columns else df.copy()
+    if "volume" not in out.columns:
+        out["volume"] = 0.0
+    out = out[list(BAR_COLUMNS)].astype(float)
+    out.index = pd.DatetimeIndex(pd.to_datetime(out.index, utc=True)).as_unit("ns")
+    out.index.name = "timestamp"
+    out = out[~out.index.duplicated(keep="last")]
+    return out.sort_index()
+
+
+def merge_intervals(intervals: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    merged: List[Tuple[datetime, datetime]] = []
+    for start, end in sorted(item for item in intervals if item[0] < item[1]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(start: datetime, end: datetime, covered: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    gaps = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class BarWarehouse:
+    def __init__(self, base_dir: str, logger=None, settle_bars: int = 5):
+        self.base_dir = base_dir
+        self.logger = logger
+        self.settle_bars = max(0, int(settle_bars))
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self.stats = {"reads": 0, "fetches": 0, "rows_fetched": 0, "partitions_read": 0}
+
+    # -- paths -----------------------------------------------------------------
+    @staticmethod
+    def _key(symbol: str, timeframe: str, feed: str) -> Tuple[str, str, str]:
+        return (str(feed or "").lower(), str(symbol or "").upper(), str(timeframe))
+
+    def _dir(self, key: Tuple[str, str, str]) -> str:
+        return os.path.join(self.base_dir, *(_safe_token(part) for part in key))
+
+    def _key_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _warn(self, msg, *args):
+        if self.logger:
+            self.logger.warning("[BAR_WAREHOUSE] " + msg, *args)
+
+    # -- coverage --------------------------------------------------------------
+    def coverage(self, symbol: str, timeframe: str, feed: str) -> List[Tuple[datetime, datetime]]:
+        path = os.path.join(self._dir(self._key(symbol, timeframe, feed)), "coverage.json")
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            return merge_intervals([(_utc(start), _utc(end)) for start, end in raw.get("intervals", [])])
+        except FileNotFoundError:
+            return []
+        except Exception as exc:
+            self._warn("unreadable coverage %s, treating as empty: %s", path, exc)
+            return []
+
+    def _add_coverage(self, key: Tuple[str, str, str], start: datetime, end: datetime) -> None:
+        if start >= end:
+            return
+        symbol_dir = self._dir(key)
+        # Re-read right before writing so another process's update is kept.
+        intervals = merge_intervals(self.coverage(key[1], key[2], key[0]) + [(start, end)])
+        payload = {"intervals": [[a.isoformat(), b.isoformat()] for a, b in intervals]}
+        self._atomic_write(os.path.join(symbol_dir, "coverage.json"), json.dumps(payload).encode("utf-8"))
+
+    def gaps(self, symbol: str, timeframe: str, feed: str, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """Sub-ranges of ``[start, end)`` not yet fetched into the warehouse."""
+        return subtract_intervals(_utc(start), _utc(end), self.coverage(symbol, timeframe, feed))
+
+    # -- partitions ------------------------------------------------------------
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _frame(records: np.ndarray) -> pd.DataFrame:
+        stamps = np.ascontiguousarray(records["timestamp"]).view("M8[ns]")
+        index = pd.DatetimeIndex(stamps, name="timestamp").tz_localize("UTC")
+        return pd.DataFrame({col: np.ascontiguousarray(records[col]) for col in BAR_COLUMNS}, index=index)
+
+    def _read_partition(self, path: str) -> pd.DataFrame:
+        try:
+            return self._frame(np.load(path, allow_pickle=False))
+        except FileNotFoundError:
+            return _empty()
+
+    def _write_partitions(self, key: Tuple[str, str, str], bars: pd.DataFrame) -> None:
+        symbol_dir = self._dir(key)
+        os.makedirs(symbol_dir, exist_ok=True)
+        for day, rows in bars.groupby(bars.index.normalize()):
+            path = os.path.join(symbol_dir, f"{day.strftime('%Y-%m-%d')}.npy")
+            merged = _normalize(pd.concat([self._read_partition(path), rows]))
+            records = np.empty(len(merged), dtype=PARTITION_DTYPE)
+            records["timestamp"] = merged.index.asi8
+            for col in BAR_COLUMNS:
+                records[col] = merged[col].to_numpy(dtype="float64")
+            fd, tmp_path = tempfile.mkstemp(dir=symbol_dir, suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, records)
+            os.replace(tmp_path, path)
+
+    def read(self, symbol: str, timeframe: str, feed: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """Stored bars in ``[start, end)``; never touches the network."""
+        key = self._key(symbol, timeframe, feed)
+        start_ts, end_ts = pd.Timestamp(_utc(start)), pd.Timestamp(_utc(end))
+        symbol_dir = self._dir(key)
+        parts = []
+        day = start_ts.normalize()
+        while day < end_ts:
+            path = os.path.join(symbol_dir, f"{day.strftime('%Y-%m-%d')}.npy")
+            if os.path.exists(path):
+                parts.append(np.load(path, allow_pickle=False))
+                self.stats["partitions_read"] += 1
+            day += pd.Timedelta(days=1)
+        self.stats["reads"] += 1
+        if not parts:
+            return _empty()
+        # Partitions are sorted and disjoint, so concatenating the raw records
+        # is enough; one DataFrame is built at the end.
+        records = np.concatenate(parts)
+        lo, hi = np.searchsorted(records["timestamp"], [start_ts.value, end_ts.value])
+        return self._frame(records[lo:hi])
+
+    # -- top-up ----------------------------------------------------------------
+    def closed_until(self, timeframe: str, now: Optional[datetime] = None) -> datetime:
+        """Bars starting before this had closed at ``now``; later ones are still forming."""
+        return _utc(now or datetime.now(timezone.utc)) - timedelta(seconds=bar_seconds(timeframe))
+
+    def _save(self, key: Tuple[str, str, str], timeframe: str, bars: Optional[pd.DataFrame],
+              start: datetime, end: datetime, closed_until: datetime) -> pd.DataFrame:
+        bars = _normalize(bars)
+        bars = bars[(bars.index >= pd.Timestamp(start)) & (bars.index < pd.Timestamp(end))]
+        if not bars.empty:
+            self._write_partitions(key, bars)
+        settled_until = closed_until - timedelta(seconds=bar_seconds(timeframe) * self.settle_bars)
+        self._add_coverage(key, start, min(end, settled_until))
+        return bars
+
+    def store(self, symbol: str, timeframe: str, feed: str, bars: Optional[pd.DataFrame], start: datetime,
+              end: datetime, now: Optional[datetime] = None) -> None:
+        """Record bars fetched elsewhere for ``[start, end)``."""
+        key = self._key(symbol, timeframe, feed)
+        closed_until = self.closed_until(timeframe, now)
+        with self._key_lock(key):
+            self._save(key, timeframe, bars, _utc(start), min(_utc(end), closed_until), closed_until)
+
+    def ensure(self, fetcher: Fetcher, symbol: str, timeframe: str, feed: str, start: datetime, end: datetime,
+               now: Optional[datetime] = None) -> pd.DataFrame:
+        """Fetch whatever part of ``[start, end)`` is missing, then return it from disk."""
+        key = self._key(symbol, timeframe, feed)
+        start, end = _utc(start), _utc(end)
+        # Bars that have not closed yet are neither stored nor marked covered.
+        closed_until = self.closed_until(timeframe, now)
+        with self._key_lock(key):
+            for gap_start, gap_end in self.gaps(symbol, timeframe, feed, start, min(end, closed_until)):
+                started = time.monotonic()
+                bars = self._save(key, timeframe, fetcher(key[1], timeframe, key[0], gap_start, gap_end),
+                                  gap_start, gap_end, closed_until)
+                self.stats["fetches"] += 1
+                self.stats["rows_fetched"] += len(bars)
+                if self.logger:
+                    self.logger.info(
+                        "[BAR_WAREHOUSE] Fetched %s %s %s %s..%s: %s bars in %.0f ms",
+                        key[1], timeframe, key[0], gap_start.isoformat(), gap_end.isoformat(),
+                        len(bars), (time.monotonic() - started) * 1000.0,
+                    )
+        return self.read(symbol, timeframe, feed, start, end)
+
+
+def alpaca_fetcher(api) -> Fetcher:
+    """Fetcher over a LegacyCompatibleAlpacaClient (or a callable returning one, made on first use)."""
+    resolved = {}
+
+    def fetch(symbol: str, timeframe: str, feed: str, start: datetime, end: datetime) -> pd.DataFrame:
+        if "api" not in resolved:
+            resolved["api"] = api() if callable(api) and not hasattr(api, "get_bars") else api
+        return resolved["api"].get_bars(
+            symbol,
+            timeframe,
+            start=start.isoformat().replace("+00:00", "Z"),
+            end=end.isoformat().replace("+00:00", "Z"),
+            adjustment="raw",
+            feed=feed,
+        ).df
+
+    return fetch
+
+
+def create_bar_warehouse(instance_path: str, logger=None) -> Optional[BarWarehouse]:
+    if os.getenv("BAR_WAREHOUSE_ENABLED", "true").strip().lower() not in ("1", "true", "yes", "y", "on"):
+        return None
+    base_dir = os.getenv("BAR_WAREHOUSE_DIR", os.path.join(instance_path, "bar_warehouse"))
+    try:
+        settle_bars = max(0, int(os.getenv("BAR_WAREHOUSE_SETTLE_BARS", "5")))
+    except (TypeError, ValueError):
+        settle_bars = 5
+    return BarWarehouse(base_dir, logger=logger, settle_bars=settle_bars)
@@ -12,14 +12,17 @@ import threading
 import time
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
-from alpaca_api import AlpacaAPIError, LegacyCompatibleAlpacaClient, TradeUpdatesHub
+from alpaca_api import AlpacaAPIError
+from alpaca_clients import alpaca_clients, trade_updates
 from local_strategy_engine import LocalStrategyEngine
 from models import db, User, Trade
+from risk_snapshot import RiskSnapshotCache
 import strategy_config as strategy_store
-from utils import decrypt_data
+from webhook_queue import WebhookQueue, WebhookWorkerPool
 
 # --- Initialization ---
 ENV_PATH = os.path.join(os.path.dirname(__file__), '.env')
@@ -54,13 +57,33 @@ MAX_OPEN_POSITIONS_PER_ACCOUNT = int(os.getenv("MAX_OPEN_POSITIONS_PER_ACCOUNT",
 SIGNAL_DEDUP_WINDOW_SEC = int(os.getenv("SIGNAL_DEDUP_WINDOW_SEC", "8"))
 MAX_WEBHOOK_CONTENT_LENGTH = int(os.getenv("MAX_WEBHOOK_CONTENT_LENGTH", str(128 * 1024)))
 TRADE_UPDATES_WAIT_SEC = float(os.getenv("TRADE_UPDATES_WAIT_SEC", "12"))
+WEBHOOK_FANOUT_WORKERS = max(1, int(os.getenv("WEBHOOK_FANOUT_WORKERS", "8")))
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "true").lower() in ("1", "true", "yes", "y")
+WEBHOOK_QUEUE_WORKERS = max(1, int(os.getenv("WEBHOOK_QUEUE_WORKERS", "2")))
+WEBHOOK_QUEUE_RETENTION_HOURS = float(os.getenv("WEBHOOK_QUEUE_RETENTION_HOURS", "72"))
 AUTO_EXTENDED_HOURS = os.getenv("AUTO_EXTENDED_HOURS", "true").lower() in ("1", "true", "yes", "y")
 AUTO_LIMIT_OUTSIDE_RTH = os.getenv("AUTO_LIMIT_OUTSIDE_RTH", "true").lower() in ("1", "true", "yes", "y")
 OUTSIDE_RTH_LIMIT_SLIPPAGE_BPS = float(os.getenv("OUTSIDE_RTH_LIMIT_SLIPPAGE_BPS", "25"))
+TRADE_UPDATES_WARMUP_INTERVAL_SEC = float(os.getenv("TRADE_UPDATES_WARMUP_INTERVAL_SEC", "300"))
+RISK_SNAPSHOT_TTL_SEC = float(os.getenv("RISK_SNAPSHOT_TTL_SEC", "30"))
+RISK_RESERVE_BUYING_POWER = os.getenv("RISK_RESERVE_BUYING_POWER", "true").lower() in ("1", "true", "yes", "y")
 
 RECENT_SIGNAL_CACHE = {}
 RECENT_SIGNAL_LOCK = threading.Lock()
-TRADE_UPDATES = TradeUpdatesHub(logger=logging.getLogger("trades_logger"))
+# The process-wide hub, so trade_db's fill waits use the streams warmed here.
+TRADE_UPDATES = trade_updates
+# Positions/equity/buying power for the pre-trade risk checks, kept current by
+# trade-update fills and refreshed after RISK_SNAPSHOT_TTL_SEC.
+RISK_SNAPSHOTS = RiskSnapshotCache(ttl_sec=RISK_SNAPSHOT_TTL_SEC)
+TRADE_UPDATES.add_listener(RISK_SNAPSHOTS.on_trade_update)
+# Webhook fan-out: account groups run concurrently, but one account's orders
+# are still processed one at a time and in arrival order.
+WEBHOOK_FANOUT_EXECUTOR = ThreadPoolExecutor(max_workers=WEBHOOK_FANOUT_WORKERS, thread_name_prefix="webhook-fanout")
+ACCOUNT_ORDER_LOCKS = {}
+ACCOUNT_ORDER_LOCKS_GUARD = threading.Lock()
+WEBHOOK_QUEUE = WebhookQueue(os.path.join(app.instance_path, "webhook_queue.sqlite3"))
+WEBHOOK_WORKERS = None
+TRADE_UPDATES_WARMUP_THREAD = None
 LOCAL_STRATEGY_ENGINE = None
 
 @atexit.register
@@ -74,6 +97,11 @@ def _shutdown_streams():
             LOCAL_STRATEGY_ENGINE.stop()
     except Exception:
         pass
+    try:
+        if WEBHOOK_WORKERS:
+            WEBHOOK_WORKERS.stop()
+    except Exception:
+        pass
 
 # --- Logging ---
 handler = RotatingFileHandler('trades.log', maxBytes=100000, backupCount=3)
@@ -201,37 +229,43 @@ def _cache_duplicate_signal(user_id, symbol, action):
         RECENT_SIGNAL_CACHE[key] = now_ts
     return False, 0
 
-def _validate_trade_risk(api_client, user, symbol, action, amount):
+def _check_risk_view(view, amount):
+    if MAX_OPEN_POSITIONS_PER_ACCOUNT > 0 and view.open_positions >= MAX_OPEN_POSITIONS_PER_ACCOUNT:
+        return False, 409, f"Account reached max open positions ({MAX_OPEN_POSITIONS_PER_ACCOUNT})"
+    if MAX_ACCOUNT_ALLOCATION_PCT > 0:
+        if view.equity is None:
+            return False, 500, "Risk verification failed (equity check)"
+        allowed_amount = view.equity * (MAX_ACCOUNT_ALLOCATION_PCT / 100.0)
+        if amount > allowed_amount:
+            return False, 400, (
+                f"Amount exceeds allocation rule: max {MAX_ACCOUNT_ALLOCATION_PCT}% of equity "
+                f"({allowed_amount:.2f})"
+            )
+    if RISK_RESERVE_BUYING_POWER and view.buying_power is not None and amount > view.buying_power:
+        return False, 400, f"Insufficient buying power after pending orders ({view.buying_power:.2f})"
+    return True, 200, None
+
+def _validate_trade_risk(api_client, user, symbol, action, amount, account_key):
+    """Returns ``(ok, status, error, reservation)``; release the reservation after submitting."""
     if amount < MIN_TRADE_AMOUNT:
-        return False, 400, f"Amount must be >= {MIN_TRADE_AMOUNT}"
+        return False, 400, f"Amount must be >= {MIN_TRADE_AMOUNT}", None
     if amount > MAX_TRADE_AMOUNT:
-        return False, 400, f"Amount exceeds configured max trade amount ({MAX_TRADE_AMOUNT})"
+        return False, 400, f"Amount exceeds configured max trade amount ({MAX_TRADE_AMOUNT})", None
 
     if action.lower() in ("buy", "sell"):
-        if MAX_OPEN_POSITIONS_PER_ACCOUNT > 0:
-            try:
-                open_positions = api_client.list_positions()
-            except Exception as e:
-                logger.error(f"[RISK_FAIL] Could not fetch open positions for '{user.username}': {e}")
-                return False, 500, "Risk verification failed (open positions check)"
-            if len(open_positions) >= MAX_OPEN_POSITIONS_PER_ACCOUNT:
-                return False, 409, f"Account reached max open positions ({MAX_OPEN_POSITIONS_PER_ACCOUNT})"
-
-        if MAX_ACCOUNT_ALLOCATION_PCT > 0:
-            try:
-                account = api_client.get_account()
-                equity = float(account.equity)
-            except Exception as e:
-                logger.error(f"[RISK_FAIL] Could not fetch account equity for '{user.username}': {e}")
-                return False, 500, "Risk verification failed (equity check)"
-            allowed_amount = equity * (MAX_ACCOUNT_ALLOCATION_PCT / 100.0)
-            if amount > allowed_amount:
-                return False, 400, (
-                    f"Amount exceeds allocation rule: max {MAX_ACCOUNT_ALLOCATION_PCT}% of equity "
-                    f"({allowed_amount:.2f})"
-                )
+        try:
+            return RISK_SNAPSHOTS.check_and_reserve(
+                account_key,
+                api_client,
+                symbol.replace('/', ''),
+                amount,
+                lambda view: _check_risk_view(view, amount),
+            )
+        except Exception as e:
+            logger.error(f"[RISK_FAIL] Could not fetch account snapshot for '{user.username}': {e}")
+            return False, 500, "Risk verification failed (account snapshot)", None
 
-    return True, 200, None
+    return True, 200, None, None
 
 def _json_safe(value):
     if isinstance(value, dict):
@@ -368,11 +402,10 @@ def mirror_close_trade(user, payload, api_client):
     return record_payload
 
 def account_key_for_user(user):
-    api_key = decrypt_data(user.encrypted_alpaca_key)
-    api_secret = decrypt_data(user.encrypted_alpaca_secret)
-    if not api_key or not api_secret:
+    creds = alpaca_clients.credentials(user)
+    if not creds:
         return None
-    return f"{api_key}:{api_secret}"
+    return f"{creds[0]}:{creds[1]}"
 
 def _order_fill_price(api, order_id):
     if not order_id:
@@ -534,11 +567,11 @@ def process_trade_for_user(user, payload):
         logger.warning(f"[TRADE_REJECTED] User '{user.username}' is restricted from trading.")
         return False, 403, {"error": "Trading for this user is currently restricted"}, None
 
-    api_key = decrypt_data(user.encrypted_alpaca_key)
-    api_secret = decrypt_data(user.encrypted_alpaca_secret)
-    if not api_key or not api_secret:
+    creds = alpaca_clients.credentials(user)
+    if not creds:
         logger.error(f"[TRADE_REJECTED] User '{user.username}' has no API credentials.")
         return False, 500, {"error": "Alpaca credentials not configured"}, None
+    api_key, api_secret = creds
 
     symbol = payload.get("symbol")
     action = payload.get("action", "")
@@ -553,7 +586,7 @@ def process_trade_for_user(user, payload):
     api_symbol = symbol.replace('/', '')
 
     if not _is_dashboard_request(payload) and not _is_local_strategy_request(payload):
-        cfg = strategy_store.load_strategy_config()
+        cfg = strategy_store.current_strategy_config().config
         if not strategy_store.tradingview_allowed_for_symbol(api_symbol, cfg):
             mode = strategy_store.strategy_mode_for_symbol(api_symbol, cfg)
             logger.info(
@@ -566,7 +599,7 @@ def process_trade_for_user(user, payload):
                 "mode": mode,
             }, None
 
-    api = LegacyCompatibleAlpacaClient(api_key, api_secret, BASE_URL)
+    api = alpaca_clients.client_for_keys(api_key, api_secret, BASE_URL)
     duplicate, retry_after = _cache_duplicate_signal(user.id, api_symbol, action)
     if duplicate:
         logger.warning(
@@ -575,7 +608,8 @@ def process_trade_for_user(user, payload):
         )
         return True, 200, {"result": "duplicate_ignored", "retry_after_sec": retry_after}, None
 
-    risk_ok, risk_status, risk_error = _validate_trade_risk(api, user, symbol, action, amount)
+    risk_account = TRADE_UPDATES.ensure_stream(api_key, api_secret, BASE_URL)
+    risk_ok, risk_status, risk_error, reservation = _validate_trade_risk(api, user, symbol, action, amount, risk_account)
     if not risk_ok:
         logger.warning(
             f"[TRADE_REJECTED] Risk rule rejected trade for user='{user.username}' symbol='{api_symbol}' "
@@ -583,179 +617,240 @@ def process_trade_for_user(user, payload):
         )
         return False, risk_status, {"error": risk_error}, None
 
-    if is_close_action(action):
-        try:
-            position_to_close = api.get_position(api_symbol)
-            close_order = api.close_position(api_symbol)
-            close_order_id = str(getattr(close_order, "id", ""))
-            logger.info(f"[TRADE_EXECUTED] User '{user.username}' CLOSE order {close_order_id} for {api_symbol}")
-            close_fill = _pick_close_fill_from_updates(
-                api_key=api_key,
-                api_secret=api_secret,
-                close_order_id=close_order_id,
-                close_order=close_order,
-                api=api,
-                fallback_symbol=symbol,
-            )
-            notification_payload = {
-                "result": "closed",
-                "symbol": symbol,
-                "close_order_id": close_order_id,
-                "payload": payload,
-                "user_id": user.id,
-                "position_obj": {
-                    "avg_entry_price": position_to_close.avg_entry_price,
-                    "qty": position_to_close.qty,
-                    "side": position_to_close.side,
-                    "asset_id": str(position_to_close.asset_id)
+    try:
+        if is_close_action(action):
+            try:
+                position_to_close = api.get_position(api_symbol)
+                close_order = api.close_position(api_symbol)
+                RISK_SNAPSHOTS.note_closed(risk_account, api_symbol)
+                close_order_id = str(getattr(close_order, "id", ""))
+                logger.info(f"[TRADE_EXECUTED] User '{user.username}' CLOSE order {close_order_id} for {api_symbol}")
+                close_fill = _pick_close_fill_from_updates(
+                    api_key=api_key,
+                    api_secret=api_secret,
+                    close_order_id=close_order_id,
+                    close_order=close_order,
+                    api=api,
+                    fallback_symbol=symbol,
+                )
+                notification_payload = {
+                    "result": "closed",
+                    "symbol": symbol,
+                    "close_order_id": close_order_id,
+                    "payload": payload,
+                    "user_id": user.id,
+                    "position_obj": {
+                        "avg_entry_price": position_to_close.avg_entry_price,
+                        "qty": position_to_close.qty,
+                        "side": position_to_close.side,
+                        "asset_id": str(position_to_close.asset_id)
+                    }
                 }
-            }
-            close_price = close_fill.get("price")
-            if close_price is not None:
-                close_time = close_fill.get("time") or datetime.now(timezone.utc)
-                notification_payload["close_price"] = close_price
-                notification_payload["close_time"] = close_time.isoformat() if hasattr(close_time, "isoformat") else str(close_time)
-                notification_payload["close_price_source"] = close_fill.get("source")
-                notification_payload["close_price_authoritative"] = bool(close_fill.get("is_authoritative"))
-            record_trade_notification(notification_payload)
-            return True, 200, {"result": "closed", "close_order_id": close_order_id}, notification_payload
-        except AlpacaAPIError as e:
-            if _is_no_position_error(str(e)):
-                mirror_payload = None
-                if ENABLE_TV_BROADCAST:
-                    mirror_payload = mirror_close_trade(user, payload, api)
-                logger.warning(f"[TRADE_INFO] User '{user.username}' tried to close {api_symbol}, but no position exists.")
-                return True, 200, {"result": "mirrored_close" if mirror_payload else "no_position_to_close", "symbol": symbol}, mirror_payload
-            logger.error(f"[TRADE_FAIL] Error closing {api_symbol} for '{user.username}': {e}")
-            return False, 500, {"error": str(e)}, None
-        except Exception as e:
-            logger.error(f"[TRADE_FAIL] A general error occurred while closing {api_symbol} for '{user.username}': {e}")
-            return False, 500, {"error": str(e)}, None
+                close_price = close_fill.get("price")
+                if close_price is not None:
+                    close_time = close_fill.get("time") or datetime.now(timezone.utc)
+                    notification_payload["close_price"] = close_price
+                    notification_payload["close_time"] = close_time.isoformat() if hasattr(close_time, "isoformat") else str(close_time)
+                    notification_payload["close_price_source"] = close_fill.get("source")
+                    notification_payload["close_price_authoritative"] = bool(close_fill.get("is_authoritative"))
+                record_trade_notification(notification_payload)
+                return True, 200, {"result": "closed", "close_order_id": close_order_id}, notification_payload
+            except AlpacaAPIError as e:
+                if _is_no_position_error(str(e)):
+                    mirror_payload = None
+                    if ENABLE_TV_BROADCAST:
+                        mirror_payload = mirror_close_trade(user, payload, api)
+                    logger.warning(f"[TRADE_INFO] User '{user.username}' tried to close {api_symbol}, but no position exists.")
+                    return True, 200, {"result": "mirrored_close" if mirror_payload else "no_position_to_close", "symbol": symbol}, mirror_payload
+                logger.error(f"[TRADE_FAIL] Error closing {api_symbol} for '{user.username}': {e}")
+                return False, 500, {"error": str(e)}, None
+            except Exception as e:
+                logger.error(f"[TRADE_FAIL] A general error occurred while closing {api_symbol} for '{user.username}': {e}")
+                return False, 500, {"error": str(e)}, None
 
-    if action.lower() in ["buy", "sell"]:
-        try:
-            position_existing = api.get_position(api_symbol)
-            logger.warning(f"[TRADE_REJECTED] User '{user.username}' already has position for {api_symbol}.")
-            if ENABLE_TV_BROADCAST:
-                mirror_payload = mirror_open_trade(user, payload, api, position_existing, amount)
-                return True, 200, {"result": "mirrored_open" if mirror_payload else "position_exists", "symbol": symbol}, mirror_payload
-            return False, 409, {"error": f"{api_symbol} position already open."}, None
-        except AlpacaAPIError:
-            pass
-        except Exception as e:
-            logger.error(f"[TRADE_FAIL] Could not verify position for '{user.username}' on {api_symbol}: {e}")
-            return False, 500, {"error": "Failed to verify existing position"}, None
+        if action.lower() in ["buy", "sell"]:
+            try:
+                position_existing = api.get_position(api_symbol)
+                logger.warning(f"[TRADE_REJECTED] User '{user.username}' already has position for {api_symbol}.")
+                if ENABLE_TV_BROADCAST:
+                    mirror_payload = mirror_open_trade(user, payload, api, position_existing, amount)
+                    return True, 200, {"result": "mirrored_open" if mirror_payload else "position_exists", "symbol": symbol}, mirror_payload
+                return False, 409, {"error": f"{api_symbol} position already open."}, None
+            except AlpacaAPIError:
+                pass
+            except Exception as e:
+                logger.error(f"[TRADE_FAIL] Could not verify position for '{user.username}' on {api_symbol}: {e}")
+                return False, 500, {"error": "Failed to verify existing position"}, None
 
-        try:
-            last_price = get_last_price(api, symbol)
-            if last_price == 0:
-                return False, 400, {"error": f"Could not fetch price for {symbol}."}, None
+            try:
+                last_price = get_last_price(api, symbol)
+                if last_price == 0:
+                    return False, 400, {"error": f"Could not fetch price for {symbol}."}, None
 
-            qty_to_log = 0.0
-            if is_crypto(symbol):
-                qty = amount / last_price
-                qty_to_log = qty
-                tif = str(payload.get("time_in_force", "gtc")).strip().lower() or "gtc"
-                if tif not in ("gtc", "ioc"):
-                    tif = "gtc"
-                order_params = {
-                    "symbol": api_symbol,
+                qty_to_log = 0.0
+                if is_crypto(symbol):
+                    qty = amount / last_price
+                    qty_to_log = qty
+                    tif = str(payload.get("time_in_force", "gtc")).strip().lower() or "gtc"
+                    if tif not in ("gtc", "ioc"):
+                        tif = "gtc"
+                    order_params = {
+                        "symbol": api_symbol,
+                        "side": action.lower(),
+                        "type": str(payload.get("order_type", "market")).strip().lower() or "market",
+                        "qty": qty,
+                        "time_in_force": tif,
+                    }
+                    client_order_id = str(payload.get("client_order_id", "") or "").strip()
+                    if client_order_id:
+                        order_params["client_order_id"] = client_order_id[:48]
+                    limit_price = _safe_float(payload.get("limit_price"))
+                    if order_params["type"] == "limit":
+                        order_params["limit_price"] = limit_price if limit_price else _build_limit_price(last_price, action.lower())
+                else:
+                    order_params, outside_rth, is_overnight_window = _resolve_equity_order_params(
+                        symbol=api_symbol,
+                        action=action.lower(),
+                        amount=amount,
+                        last_price=last_price,
+                        payload=payload,
+                    )
+                    if outside_rth and order_params.get("extended_hours"):
+                        try:
+                            asset = api.get_asset(api_symbol)
+                            overnight_tradable = bool(getattr(asset, "overnight_tradable", False))
+                            overnight_halted = bool(getattr(asset, "overnight_halted", False))
+                            if is_overnight_window and not overnight_tradable:
+                                raise ValueError(f"{api_symbol} is not overnight_tradable for 24/5 session.")
+                            if is_overnight_window and overnight_halted:
+                                raise ValueError(f"{api_symbol} is currently overnight_halted.")
+                        except AlpacaAPIError:
+                            # Keep order flow resilient even if asset metadata lookup fails.
+                            pass
+                    qty_to_log = amount / last_price if action.lower() == "buy" else float(order_params.get("qty", 0))
+                    if outside_rth:
+                        logger.info(
+                            f"[TRADE_ROUTE] user='{user.username}' symbol='{api_symbol}' outside_rth={outside_rth} "
+                            f"overnight_window={is_overnight_window} order_type={order_params.get('type')} "
+                            f"tif={order_params.get('time_in_force')} extended_hours={order_params.get('extended_hours')}"
+                        )
+
+                order = api.submit_order(**order_params)
+                RISK_SNAPSHOTS.release(risk_account, reservation, submitted=True)
+                order_id = str(getattr(order, "id", ""))
+                logger.info(f"[TRADE_EXECUTED] User '{user.username}' OPEN order {order_id} for {api_symbol}")
+
+                entry_price, entry_time = _order_fill_details_from_order(order)
+                entry_price_source = "order_object" if entry_price is not None else None
+                if entry_price is None:
+                    try:
+                        update = TRADE_UPDATES.wait_for_order(
+                            api_key=api_key,
+                            api_secret=api_secret,
+                            base_url=BASE_URL,
+                            order_id=order_id,
+                            timeout_sec=TRADE_UPDATES_WAIT_SEC,
+                        )
+                        if update and update.price is not None and update.event in ("fill", "partial_fill"):
+                            entry_price = float(update.price)
+                            entry_time = update.timestamp
+                            entry_price_source = "trade_update"
+                    except Exception as exc:
+                        logger.warning(f"[ALPACA_STREAM] Could not read trade update for open order {order_id}: {exc}")
+                if entry_price is None:
+                    entry_price, entry_time = _order_fill_details(api, order_id)
+                    entry_price_source = "order_poll" if entry_price is not None else None
+                if entry_price is None:
+                    entry_price = last_price
+                    entry_time = datetime.now(timezone.utc)
+                    entry_price_source = "latest_trade_fallback"
+                if entry_time is None:
+                    entry_time = datetime.now(timezone.utc)
+
+                notification_payload = {
+                    "result": "opened",
+                    "order_id": order_id,
+                    "symbol": symbol,
                     "side": action.lower(),
-                    "type": str(payload.get("order_type", "market")).strip().lower() or "market",
-                    "qty": qty,
-                    "time_in_force": tif,
+                    "price": entry_price,
+                    "price_source": entry_price_source,
+                    "open_time": entry_time.isoformat() if hasattr(entry_time, "isoformat") else str(entry_time),
+                    "payload": payload,
+                    "user_id": user.id,
+                    "qty": qty_to_log
                 }
-                client_order_id = str(payload.get("client_order_id", "") or "").strip()
-                if client_order_id:
-                    order_params["client_order_id"] = client_order_id[:48]
-                limit_price = _safe_float(payload.get("limit_price"))
-                if order_params["type"] == "limit":
-                    order_params["limit_price"] = limit_price if limit_price else _build_limit_price(last_price, action.lower())
+                record_trade_notification(notification_payload)
+                return True, 200, {"result": "opened", "order_id": order_id}, notification_payload
+            except ValueError as e:
+                logger.warning(f"[TRADE_REJECTED] {e}")
+                return False, 400, {"error": str(e)}, None
+            except AlpacaAPIError as e:
+                logger.error(f"[TRADE_FAIL] Alpaca API error opening {symbol} for '{user.username}': {e}")
+                return False, 500, {"error": str(e)}, None
+            except Exception as e:
+                logger.error(f"[TRADE_FAIL] Error opening {symbol} for '{user.username}': {e}")
+                return False, 500, {"error": str(e)}, None
+
+        logger.error(f"[UNKNOWN_ACTION] Received unknown action: {action}")
+        return False, 400, {"error": "Unknown action"}, None
+    finally:
+        # No-op once the order was submitted; frees the slot on every other exit.
+        RISK_SNAPSHOTS.release(risk_account, reservation, submitted=False)
+
+def _account_order_lock(group_key):
+    with ACCOUNT_ORDER_LOCKS_GUARD:
+        lock = ACCOUNT_ORDER_LOCKS.get(group_key)
+        if lock is None:
+            lock = ACCOUNT_ORDER_LOCKS[group_key] = threading.Lock()
+        return lock
+
+def _run_account_group(group_key, primary, payload, queued_at, own_context):
+    started = time.monotonic()
+    with _account_order_lock(group_key):
+        locked = time.monotonic()
+        try:
+            if own_context:
+                with app.app_context():
+                    user = db.session.get(User, primary.id)
+                    if user is None:
+                        outcome = (False, 404, {"error": "User no longer exists"}, None)
+                    else:
+                        outcome = process_trade_for_user(user, payload)
             else:
-                order_params, outside_rth, is_overnight_window = _resolve_equity_order_params(
-                    symbol=api_symbol,
-                    action=action.lower(),
-                    amount=amount,
-                    last_price=last_price,
-                    payload=payload,
-                )
-                if outside_rth and order_params.get("extended_hours"):
-                    try:
-                        asset = api.get_asset(api_symbol)
-                        overnight_tradable = bool(getattr(asset, "overnight_tradable", False))
-                        overnight_halted = bool(getattr(asset, "overnight_halted", False))
-                        if is_overnight_window and not overnight_tradable:
-                            raise ValueError(f"{api_symbol} is not overnight_tradable for 24/5 session.")
-                        if is_overnight_window and overnight_halted:
-                            raise ValueError(f"{api_symbol} is currently overnight_halted.")
-                    except AlpacaAPIError:
-                        # Keep order flow resilient even if asset metadata lookup fails.
-                        pass
-                qty_to_log = amount / last_price if action.lower() == "buy" else float(order_params.get("qty", 0))
-                if outside_rth:
-                    logger.info(
-                        f"[TRADE_ROUTE] user='{user.username}' symbol='{api_symbol}' outside_rth={outside_rth} "
-                        f"overnight_window={is_overnight_window} order_type={order_params.get('type')} "
-                        f"tif={order_params.get('time_in_force')} extended_hours={order_params.get('extended_hours')}"
-                    )
-
-            order = api.submit_order(**order_params)
-            order_id = str(getattr(order, "id", ""))
-            logger.info(f"[TRADE_EXECUTED] User '{user.username}' OPEN order {order_id} for {api_symbol}")
-
-            entry_price, entry_time = _order_fill_details_from_order(order)
-            entry_price_source = "order_object" if entry_price is not None else None
-            if entry_price is None:
-                try:
-                    update = TRADE_UPDATES.wait_for_order(
-                        api_key=api_key,
-                        api_secret=api_secret,
-                        base_url=BASE_URL,
-                        order_id=order_id,
-                        timeout_sec=TRADE_UPDATES_WAIT_SEC,
-                    )
-                    if update and update.price is not None and update.event in ("fill", "partial_fill"):
-                        entry_price = float(update.price)
-                        entry_time = update.timestamp
-                        entry_price_source = "trade_update"
-                except Exception as exc:
-                    logger.warning(f"[ALPACA_STREAM] Could not read trade update for open order {order_id}: {exc}")
-            if entry_price is None:
-                entry_price, entry_time = _order_fill_details(api, order_id)
-                entry_price_source = "order_poll" if entry_price is not None else None
-            if entry_price is None:
-                entry_price = last_price
-                entry_time = datetime.now(timezone.utc)
-                entry_price_source = "latest_trade_fallback"
-            if entry_time is None:
-                entry_time = datetime.now(timezone.utc)
-
-            notification_payload = {
-                "result": "opened",
-                "order_id": order_id,
-                "symbol": symbol,
-                "side": action.lower(),
-                "price": entry_price,
-                "price_source": entry_price_source,
-                "open_time": entry_time.isoformat() if hasattr(entry_time, "isoformat") else str(entry_time),
-                "payload": payload,
-                "user_id": user.id,
-                "qty": qty_to_log
-            }
-            record_trade_notification(notification_payload)
-            return True, 200, {"result": "opened", "order_id": order_id}, notification_payload
-        except ValueError as e:
-            logger.warning(f"[TRADE_REJECTED] {e}")
-            return False, 400, {"error": str(e)}, None
-        except AlpacaAPIError as e:
-            logger.error(f"[TRADE_FAIL] Alpaca API error opening {symbol} for '{user.username}': {e}")
-            return False, 500, {"error": str(e)}, None
+                outcome = process_trade_for_user(primary, payload)
         except Exception as e:
-            logger.error(f"[TRADE_FAIL] Error opening {symbol} for '{user.username}': {e}")
-            return False, 500, {"error": str(e)}, None
-
-    logger.error(f"[UNKNOWN_ACTION] Received unknown action: {action}")
-    return False, 400, {"error": "Unknown action"}, None
+            logger.error(f"[WEBHOOK_FANOUT] Order processing failed for user='{primary.username}': {e}", exc_info=True)
+            outcome = (False, 500, {"error": "Internal error while processing trade"}, None)
+    finished = time.monotonic()
+    timing = {
+        "queue": round((started - queued_at) * 1000.0, 1),
+        "account_wait": round((locked - started) * 1000.0, 1),
+        "process": round((finished - locked) * 1000.0, 1),
+        "total": round((finished - queued_at) * 1000.0, 1),
+    }
+    logger.info(
+        f"[WEBHOOK_FANOUT] user='{primary.username}' status={outcome[1]} queue_ms={timing['queue']} "
+        f"account_wait_ms={timing['account_wait']} process_ms={timing['process']} total_ms={timing['total']}"
+    )
+    return (*outcome, timing)
+
+def dispatch_account_groups(groups, payload):
+    """Run ``process_trade_for_user`` for each account group's primary user.
+
+    Groups run concurrently on WEBHOOK_FANOUT_EXECUTOR so the last subscriber's
+    order is not delayed by everyone else's risk checks and fill waits. Orders
+    for the same account serialize on a per-account lock. A single group runs
+    inline on the request thread. Returns one
+    ``(ok, status, result, record_payload, timing_ms)`` tuple per group, in order.
+    """
+    queued_at = time.monotonic()
+    if len(groups) <= 1:
+        return [_run_account_group(key, users[0], payload, queued_at, False) for key, users in groups]
+    futures = [
+        WEBHOOK_FANOUT_EXECUTOR.submit(_run_account_group, key, users[0], dict(payload), queued_at, True)
+        for key, users in groups
+    ]
+    return [future.result() for future in futures]
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
@@ -785,16 +880,92 @@ def webhook():
         logger.error(f"[BOT_STATUS] Could not write to last_webhook.log: {e}")
 
     logger.info(f"[WEBHOOK_RECEIVED] Payload: {payload}")
+    # Dashboard requests wait for their result; TradingView alerts are queued.
+    if WEBHOOK_WORKERS is not None and not _is_dashboard_request(payload):
+        return _enqueue_webhook(payload)
+
+    body, status_code = _execute_webhook_payload(payload)
+    return jsonify(body), status_code
+
+
+def _enqueue_webhook(payload):
+    tradingview_user = str(payload.get("user") or "").strip()
+    symbol = str(payload.get("symbol") or "").strip().upper()
+    action = str(payload.get("action") or "").strip()
+    if not tradingview_user:
+        logger.error("[TRADE_REJECTED] 'user' field is missing from webhook.")
+        return jsonify({"error": "Webhook missing 'user' identifier"}), 400
+    if not symbol or not action:
+        logger.error(f"[TRADE_REJECTED] Missing symbol/action in queued webhook: {payload}")
+        return jsonify({"error": "Webhook missing 'symbol' or 'action'"}), 400
+
+    # Same key shape and window as _cache_duplicate_signal, but checked against
+    # the shared queue so duplicates are caught across bot processes too.
+    idempotency_key = (request.headers.get("Idempotency-Key") or "").strip()
+    if idempotency_key:
+        dedup_key, window = f"idem:{idempotency_key}", None
+    elif SIGNAL_DEDUP_WINDOW_SEC > 0:
+        dedup_key, window = f"{tradingview_user.lower()}:{symbol}:{action.lower()}", SIGNAL_DEDUP_WINDOW_SEC
+    else:
+        dedup_key, window = None, None
+    # The queue outlives the request, so the shared secret stays out of it.
+    queued = {key: value for key, value in payload.items() if key not in ("passphrase", "secret")}
+    try:
+        job_id, created = WEBHOOK_QUEUE.enqueue(queued, dedup_key=dedup_key, dedup_window_sec=window)
+    except Exception as e:
+        logger.error(f"[WEBHOOK_QUEUE] Enqueue failed, processing inline: {e}")
+        body, status_code = _execute_webhook_payload(payload)
+        return jsonify(body), status_code
+    status_url = f"/webhook/status/{job_id}"
+    if not created:
+        logger.warning(f"[TRADE_SKIPPED] Duplicate webhook for key={dedup_key}; existing job={job_id}")
+        return jsonify({"status": "duplicate", "job_id": job_id, "status_url": status_url}), 200
+    WEBHOOK_WORKERS.notify()
+    logger.info(f"[WEBHOOK_QUEUE] Queued job={job_id} user='{tradingview_user}' {action} {symbol}")
+    return jsonify({"status": "queued", "job_id": job_id, "status_url": status_url}), 202
+
+
+@app.route("/webhook/status/<job_id>", methods=["GET"])
+def webhook_status(job_id):
+    if WEBHOOK_SECRET and not _secure_compare(request.headers.get(WEBHOOK_SECRET_HEADER), WEBHOOK_SECRET):
+        return jsonify({"error": "Unauthorized"}), 401
+    job = WEBHOOK_QUEUE.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/health/trade_updates", methods=["GET"])
+def trade_updates_health():
+    if not _is_internal_dashboard_proxy():
+        return jsonify({"error": "Unauthorized"}), 401
+    # The same hub backs trade_db's fill waits; with no stream at all nothing is
+    # warmed yet, so fills would only be seen through REST polling.
+    streams = TRADE_UPDATES.readiness()
+    ready = bool(streams) and all(item["ready"] for item in streams)
+    return jsonify({"ready": ready, "streams": streams}), 200
+
+
+def _run_queued_webhook(payload):
+    with app.app_context():
+        try:
+            return _execute_webhook_payload(payload)
+        finally:
+            db.session.remove()
+
+
+def _execute_webhook_payload(payload):
+    """Resolve target users and run the signal; returns ``(body, http_status)``."""
     tradingview_user = (payload.get("user") or "").strip()
     dashboard_user_id = payload.get("dashboard_user_id")
     dashboard_username = (payload.get("dashboard_username") or "").strip()
     dashboard_scope = str(payload.get("dashboard_scope", "single") or "single").strip().lower()
     if dashboard_scope not in ("single", "all_users", "pool"):
-        return jsonify({"error": "Invalid dashboard_scope"}), 400
+        return {"error": "Invalid dashboard_scope"}, 400
     
     if not tradingview_user and not dashboard_user_id and not dashboard_username:
         logger.error("[TRADE_REJECTED] 'user' field is missing from webhook.")
-        return jsonify({"error": "Webhook missing 'user' identifier"}), 400
+        return {"error": "Webhook missing 'user' identifier"}, 400
 
     with app.app_context():
         if _is_dashboard_request(payload):
@@ -803,7 +974,7 @@ def webhook():
                 logger.warning(
                     f"[SECURITY] Rejected privileged dashboard scope='{dashboard_scope}' from ip={request.remote_addr}"
                 )
-                return jsonify({"error": "Unauthorized dashboard routing scope"}), 401
+                return {"error": "Unauthorized dashboard routing scope"}, 401
 
             user = None
             if dashboard_scope == "all_users":
@@ -856,7 +1027,7 @@ def webhook():
 
     if not target_users:
         logger.error(f"[TRADE_REJECTED] No registered user for TV user='{tradingview_user}'")
-        return jsonify({"error": f"User '{tradingview_user}' not registered"}), 403
+        return {"error": f"User '{tradingview_user}' not registered"}, 403
 
     grouped_users = {}
     for user in target_users:
@@ -864,18 +1035,20 @@ def webhook():
         group_key = account_key if account_key else f"missing:{user.id}"
         grouped_users.setdefault(group_key, []).append(user)
 
+    started = time.monotonic()
+    outcomes = dispatch_account_groups(list(grouped_users.items()), payload)
     results = []
     success_count = 0
-    for group_key, users in grouped_users.items():
+    for (group_key, users), (ok, status_code, result, record_payload, timing) in zip(grouped_users.items(), outcomes):
         primary = users[0]
-        ok, status_code, result, record_payload = process_trade_for_user(primary, payload)
         if ok and status_code < 400:
             success_count += 1
         results.append({
             "user_id": primary.id,
             "username": primary.username,
             "status": status_code,
-            "result": result
+            "result": result,
+            "timing_ms": timing,
         })
 
         if record_payload and len(users) > 1:
@@ -906,11 +1079,12 @@ def webhook():
                 })
 
     overall_status = 200 if success_count > 0 else 500
-    return jsonify({
+    return {
         "mode": "broadcast" if len(target_users) > 1 else "single",
         "success_count": success_count,
+        "elapsed_ms": round((time.monotonic() - started) * 1000.0, 1),
         "results": results
-    }), overall_status
+    }, overall_status
 
 
 def start_local_strategy_engine_once():
@@ -931,7 +1105,67 @@ def start_local_strategy_engine_once():
     LOCAL_STRATEGY_ENGINE.start()
 
 
+def warm_trade_update_streams():
+    """Open trade-update streams for every account with keys, so first fills are not missed."""
+    with app.app_context():
+        try:
+            users = User.query.filter(User.encrypted_alpaca_key.isnot(None)).all()
+            accounts = {}
+            for user in users:
+                creds = alpaca_clients.credentials(user)
+                if creds:
+                    accounts[creds[0]] = (creds[0], creds[1], BASE_URL)
+        finally:
+            db.session.remove()
+    started = TRADE_UPDATES.warm_up(accounts.values())
+    if started:
+        logger.info(f"[ALPACA_STREAM] Warmed up trade_updates streams for {started} new account(s).")
+    return started
+
+
+def _trade_updates_warmup_loop():
+    while True:
+        try:
+            warm_trade_update_streams()
+        except Exception as e:
+            logger.error(f"[ALPACA_STREAM] trade_updates warmup failed: {e}")
+        time.sleep(TRADE_UPDATES_WARMUP_INTERVAL_SEC)
+
+
+def start_trade_updates_warmup_once():
+    global TRADE_UPDATES_WARMUP_THREAD
+    if TRADE_UPDATES_WARMUP_THREAD is not None or TRADE_UPDATES_WARMUP_INTERVAL_SEC <= 0:
+        return
+    if any("pytest" in arg for arg in sys.argv):
+        return
+    # Re-runs periodically to pick up keys saved from the dashboard.
+    TRADE_UPDATES_WARMUP_THREAD = threading.Thread(target=_trade_updates_warmup_loop, name="trade-updates-warmup", daemon=True)
+    TRADE_UPDATES_WARMUP_THREAD.start()
+
+
+def start_webhook_workers_once():
+    global WEBHOOK_WORKERS
+    if WEBHOOK_WORKERS is not None:
+        return
+    if not WEBHOOK_ASYNC:
+        logger.info("[WEBHOOK_QUEUE] Async webhooks disabled by WEBHOOK_ASYNC; processing inline.")
+        return
+    if any("pytest" in arg for arg in sys.argv):
+        return
+    workers = WebhookWorkerPool(
+        WEBHOOK_QUEUE,
+        _run_queued_webhook,
+        workers=WEBHOOK_QUEUE_WORKERS,
+        logger=logger,
+        retention_sec=WEBHOOK_QUEUE_RETENTION_HOURS * 3600,
+    )
+    workers.start()
+    WEBHOOK_WORKERS = workers
+
+
 start_local_strategy_engine_once()
+start_webhook_workers_once()
+start_trade_updates_warmup_once()
 
 if __name__ == "__main__":
     app.run(host=HOST, port=PORT)
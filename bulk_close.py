@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Concurrent close engine for admin bulk exits.
+
+``/api/admin/close_trades`` used to close positions one at a time and start a
+recording thread per close. ``close_positions`` instead:
+
+* groups the requested positions by Alpaca account; users sharing an account
+  and symbol get one close order and share its fill price, while their
+  quantity and entry stay those of their own open trade,
+* submits the closes concurrently, at most ``per_account_concurrency`` in
+  flight per account and spaced ``min_interval_sec`` apart, to stay inside
+  Alpaca's per-account rate limit,
+* waits for every fill in parallel through ``wait_for_fill``
+  (``trade_db.wait_for_order_fill``: the process's trade-updates stream when
+  one is already running, REST backoff otherwise, so a bulk exit never opens
+  new websockets).
+
+It only does network work, so it can run off the request thread; the caller
+records the returned outcomes in one DB transaction.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class _AccountLimiter:
+    def __init__(self, concurrency: int, min_interval_sec: float):
+        self._slots = threading.Semaphore(max(1, int(concurrency)))
+        self._min_interval_sec = max(0.0, float(min_interval_sec))
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def __enter__(self):
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self._min_interval_sec
+        if start_at > now:
+            time.sleep(start_at - now)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._slots.release()
+        return False
+
+
+def _ms(start: float, end: Optional[float]) -> Optional[float]:
+    return round((end - start) * 1000.0, 1) if end is not None else None
+
+
+def _fallback_price(position) -> Optional[float]:
+    for attr in ("current_price", "avg_entry_price"):
+        try:
+            value = float(getattr(position, attr, None))
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    return None
+
+
+def close_positions(
+    targets: List[Dict],
+    wait_for_fill: Callable[..., Tuple[Optional[float], Optional[datetime]]],
+    max_workers: int = 16,
+    per_account_concurrency: int = 4,
+    min_interval_sec: float = 0.05,
+    fill_timeout_sec: float = 15.0,
+    logger=None,
+) -> List[Dict]:
+    """Close every target position; returns one outcome dict per target, in order.
+
+    Targets are dicts with ``user_id``, ``username``, ``symbol``, ``api`` and
+    ``account_key``. Outcome ``status`` is ``closed``, ``linked`` (same
+    account and symbol as an earlier target) or ``error``. When a close is
+    shared, no outcome of that group carries a ``position_obj``: the account
+    position covers every user in it, so the recorder prices each of them
+    from their own open trade.
+    """
+    started = time.monotonic()
+    primaries: Dict[Tuple[str, str], int] = {}
+    group_sizes: Dict[Tuple[str, str], int] = {}
+    for index, target in enumerate(targets):
+        key = (target["account_key"], target["symbol"].replace("/", ""))
+        primaries.setdefault(key, index)
+        group_sizes[key] = group_sizes.get(key, 0) + 1
+    limiters = {account_key: _AccountLimiter(per_account_concurrency, min_interval_sec) for account_key, _sym in primaries}
+
+    def close_one(target: Dict) -> Dict:
+        api = target["api"]
+        api_symbol = target["symbol"].replace("/", "")
+        outcome = {"status": "error", "close_order_id": None, "position_obj": None, "close_price": None,
+                   "close_time": None, "price_source": None, "error": None}
+        submitted_at = None
+        filled_at = None
+        try:
+            with limiters[target["account_key"]]:
+                position = api.get_position(api_symbol)
+                order = api.close_position(api_symbol)
+            submitted_at = time.monotonic()
+            order_id = str(getattr(order, "id", "") or "")
+            outcome.update(status="closed", close_order_id=order_id, position_obj=position)
+            price, fill_time = wait_for_fill(api, order_id, api_symbol, timeout_sec=fill_timeout_sec)
+            filled_at = time.monotonic()
+            if price is not None:
+                outcome.update(close_price=price, close_time=fill_time or datetime.now(timezone.utc), price_source="fill")
+            else:
+                outcome.update(close_price=_fallback_price(position), close_time=datetime.now(timezone.utc), price_source="position_fallback")
+        except Exception as e:
+            outcome["error"] = str(e)
+            if logger:
+                logger.error(f"[BULK_CLOSE] Failed to close {api_symbol} for {target.get('username')}: {e}")
+        outcome["timing_ms"] = {
+            "submit": _ms(started, submitted_at),
+            "fill": _ms(submitted_at, filled_at) if submitted_at is not None else None,
+            "total": _ms(started, time.monotonic()),
+        }
+        return outcome
+
+    unique = sorted(set(primaries.values()))
+    outcomes: Dict[int, Dict] = {}
+    if unique:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique))), thread_name_prefix="bulk-close") as executor:
+            futures = {index: executor.submit(close_one, targets[index]) for index in unique}
+            for index, future in futures.items():
+                outcomes[index] = future.result()
+
+    results = []
+    for index, target in enumerate(targets):
+        key = (target["account_key"], target["symbol"].replace("/", ""))
+        primary = primaries[key]
+        outcome = dict(outcomes[primary])
+        if group_sizes[key] > 1:
+            outcome["position_obj"] = None
+        if primary != index and outcome["status"] == "closed":
+            outcome["status"] = "linked"
+            outcome["linked_to"] = targets[primary]["username"]
+        outcome.update(user_id=target["user_id"], username=target["username"], symbol=target["symbol"])
+        results.append(outcome)
+    return results
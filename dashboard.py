@@ -3,7 +3,6 @@ import os
 import logging
 import subprocess
 import csv
-import io
 import uuid
 import hashlib
 from logging.handlers import RotatingFileHandler
@@ -16,7 +15,6 @@ import secrets
 import re
 from urllib.parse import urlsplit
 from functools import wraps
-from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 
 from flask import (
@@ -28,14 +26,24 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 import requests
 
-from alpaca_api import LegacyCompatibleAlpacaClient
+from alpaca_clients import alpaca_clients
 from models import db, Trade, User
 import strategy_config as strategy_store
 from stock_intelligence import StockIntelligenceService, parse_symbols
 from symbol_memory import create_symbol_memory
+from engine_state import remove_engine_state
+from event_sink import get_event_sink, tail_events
+from market_feed import load_price_snapshot
 from market_news import MarketNewsCollector
 import news_sources as news_sources_store
-from trade_db import record_open_trade, record_closed_trade
+from trade_db import record_open_trade, record_closed_trade, record_closed_trades, wait_for_order_fill
+from bulk_close import close_positions
+from response_cache import ResponseCache
+from fanout import FanoutExecutor
+from strategy_jobs import JOBS_DB_FILENAME, JobSignal, StrategyJobStore
+from bar_warehouse import alpaca_fetcher, create_bar_warehouse
+from bar_payload import bars_to_csv, is_bars_digest, load_bars_npz, read_bars_csv, write_bars_npz
+from trade_stats import trade_stats
 from utils import encrypt_data, decrypt_data
 
 # --- Initialization ---
@@ -92,9 +100,14 @@ VERSION_COUNTER_FILE = os.path.join(app.instance_path, 'version_counter.txt')
 STRATEGY_REPORT_FILE = os.path.join(app.instance_path, 'strategy_last_report.json')
 STRATEGY_TOP_FILE = os.path.join(app.instance_path, 'strategy_last_top.csv')
 STRATEGY_JOBS_DIR = os.path.join(app.instance_path, 'strategy_jobs')
+STRATEGY_BARS_DIR = os.path.join(app.instance_path, 'strategy_bars')
 STRATEGY_CONFIG_VERSIONS_DIR = os.path.join(app.instance_path, 'strategy_config_versions')
 STRATEGY_EVENTS_FILE = os.path.join(app.instance_path, 'strategy_events.jsonl')
+trade_stats.configure(app.instance_path)
 STRATEGY_WORKER_TOKEN = os.getenv('STRATEGY_WORKER_TOKEN', INTERNAL_API_KEY)
+# Remote workers may hold /remote_jobs/next open this long waiting for a job.
+STRATEGY_LONG_POLL_MAX_SEC = max(0.0, float(os.getenv('STRATEGY_LONG_POLL_MAX_SEC', '25')))
+STRATEGY_WORKER_LIVE_SEC = float(os.getenv('STRATEGY_WORKER_LIVE_SEC', '90'))
 LOGIN_RATE_LIMIT_WINDOW_SEC = int(os.getenv('LOGIN_RATE_LIMIT_WINDOW_SEC', '600'))
 LOGIN_RATE_LIMIT_MAX_ATTEMPTS = int(os.getenv('LOGIN_RATE_LIMIT_MAX_ATTEMPTS', '8'))
 PASSWORD_MIN_LENGTH = int(os.getenv('PASSWORD_MIN_LENGTH', '10'))
@@ -103,12 +116,22 @@ STOCK_INTELLIGENCE_ENABLED = os.getenv('STOCK_INTELLIGENCE_ENABLED', 'true').low
 # instance dir, so the dashboard can show precomputed analysis without an LLM call.
 STOCK_SYMBOL_MEMORY = create_symbol_memory(app.instance_path, app.logger)
 os.makedirs(STRATEGY_JOBS_DIR, exist_ok=True)
+# Job metadata lives in an indexed SQLite table; bars/report/top artifacts stay
+# as files in STRATEGY_JOBS_DIR.
+STRATEGY_JOB_STORE = StrategyJobStore(
+    os.path.join(app.instance_path, JOBS_DB_FILENAME),
+    legacy_dir=STRATEGY_JOBS_DIR,
+    logger=app.logger,
+)
+# Historical bars shared with the optimizer and the live engine's warmup.
+BAR_WAREHOUSE = create_bar_warehouse(app.instance_path, app.logger)
+# Woken whenever a job is queued so long-polling workers claim it immediately.
+STRATEGY_JOB_SIGNAL = JobSignal()
 os.makedirs(STRATEGY_CONFIG_VERSIONS_DIR, exist_ok=True)
 
 LOGIN_ATTEMPTS = {}
 LOGIN_ATTEMPTS_LOCK = threading.Lock()
-STRATEGY_JOB_LOCK = threading.Lock()
-CSRF_EXEMPT_ENDPOINTS = {'webhook', 'record_trade_internal', 'api_strategy_remote_next', 'api_strategy_remote_complete'}
+CSRF_EXEMPT_ENDPOINTS = {'webhook', 'record_trade_internal', 'api_strategy_remote_next', 'api_strategy_remote_complete', 'api_strategy_remote_heartbeat'}
 
 # --- Enhanced Logging Setup ---
 log_handler = RotatingFileHandler('dashboard.log', maxBytes=100000, backupCount=5)
@@ -278,70 +301,63 @@ def superuser_required(f):
 # The dashboard runs on a single Gunicorn worker and several pages poll Alpaca
 # every few seconds. Rebuilding a TradingClient per request forced a fresh TLS
 # handshake each time, and concurrent polls fanned out one network call per user
-# serially. Caching the client per user (so the HTTPS connection is reused) plus
-# a short TTL cache on positions/account keeps menu navigation responsive.
-_ALPACA_CLIENT_CACHE = {}
-_ALPACA_CLIENT_LOCK = threading.Lock()
-_ALPACA_RESP_CACHE = {}
-_ALPACA_RESP_LOCK = threading.Lock()
+# serially. Clients come from the process-wide registry (so the HTTPS connection
+# is reused) plus a short TTL cache on positions/account, keyed per Alpaca
+# account and loaded single-flight, keeps menu navigation responsive.
 ALPACA_POSITIONS_TTL_SEC = float(os.getenv('ALPACA_POSITIONS_TTL_SEC', '5'))
 ALPACA_ACCOUNT_TTL_SEC = float(os.getenv('ALPACA_ACCOUNT_TTL_SEC', '8'))
 ALPACA_FETCH_MAX_WORKERS = int(os.getenv('ALPACA_FETCH_MAX_WORKERS', '8'))
+BULK_CLOSE_MAX_WORKERS = int(os.getenv('BULK_CLOSE_MAX_WORKERS', '16'))
+BULK_CLOSE_ACCOUNT_CONCURRENCY = int(os.getenv('BULK_CLOSE_ACCOUNT_CONCURRENCY', '4'))
+BULK_CLOSE_FILL_TIMEOUT_SEC = float(os.getenv('BULK_CLOSE_FILL_TIMEOUT_SEC', '15'))
+ALPACA_FANOUT = FanoutExecutor(
+    max_workers=ALPACA_FETCH_MAX_WORKERS,
+    per_key_concurrency=int(os.getenv('ALPACA_FETCH_PER_ACCOUNT', '2')),
+    logger=app.logger,
+)
+ALPACA_FANOUT_DEADLINE_SEC = float(os.getenv('ALPACA_FETCH_DEADLINE_SEC', '10'))
+_ALPACA_RESP_CACHE = ResponseCache(
+    max_entries=int(os.getenv('ALPACA_CACHE_MAX_ENTRIES', '512')),
+    stale_sec=float(os.getenv('ALPACA_CACHE_STALE_SEC', '30')),
+    logger=app.logger,
+)
 
 
 def get_user_api(user):
-    key = decrypt_data(user.encrypted_alpaca_key)
-    secret = decrypt_data(user.encrypted_alpaca_secret)
-    if not key or not secret:
-        return None
-    fingerprint = hashlib.sha1(f"{key}:{secret}:{BASE_URL}".encode("utf-8")).hexdigest()
-    with _ALPACA_CLIENT_LOCK:
-        cached = _ALPACA_CLIENT_CACHE.get(user.id)
-        if cached and cached[0] == fingerprint:
-            return cached[1]
     try:
-        client = LegacyCompatibleAlpacaClient(key, secret, BASE_URL)
+        return alpaca_clients.client_for_user(user, BASE_URL)
     except Exception as e:
         app.logger.error(f"[API_FAIL] Failed to initialize Alpaca API for {user.username}: {e}")
         return None
-    with _ALPACA_CLIENT_LOCK:
-        _ALPACA_CLIENT_CACHE[user.id] = (fingerprint, client)
-    return client
 
 
 def _cached_alpaca_call(cache_key, ttl, loader):
-    """Return a recent Alpaca response if one was fetched within `ttl` seconds,
-    otherwise call `loader()` and cache it. The network call runs outside the
-    lock so concurrent pollers never serialize behind each other."""
-    now = time.monotonic()
-    with _ALPACA_RESP_LOCK:
-        entry = _ALPACA_RESP_CACHE.get(cache_key)
-        if entry and (now - entry[0]) < ttl:
-            return entry[1]
-    value = loader()
-    with _ALPACA_RESP_LOCK:
-        _ALPACA_RESP_CACHE[cache_key] = (time.monotonic(), value)
-    return value
+    """Return a recent Alpaca response for `cache_key`, loading it at most once
+    at a time; entries slightly past `ttl` are served while a background refresh
+    runs (see response_cache.ResponseCache)."""
+    return _ALPACA_RESP_CACHE.get(cache_key, ttl, loader)
+
+
+def _account_cache_key(kind, api):
+    """Cache key shared by every user on the same Alpaca keys."""
+    return f"{kind}:{hashlib.sha256(str(api.api_key).encode('utf-8')).hexdigest()[:16]}"
 
 
 def _map_users_parallel(users, fn):
-    """Run `fn(user)` for each user concurrently and return {user_id: result}.
+    """Run `fn(user)` for each user on the shared fan-out pool and return
+    {user_id: result}; users whose call fails or misses the deadline map to None.
     Workers must only touch already-loaded attributes / network calls — never the
     SQLAlchemy session — because they run off the request thread."""
     users = [u for u in users if u]
     if not users:
         return {}
-    workers = min(max(1, len(users)), ALPACA_FETCH_MAX_WORKERS)
-    results = {}
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_map = {executor.submit(fn, u): u for u in users}
-        for future, user in future_map.items():
-            try:
-                results[user.id] = future.result()
-            except Exception as e:
-                app.logger.warning(f"[PARALLEL_FETCH] Failed for {getattr(user, 'username', '?')}: {e}")
-                results[user.id] = None
-    return results
+    results = ALPACA_FANOUT.map(users, fn, key_fn=_user_account_key, deadline_sec=ALPACA_FANOUT_DEADLINE_SEC)
+    return {user.id: result for user, result in zip(users, results)}
+
+
+def _user_account_key(user):
+    creds = get_user_keypair(user)
+    return creds[0] if creds else f"user:{user.id}"
 
 def regular_users_query():
     return User.query.filter_by(is_superuser=False)
@@ -378,11 +394,7 @@ def get_pooled_trading_user():
     return User.query.filter_by(is_superuser=True).order_by(User.id).first()
 
 def get_user_keypair(user):
-    key = decrypt_data(user.encrypted_alpaca_key)
-    secret = decrypt_data(user.encrypted_alpaca_secret)
-    if not key or not secret:
-        return None
-    return key, secret
+    return alpaca_clients.credentials(user)
 
 def run_command(command, cwd=None, timeout=30):
     try:
@@ -515,8 +527,7 @@ def emit_strategy_event(event_type, **fields):
     }
     payload.update(fields)
     try:
-        with open(STRATEGY_EVENTS_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, sort_keys=True, default=str) + "\n")
+        get_event_sink(STRATEGY_EVENTS_FILE, app.logger).write(payload)
     except Exception as e:
         app.logger.warning("[STRATEGY] Failed to write event log: %s", e)
 
@@ -563,17 +574,7 @@ def load_strategy_events(limit=30):
     collected = []
     try:
         for path in files:
-            if not os.path.exists(path):
-                continue
-            with open(path, "r", encoding="utf-8") as f:
-                lines = f.readlines()[-limit:]
-            for line in lines:
-                try:
-                    item = json.loads(line)
-                    if isinstance(item, dict):
-                        collected.append(item)
-                except Exception:
-                    continue
+            collected.extend(tail_events(path, limit))
         collected.sort(key=lambda item: item.get('ts_utc', ''), reverse=True)
         return collected[:limit]
     except Exception:
@@ -739,10 +740,6 @@ def load_strategy_top_rows(limit=20):
         return []
     return rows
 
-def strategy_job_path(job_id):
-    safe_id = ''.join(ch for ch in str(job_id) if ch.isalnum() or ch in ('-', '_'))
-    return os.path.join(STRATEGY_JOBS_DIR, f"{safe_id}.json")
-
 def strategy_job_bars_path(job_id):
     safe_id = ''.join(ch for ch in str(job_id) if ch.isalnum() or ch in ('-', '_'))
     return os.path.join(STRATEGY_JOBS_DIR, f"{safe_id}_bars.csv")
@@ -756,38 +753,19 @@ def strategy_job_top_path(job_id):
     return os.path.join(STRATEGY_JOBS_DIR, f"{safe_id}_top.csv")
 
 def save_strategy_job(job):
-    os.makedirs(STRATEGY_JOBS_DIR, exist_ok=True)
-    path = strategy_job_path(job.get('id', 'unknown'))
-    tmp_path = f"{path}.tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(job, f, indent=2)
-    os.replace(tmp_path, path)
+    STRATEGY_JOB_STORE.save(job)
+    if job.get('status') == 'queued':
+        STRATEGY_JOB_SIGNAL.notify()
 
 def load_strategy_job(job_id):
-    path = strategy_job_path(job_id)
-    if not os.path.exists(path):
-        return None
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return STRATEGY_JOB_STORE.get(job_id)
     except Exception as e:
         app.logger.error(f"[STRATEGY_REMOTE] Failed to load job {job_id}: {e}")
         return None
 
-def list_strategy_jobs(limit=8):
-    jobs = []
-    if not os.path.isdir(STRATEGY_JOBS_DIR):
-        return jobs
-    for name in os.listdir(STRATEGY_JOBS_DIR):
-        if not name.endswith(".json"):
-            continue
-        if name.endswith("_report.json") or name.endswith(".tmp"):
-            continue
-        job = load_strategy_job(name[:-5])
-        if job and isinstance(job, dict) and job.get('id') == name[:-5]:
-            jobs.append(job)
-    jobs.sort(key=lambda item: item.get('created_at_utc', ''), reverse=True)
-    return jobs[:limit]
+def list_strategy_jobs(limit=8, statuses=None, compute_target=None):
+    return STRATEGY_JOB_STORE.list(limit=limit, statuses=statuses, compute_target=compute_target)
 
 def load_strategy_job_report(job_id):
     path = strategy_job_report_path(job_id)
@@ -939,11 +917,7 @@ def find_active_strategy_job(config, compute_target):
     timeframe = str(config.get('timeframe', '') or '')
     session_name = str(config.get('session', '') or '')
     feed = str(config.get('feed', '') or '')
-    for job in list_strategy_jobs(limit=500):
-        if job.get('status') not in ('queued', 'running'):
-            continue
-        if job.get('compute_target') != compute_target:
-            continue
+    for job in list_strategy_jobs(limit=500, statuses=('queued', 'running'), compute_target=compute_target):
         job_fingerprint = str(job.get('config_fingerprint') or '').strip()
         if fingerprint and job_fingerprint and job_fingerprint == fingerprint:
             return job
@@ -995,11 +969,9 @@ def summarize_strategy_report(report, source='local', job_id=None):
 
 
 def delete_strategy_job(job_id):
-    job = load_strategy_job(job_id)
-    if not job:
+    if not STRATEGY_JOB_STORE.delete(job_id):
         return False
     targets = [
-        strategy_job_path(job_id),
         strategy_job_bars_path(job_id),
         strategy_job_report_path(job_id),
         strategy_job_top_path(job_id),
@@ -1288,6 +1260,8 @@ def build_strategy_optimizer_args(config, report_path, top_path, bars_csv_path=N
     alpaca_user = str(config.get("alpaca_user", "") or "").strip()
     if alpaca_user and not bars_csv_path:
         args.extend(["--alpaca-user", alpaca_user])
+    if BAR_WAREHOUSE is not None and not bars_csv_path:
+        args.extend(["--bars-source", "warehouse"])
     return args
 
 def run_strategy_optimizer(config, report_path, top_path):
@@ -1295,7 +1269,7 @@ def run_strategy_optimizer(config, report_path, top_path):
     command = [venv_python] + build_strategy_optimizer_args(config, report_path, top_path)
     return run_command(command, cwd=REPO_PATH, timeout=900)
 
-def fetch_strategy_bars_csv(config):
+def fetch_strategy_bars(config):
     start_iso = local_strategy_datetime_to_utc_iso(config.get("backtest_start_date"), config.get("backtest_start_time"))
     end_iso = local_strategy_datetime_to_utc_iso(config.get("backtest_end_date"), config.get("backtest_end_time"), cap_now=True)
     if not start_iso or not end_iso:
@@ -1307,14 +1281,19 @@ def fetch_strategy_bars_csv(config):
     if not api:
         raise ValueError(f"Alpaca API is not configured for user '{api_user.username}'.")
     symbol = strategy_store.normalize_symbol(config.get("symbol", ""))
-    bars = api.get_bars(
-        symbol,
-        strategy_fetch_timeframe(config),
-        start=start_iso,
-        end=end_iso,
-        adjustment="raw",
-        feed=str(config.get("feed", "iex")),
-    ).df
+    if BAR_WAREHOUSE is not None:
+        bars = BAR_WAREHOUSE.ensure(
+            alpaca_fetcher(api), symbol, strategy_fetch_timeframe(config), str(config.get("feed", "iex")), start_iso, end_iso,
+        )
+    else:
+        bars = api.get_bars(
+            symbol,
+            strategy_fetch_timeframe(config),
+            start=start_iso,
+            end=end_iso,
+            adjustment="raw",
+            feed=str(config.get("feed", "iex")),
+        ).df
     if bars.empty:
         raise ValueError(f"No bars returned from Alpaca for {symbol}.")
     df = bars.copy()
@@ -1329,27 +1308,46 @@ def fetch_strategy_bars_csv(config):
     missing = [col for col in columns if col not in df.columns]
     if missing:
         raise ValueError(f"Alpaca bars missing columns: {', '.join(missing)}")
-    buf = io.StringIO()
-    df[columns].to_csv(buf, index=False)
-    return buf.getvalue()
+    return df[columns]
 
 
-def ensure_remote_job_bars_csv(job):
+def strategy_bars_path(digest):
+    return os.path.join(STRATEGY_BARS_DIR, f"{digest}.npz")
+
+def ensure_remote_job_bars(job):
+    """Store the job's bars once as a content-addressed .npz and return its metadata."""
     job_id = str((job or {}).get('id') or '').strip()
     if not job_id:
         raise ValueError("Remote job is missing id.")
-    bars_path = strategy_job_bars_path(job_id)
+    digest = str(job.get('bars_sha256') or '')
+    if not (is_bars_digest(digest) and os.path.exists(strategy_bars_path(digest))):
+        legacy_path = strategy_job_bars_path(job_id)
+        if os.path.exists(legacy_path):
+            bars = read_bars_csv(legacy_path)
+        else:
+            job_config = job.get('config') if isinstance(job.get('config'), dict) else job
+            bars = fetch_strategy_bars(job_config)
+        digest, _path, rows = write_bars_npz(bars, STRATEGY_BARS_DIR)
+        job['bars_sha256'] = digest
+        job['bars_rows'] = rows
+        job['updated_at_utc'] = datetime.now(timezone.utc).isoformat()
+        save_strategy_job(job)
+    return {
+        'format': 'npz',
+        'sha256': digest,
+        'rows': job.get('bars_rows'),
+        'bytes': os.path.getsize(strategy_bars_path(digest)),
+        'url': f"/api/admin/strategy/bars/{digest}.npz",
+    }
+
+def ensure_remote_job_bars_csv(job):
+    # Workers that predate .npz payloads still get the bars inline as CSV.
+    bars_path = strategy_job_bars_path(str((job or {}).get('id') or ''))
     if os.path.exists(bars_path):
         with open(bars_path, "r", encoding="utf-8") as f:
             return f.read()
-    job_config = job.get('config') if isinstance(job.get('config'), dict) else job
-    bars_csv = fetch_strategy_bars_csv(job_config)
-    with open(bars_path, "w", encoding="utf-8") as f:
-        f.write(bars_csv)
-    job['bars_csv_file'] = os.path.basename(bars_path)
-    job['updated_at_utc'] = datetime.now(timezone.utc).isoformat()
-    save_strategy_job(job)
-    return bars_csv
+    meta = ensure_remote_job_bars(job)
+    return bars_to_csv(load_bars_npz(strategy_bars_path(meta['sha256'])))
 
 def create_strategy_job(config, compute_target):
     job_id = uuid.uuid4().hex
@@ -1763,8 +1761,8 @@ def admin_strategy():
         elif action == 'delete_queued_jobs':
             queued_ids = [
                 str(job.get('id') or '').strip()
-                for job in list_strategy_jobs(limit=1000)
-                if str(job.get('status') or '').strip().lower() == 'queued' and str(job.get('id') or '').strip()
+                for job in list_strategy_jobs(limit=1000, statuses=('queued',))
+                if str(job.get('id') or '').strip()
             ]
             if not queued_ids:
                 flash("No queued optimizer runs found.", "warning")
@@ -1898,6 +1896,7 @@ def admin_strategy():
         top_rows=top_rows,
         users=users,
         all_jobs=enrich_strategy_jobs(list_strategy_jobs(limit=50), config),
+        remote_workers=summarize_strategy_workers(),
         config_versions=load_strategy_config_versions(limit=8),
         strategy_events=load_strategy_events(limit=25),
         tradable_symbols=load_cached_tradable_assets(),
@@ -1919,9 +1918,22 @@ def api_admin_strategy_live_snapshot():
         return jsonify({'error': 'api_not_configured'}), 400
 
     rows = []
-    for item in strategy_store.normalize_universe(config.get('universe')):
+    # Prices streamed by the local strategy engine (LOCAL_STRATEGY_MARKET_DATA=stream)
+    # are used while fresh; other symbols fall back to a REST request.
+    streamed_prices = load_price_snapshot(app.instance_path)
+    snapshot = strategy_store.snapshot_for(config)
+    for item in snapshot.universe:
         symbol = item['symbol']
-        if not item.get('enabled', True) or not strategy_store.local_allowed_for_symbol(symbol, config):
+        if not item.get('enabled', True) or snapshot.mode_for(symbol) not in ('local', 'both'):
+            continue
+        if symbol in streamed_prices:
+            rows.append({
+                'symbol': symbol,
+                'mode': item.get('mode', 'both'),
+                'price': streamed_prices[symbol],
+                'source': 'Alpaca stream',
+                'status': 'ok',
+            })
             continue
         try:
             trade = api.get_latest_trade(symbol)
@@ -1982,33 +1994,40 @@ def api_strategy_remote_next():
     if not is_strategy_worker_authorized():
         return jsonify({'error': 'unauthorized'}), 401
     worker_name = request.args.get('worker') or request.headers.get('X-Strategy-Worker') or 'remote-worker'
+    bars_format = str(request.args.get('bars') or '').strip().lower()
+    try:
+        wait_sec = min(max(float(request.args.get('wait', 0) or 0), 0.0), STRATEGY_LONG_POLL_MAX_SEC)
+    except (TypeError, ValueError):
+        wait_sec = 0.0
+    deadline = time.monotonic() + wait_sec
     while True:
-        with STRATEGY_JOB_LOCK:
-            queued = [job for job in list_strategy_jobs(limit=200) if job.get('status') == 'queued']
-            queued.sort(key=lambda item: item.get('created_at_utc', ''))
-            if not queued:
+        seen_generation = STRATEGY_JOB_SIGNAL.generation
+        job = STRATEGY_JOB_STORE.claim_next(worker_name)
+        if not job:
+            STRATEGY_JOB_STORE.record_worker(worker_name, 'waiting')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 return jsonify({'job': None})
-            job = queued[0]
-            now_iso = datetime.now(timezone.utc).isoformat()
-            job['status'] = 'running'
-            job['worker'] = worker_name
-            job['started_at_utc'] = now_iso
-            job['updated_at_utc'] = now_iso
-            save_strategy_job(job)
+            # Jobs queued by another dashboard process do not signal this one,
+            # so re-check the table every few seconds as well.
+            STRATEGY_JOB_SIGNAL.wait(seen_generation, min(remaining, 5.0))
+            continue
+        STRATEGY_JOB_STORE.record_worker(worker_name, 'busy', job_id=job.get('id'))
         try:
-            bars_csv = job.get('bars_csv', '') or ensure_remote_job_bars_csv(job)
-            return jsonify({
-                'job': {
-                    'id': job['id'],
-                    'symbol': job.get('symbol'),
-                    'strategy': job.get('strategy', 'keltner'),
-                    'timeframe': job.get('timeframe'),
-                    'optimizer_engine': job.get('optimizer_engine', 'tpe'),
-                    'accelerator': job.get('accelerator', 'auto'),
-                    'optimizer_args': job.get('optimizer_args', []),
-                    'bars_csv': bars_csv,
-                }
-            })
+            payload = {
+                'id': job['id'],
+                'symbol': job.get('symbol'),
+                'strategy': job.get('strategy', 'keltner'),
+                'timeframe': job.get('timeframe'),
+                'optimizer_engine': job.get('optimizer_engine', 'tpe'),
+                'accelerator': job.get('accelerator', 'auto'),
+                'optimizer_args': job.get('optimizer_args', []),
+            }
+            if bars_format == 'npz' and not job.get('bars_csv'):
+                payload['bars'] = ensure_remote_job_bars(job)
+            else:
+                payload['bars_csv'] = job.get('bars_csv', '') or ensure_remote_job_bars_csv(job)
+            return jsonify({'job': payload})
         except Exception as e:
             app.logger.error("[STRATEGY] Failed to prepare remote job %s for %s: %s", job.get('id'), job.get('symbol'), e)
             job['status'] = 'failed'
@@ -2027,6 +2046,47 @@ def api_strategy_remote_next():
             )
             continue
 
+@app.route('/api/admin/strategy/bars/<digest>.npz')
+def api_strategy_bars(digest):
+    if not is_strategy_worker_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    if not is_bars_digest(digest) or not os.path.exists(strategy_bars_path(digest)):
+        return jsonify({'error': 'bars_not_found'}), 404
+    response = send_from_directory(STRATEGY_BARS_DIR, f"{digest}.npz", mimetype='application/octet-stream', max_age=31536000)
+    # Content-addressed: the name is the checksum, so the file never changes.
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/admin/strategy/remote_workers/heartbeat', methods=['POST'])
+def api_strategy_remote_heartbeat():
+    if not is_strategy_worker_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    data = request.get_json(silent=True) or {}
+    worker_name = str(data.get('worker') or request.headers.get('X-Strategy-Worker') or '').strip()[:120]
+    status = str(data.get('status') or 'idle').strip().lower()
+    if not worker_name or status not in ('waiting', 'busy', 'idle', 'stopped'):
+        return jsonify({'error': 'invalid_heartbeat'}), 400
+    info = data.get('info') if isinstance(data.get('info'), dict) else None
+    STRATEGY_JOB_STORE.record_worker(worker_name, status, job_id=data.get('job_id') or None, info=info)
+    return jsonify({'ok': True})
+
+def summarize_strategy_workers():
+    workers = STRATEGY_JOB_STORE.workers(live_sec=STRATEGY_WORKER_LIVE_SEC)
+    live = [item for item in workers if item['live']]
+    return {
+        'live': len(live),
+        'busy': sum(1 for item in live if item['status'] == 'busy'),
+        'available': sum(1 for item in live if item['status'] in ('waiting', 'idle')),
+        'queued_jobs': STRATEGY_JOB_STORE.count(('queued',)),
+        'workers': workers,
+    }
+
+@app.route('/api/admin/strategy/remote_workers')
+@superuser_required
+def api_admin_strategy_remote_workers():
+    return jsonify(summarize_strategy_workers())
+
 @app.route('/api/admin/strategy/remote_jobs/<job_id>/complete', methods=['POST'])
 def api_strategy_remote_complete(job_id):
     if not is_strategy_worker_authorized():
@@ -2051,6 +2111,8 @@ def api_strategy_remote_complete(job_id):
     job['stderr'] = stderr
     job['updated_at_utc'] = now_iso
     job['completed_at_utc'] = now_iso
+    if job.get('worker'):
+        STRATEGY_JOB_STORE.record_worker(job['worker'], 'idle')
 
     if returncode == 0 and isinstance(report, dict):
         report_path = strategy_job_report_path(job_id)
@@ -2180,6 +2242,8 @@ def backfill_admin_trades_for_shared_keys():
             created += 1
 
     db.session.commit()
+    if created:
+        trade_stats.invalidate()
     return {'shared_users': len(shared_users), 'created': created, 'skipped': skipped}
 
 @app.route('/admin/backfill_trades', methods=['POST'])
@@ -2295,13 +2359,11 @@ def admin_reset_trade_history():
 
         deleted = Trade.query.delete()
         db.session.commit()
+        trade_stats.invalidate()
 
         local_state_removed = False
         if clear_local_state:
-            local_state_path = os.path.join(app.instance_path, 'local_strategy_state.json')
-            if os.path.exists(local_state_path):
-                os.remove(local_state_path)
-                local_state_removed = True
+            local_state_removed = remove_engine_state(app.instance_path)
             if BOT_SERVICE_NAME:
                 def restart_bot_after_state_reset():
                     ok, out, err = run_command(["sudo", "systemctl", "restart", BOT_SERVICE_NAME], cwd=REPO_PATH, timeout=60)
@@ -2519,6 +2581,8 @@ def admin_delete_user(user_id):
         Trade.query.filter_by(user_id=user.id).delete()
         db.session.delete(user)
         db.session.commit()
+        trade_stats.invalidate(user_id)
+        alpaca_clients.invalidate(user_id)
         flash(f"User {user.username} and all their trades have been deleted.", 'success')
     else:
         flash("Cannot delete a superuser or user not found.", 'danger')
@@ -2679,7 +2743,10 @@ def api_admin_health_data():
         'dashboard_log_summary': dashboard_summary,
         'dashboard_log_details': dashboard_details,
         'trades_log_summary': trades_summary,
-        'trades_log_details': trades_details
+        'trades_log_details': trades_details,
+        'alpaca_clients': alpaca_clients.stats(),
+        'alpaca_cache': _ALPACA_RESP_CACHE.stats(),
+        'alpaca_fanout': ALPACA_FANOUT.stats(),
     })
 
 @app.route('/api/admin/dashboard_summary')
@@ -2691,8 +2758,8 @@ def api_admin_dashboard_summary():
         api = get_user_api(user)
         if not api:
             return {'has_api': False}
-        account = _cached_alpaca_call(f"account:{user.id}", ALPACA_ACCOUNT_TTL_SEC, api.get_account)
-        positions = _cached_alpaca_call(f"positions:{user.id}", ALPACA_POSITIONS_TTL_SEC, api.list_positions)
+        account = _cached_alpaca_call(_account_cache_key("account", api), ALPACA_ACCOUNT_TTL_SEC, api.get_account)
+        positions = _cached_alpaca_call(_account_cache_key("positions", api), ALPACA_POSITIONS_TTL_SEC, api.list_positions)
         total_pl = sum(float(p.unrealized_pl) for p in positions)
         return {
             'has_api': True,
@@ -2774,7 +2841,7 @@ def api_admin_all_open_positions():
         api = get_user_api(user)
         if not api:
             return None
-        return _cached_alpaca_call(f"positions:{user.id}", ALPACA_POSITIONS_TTL_SEC, api.list_positions)
+        return _cached_alpaca_call(_account_cache_key("positions", api), ALPACA_POSITIONS_TTL_SEC, api.list_positions)
 
     positions_by_user = _map_users_parallel(users_with_keys, load_positions)
     for user in users_with_keys:
@@ -2801,9 +2868,8 @@ def api_admin_close_trades():
     data = request.get_json()
     trades_to_close = data.get('trades', []) # Expect a list of {'user_id': X, 'symbol': 'Y'}
 
-    closed_count = 0
     errors = []
-
+    targets = []
     for trade_info in trades_to_close:
         user_id = trade_info.get('user_id')
         symbol = trade_info.get('symbol')
@@ -2817,36 +2883,75 @@ def api_admin_close_trades():
         if not api:
             errors.append(f"Could not initialize API for user {user.username}")
             continue
+        targets.append({
+            'user_id': user.id,
+            'username': user.username,
+            'symbol': symbol,
+            'api': api,
+            'account_key': api.api_key,
+        })
 
-        try:
-            api_symbol = symbol.replace('/', '')
-            position_to_close = api.get_position(api_symbol)
-            close_order = api.close_position(api_symbol)
-            app.logger.info(f"[ADMIN_ACTION] Admin '{g.user.username}' closed position {symbol} for user '{user.username}'.")
-            closed_count += 1
-            def record_close():
-                with app.app_context():
-                    payload = {'symbol': symbol, 'action': 'close'}
-                    data_dict = {'close_order_id': close_order.id}
-                    result = record_closed_trade(data_dict, payload, user.id, position_to_close)
-                    if result is None:
-                        fallback_price = getattr(position_to_close, 'current_price', None) or getattr(position_to_close, 'avg_entry_price', None)
-                        if fallback_price is not None:
-                            fallback_data = {
-                                'close_price': fallback_price,
-                                'close_time': datetime.now(timezone.utc).isoformat()
-                            }
-                            record_closed_trade(fallback_data, payload, user.id, position_to_close)
-            threading.Thread(target=record_close, daemon=True).start()
-        except Exception as e:
-            error_msg = f"Failed to close {symbol} for {user.username}: {e}"
+    started = time.monotonic()
+    # This process runs no trade-updates streams, so fills are confirmed over
+    # REST; wait_for_order_fill never opens a socket per touched account.
+    outcomes = close_positions(
+        targets,
+        wait_for_order_fill,
+        max_workers=BULK_CLOSE_MAX_WORKERS,
+        per_account_concurrency=BULK_CLOSE_ACCOUNT_CONCURRENCY,
+        fill_timeout_sec=BULK_CLOSE_FILL_TIMEOUT_SEC,
+        logger=app.logger,
+    )
+
+    to_record = []
+    report = []
+    for outcome in outcomes:
+        if outcome['status'] == 'error':
+            error_msg = f"Failed to close {outcome['symbol']} for {outcome['username']}: {outcome['error']}"
             app.logger.error(f"[ADMIN_ACTION] {error_msg}")
             errors.append(error_msg)
-
+        else:
+            app.logger.info(
+                f"[ADMIN_ACTION] Admin '{g.user.username}' closed position {outcome['symbol']} for user '{outcome['username']}'."
+            )
+            to_record.append({
+                'user_id': outcome['user_id'],
+                'symbol': outcome['symbol'],
+                'payload': {'symbol': outcome['symbol'], 'action': 'close'},
+                'position_obj': outcome['position_obj'],
+                'close_price': outcome['close_price'],
+                'close_time': outcome['close_time'],
+            })
+        report.append({
+            'user_id': outcome['user_id'],
+            'username': outcome['username'],
+            'symbol': outcome['symbol'],
+            'status': outcome['status'],
+            'close_order_id': outcome['close_order_id'],
+            'close_price': outcome['close_price'],
+            'price_source': outcome['price_source'],
+            'timing_ms': outcome['timing_ms'],
+        })
+    if outcomes:
+        _ALPACA_RESP_CACHE.invalidate('positions:')
+    if to_record:
+        try:
+            record_closed_trades(to_record)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"[ADMIN_ACTION] Failed to record {len(to_record)} bulk close(s): {e}")
+            errors.append(f"Positions closed but trade records failed: {e}")
+
+    closed_count = len(to_record)
+    body = {
+        'closed': closed_count,
+        'results': report,
+        'elapsed_ms': round((time.monotonic() - started) * 1000.0, 1),
+    }
     if errors:
-        return jsonify({'status': 'partial_success', 'closed': closed_count, 'errors': errors}), 207
+        return jsonify({'status': 'partial_success', 'errors': errors, **body}), 207
 
-    return jsonify({'status': 'success', 'closed': closed_count})
+    return jsonify({'status': 'success', **body})
 
 @app.route('/api/open_positions')
 @login_required
@@ -2877,7 +2982,7 @@ def api_open_positions():
         api = get_user_api(user)
         if not api:
             return None
-        return _cached_alpaca_call(f"positions:{user.id}", ALPACA_POSITIONS_TTL_SEC, api.list_positions)
+        return _cached_alpaca_call(_account_cache_key("positions", api), ALPACA_POSITIONS_TTL_SEC, api.list_positions)
 
     positions_by_user = _map_users_parallel(users, load_positions)
 
@@ -3107,7 +3212,7 @@ def api_account():
             api = get_user_api(user)
             if not api:
                 return None
-            return _cached_alpaca_call(f"account:{user.id}", ALPACA_ACCOUNT_TTL_SEC, api.get_account)
+            return _cached_alpaca_call(_account_cache_key("account", api), ALPACA_ACCOUNT_TTL_SEC, api.get_account)
 
         accounts_by_user = _map_users_parallel(users, load_account)
         total_equity = 0.0
@@ -3130,7 +3235,7 @@ def api_account():
     api = get_user_api(target_user)
     if not api: return jsonify({'equity': 0, 'cash': 0})
     try:
-        acct = _cached_alpaca_call(f"account:{target_user.id}", ALPACA_ACCOUNT_TTL_SEC, api.get_account)
+        acct = _cached_alpaca_call(_account_cache_key("account", api), ALPACA_ACCOUNT_TTL_SEC, api.get_account)
         return jsonify({'equity': float(acct.equity), 'cash': float(acct.cash)})
     except: return jsonify({'equity': 0, 'cash': 0})
 
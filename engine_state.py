@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""SQLite persistence for the local strategy engine state.
+
+The engine keeps its state as one dict (per-symbol bookkeeping, recoveries,
+API cooldown). It used to rewrite all of it as ``local_strategy_state.json`` on
+nearly every change. Here each per-symbol entry and each top-level field is a
+row in a WAL-mode SQLite table:
+
+* ``symbols/<state key>`` - one row per symbol/strategy state dict.
+* ``state/<field>`` - every other top-level field (``recoveries``, cooldown...).
+
+Values are JSON. The engine only upserts rows whose encoded value changed, in
+one transaction per flush. A legacy JSON file is imported on first start and
+renamed to ``*.json.migrated``.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+
+STATE_DB_FILENAME = "local_strategy_state.sqlite3"
+LEGACY_STATE_FILENAME = "local_strategy_state.json"
+SYMBOL_PREFIX = "symbols/"
+FIELD_PREFIX = "state/"
+
+
+class EngineStateStore:
+    def __init__(self, path: str, logger=None):
+        self.path = path
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS engine_state ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load(self) -> Dict[str, str]:
+        with self._lock:
+            rows = self._connect().execute("SELECT key, value FROM engine_state").fetchall()
+        return {key: value for key, value in rows}
+
+    def apply(self, upserts: Dict[str, str], deletes: Iterable[str] = ()) -> None:
+        """Write changed rows and drop removed ones in a single transaction."""
+        now = datetime.now(timezone.utc).isoformat()
+        deletes = list(deletes)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if upserts:
+                    conn.executemany(
+                        "INSERT INTO engine_state (key, value, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                        [(key, value, now) for key, value in upserts.items()],
+                    )
+                if deletes:
+                    conn.executemany("DELETE FROM engine_state WHERE key = ?", [(key,) for key in deletes])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def remove_engine_state(instance_path: str) -> bool:
+    """Delete the persisted engine state (SQLite files and any legacy JSON)."""
+    removed = False
+    base = os.path.join(instance_path, STATE_DB_FILENAME)
+    legacy = os.path.join(instance_path, LEGACY_STATE_FILENAME)
+    for path in (base, f"{base}-wal", f"{base}-shm", legacy):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""Buffered, rotating JSONL writer for the structured event logs.
+
+The strategy engine, the dashboard and the LLM validator all append one JSON
+line per event. ``EventSink`` keeps the file open on a background writer
+thread instead of opening it for every event:
+
+* ``write``/``write_line`` only encode the event and put it on a bounded
+  queue; when the queue is full the event is dropped and counted rather than
+  blocking a trading path.
+* The writer drains whatever is queued, appends it in one go and rotates the
+  file once it passes ``max_bytes`` or is older than ``rotate_seconds``. The
+  age counts from the segment's first write, recorded with the file's inode
+  in ``<file>.started`` so it survives restarts.
+  Rotated segments are named ``<file>.<UTC stamp>`` (gzip-compressed when
+  ``compress`` is set) and only the newest ``backup_count`` are kept
+  (``0`` keeps them all).
+* Several processes may write the same file. Appends hold a shared lock on
+  ``<file>.lock`` and reopen the file when its inode changed; rotation holds
+  the lock exclusively, so no process is still appending to a segment that
+  gets compressed and removed. (No cross-process lock where ``fcntl`` is
+  unavailable.)
+* ``iter_lines`` reads the full history, rotated segments first.
+* ``tail_events`` reads the last N events by seeking backwards from the end
+  of the file, falling back to rotated segments only when the live file holds
+  fewer than N lines.
+
+Use ``get_event_sink`` so every writer of the same path in a process shares
+one sink (and one writer thread).
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+_STOP = object()
+
+
+class EventSink:
+    def __init__(
+        self,
+        path: str,
+        logger=None,
+        max_bytes: int = 10 * 1024 * 1024,
+        rotate_seconds: float = 0.0,
+        backup_count: int = 10,
+        compress: bool = True,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.logger = logger
+        self.max_bytes = max(0, int(max_bytes))
+        self.rotate_seconds = max(0.0, float(rotate_seconds))
+        self.backup_count = max(0, int(backup_count))
+        self.compress = bool(compress)
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._fh = None
+        self._lock_fh = None
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- producers -------------------------------------------------------------
+    def write(self, event: Dict) -> None:
+        self.write_line(json.dumps(event, sort_keys=True, default=str))
+
+    def write_line(self, line: str) -> None:
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                self._warn("queue full, dropped %s event(s) for %s", self.dropped, self.path)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is on disk."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    # -- writer thread ---------------------------------------------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"event-sink:{os.path.basename(self.path)}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [item for item in items if isinstance(item, str)]
+            if lines:
+                self._append(lines)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in items):
+                self._close_file()
+                if self._lock_fh is not None:
+                    self._lock_fh.close()
+                    self._lock_fh = None
+                return
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool):
+        """Cross-process lock on ``<path>.lock``: shared for appends, exclusive for rotation."""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_fh is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._lock_fh = open(f"{self.path}.lock", "a")
+        fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+
+    def _is_current(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fh.fileno()).st_ino
+        except OSError:
+            return False
+
+    def _append(self, lines: List[str]) -> None:
+        try:
+            due_inode = None
+            with self._locked(exclusive=False):
+                # Another process may have rotated the file since the last batch.
+                if self._fh is not None and not self._is_current():
+                    self._close_file()
+                if self._fh is None:
+                    self._open_file()
+                self._fh.write("".join(line + "\n" for line in lines))
+                self._fh.flush()
+                if self._rotation_due():
+                    due_inode = os.fstat(self._fh.fileno()).st_ino
+            if due_inode is not None:
+                self._rotate(due_inode)
+        except Exception as exc:
+            self._warn("failed to write %s: %s", self.path, exc)
+            self._close_file()
+
+    def _open_file(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._opened_at = self._segment_started_at()
+
+    def _segment_started_at(self) -> float:
+        """When the live segment was started, from the ``<path>.started`` sidecar.
+
+        ctime cannot be used: it moves forward on every append.
+        """
+        marker = f"{self.path}.started"
+        try:
+            inode = os.fstat(self._fh.fileno()).st_ino
+            if self._fh.tell():
+                with open(marker, "r", encoding="utf-8") as fh:
+                    meta = json.load(fh)
+                if meta.get("inode") == inode:
+                    return float(meta["started"])
+            # A new segment, or one without a matching sidecar: its clock starts now.
+            started = time.time()
+            tmp = f"{marker}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"inode": inode, "started": started}, fh)
+            os.replace(tmp, marker)
+            return started
+        except (OSError, ValueError, KeyError, TypeError):
+            return time.time()
+
+    def _close_file(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def _rotation_due(self) -> bool:
+        size = self._fh.tell()
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.rotate_seconds and size and time.time() - self._opened_at >= self.rotate_seconds)
+
+    def rotate(self) -> Optional[str]:
+        """Move the live file to a stamped segment; called on the writer thread."""
+        return self._rotate()
+
+    def _rotate(self, expect_inode: Optional[int] = None) -> Optional[str]:
+        self._close_file()
+        with self._locked(exclusive=True):
+            try:
+                inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                return None
+            if expect_inode is not None and inode != expect_inode:
+                return None  # another writer rotated it first
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+            segment = f"{self.path}.{stamp}"
+            os.replace(self.path, segment)
+        # Writers reopen the live file before appending, so nobody writes to
+        # the segment once the exclusive lock is released.
+        if self.compress:
+            with open(segment, "rb") as src, gzip.open(f"{segment}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+            segment = f"{segment}.gz"
+        if self.backup_count:
+            for old in rotated_segments(self.path)[:-self.backup_count]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return segment
+
+    def _warn(self, msg, *args):
+        if self.logger:
+            self.logger.warning("[EVENT_SINK] " + msg, *args)
+
+
+def rotated_segments(path: str) -> List[str]:
+    """Rotated segments of ``path``, oldest first."""
+    return sorted(glob.glob(glob.escape(path) + ".*T*Z*"))
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """Every line of ``path``: rotated segments oldest first (gzip included), then the live file."""
+    for segment in rotated_segments(path) + [path]:
+        opener = gzip.open if segment.endswith(".gz") else open
+        try:
+            with opener(segment, "rt", encoding="utf-8") as fh:
+                yield from fh
+        except FileNotFoundError:
+            continue
+
+
+def _tail_lines(path: str, limit: int, block_size: int = 8192) -> List[bytes]:
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        pos = fh.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= limit:
+            step = min(block_size, pos)
+            pos -= step
+            fh.seek(pos)
+            data = fh.read(step) + data
+    return [line for line in data.splitlines() if line.strip()][-limit:]
+
+
+def tail_events(path: str, limit: int = 30) -> List[Dict]:
+    """The last ``limit`` JSON objects in ``path`` (and its rotated segments), oldest first."""
+    if limit <= 0:
+        return []
+    lines: List[bytes] = []
+    if os.path.exists(path):
+        lines = _tail_lines(path, limit)
+    for segment in reversed(rotated_segments(path)):
+        if len(lines) >= limit:
+            break
+        try:
+            if segment.endswith(".gz"):
+                with gzip.open(segment, "rb") as fh:
+                    older = [line for line in fh.read().splitlines() if line.strip()]
+            else:
+                older = _tail_lines(segment, limit)
+        except OSError:
+            continue
+        lines = older[-(limit - len(lines)):] + lines
+    events = []
+    for line in lines[-limit:]:
+        try:
+            item = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(item, dict):
+            events.append(item)
+    return events
+
+
+_SINKS: Dict[str, EventSink] = {}
+_SINKS_LOCK = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_event_sink(path: str, logger=None, backup_count: Optional[int] = None) -> EventSink:
+    """Process-wide sink for ``path``, configured from the EVENT_LOG_* env vars.
+
+    ``backup_count`` overrides EVENT_LOG_BACKUP_COUNT for logs whose history
+    must be kept (``0`` never prunes).
+    """
+    key = os.path.abspath(path)
+    with _SINKS_LOCK:
+        sink = _SINKS.get(key)
+        if sink is None:
+            sink = EventSink(
+                path,
+                logger=logger,
+                max_bytes=int(_env_float("EVENT_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+                rotate_seconds=_env_float("EVENT_LOG_ROTATE_SECONDS", 0.0),
+                backup_count=int(_env_float("EVENT_LOG_BACKUP_COUNT", 10)) if backup_count is None else backup_count,
+                compress=os.getenv("EVENT_LOG_COMPRESS", "true").strip().lower() in ("1", "true", "yes", "y", "on"),
+            )
+            _SINKS[key] = sink
+        return sink
+
+
+@atexit.register
+def _close_event_sinks() -> None:
+    with _SINKS_LOCK:
+        sinks = list(_SINKS.values())
+    for sink in sinks:
+        sink.close()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Application-wide executor for the dashboard's multi-user Alpaca fan-out.
+
+``_map_users_parallel`` used to build and tear down a ThreadPoolExecutor per
+admin request, so frequent polling churned threads and nothing bounded the
+number of Alpaca calls in flight across requests. ``FanoutExecutor`` is one
+long-lived pool shared by every request:
+
+* ``max_workers`` bounds concurrent calls process-wide; extra work queues.
+* At most ``per_key_concurrency`` tasks with the same key (an Alpaca
+  account) run at once. The rest wait in a per-key queue and are handed to
+  the pool only when a slot frees up, so one slow account cannot tie up
+  pool threads, across concurrent requests too.
+* ``map`` takes a deadline. Tasks that have not started by then are
+  cancelled; ones still running are abandoned and reported as timed out, so
+  a slow account degrades one row instead of the whole page.
+* ``stats()`` reports queue depth (current and peak), running tasks and
+  completed/timed-out/cancelled/error counters.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence
+
+
+_UNKEYED = object()
+
+
+class _Task:
+    __slots__ = ("fn", "item", "key", "future")
+
+    def __init__(self, fn: Callable[[Any], Any], item: Any, key: Hashable):
+        self.fn = fn
+        self.item = item
+        self.key = key
+        self.future: Future = Future()
+
+
+class FanoutExecutor:
+    def __init__(self, max_workers: int = 8, per_key_concurrency: int = 2, logger=None):
+        self.max_workers = max(1, int(max_workers))
+        self.per_key_concurrency = max(1, int(per_key_concurrency))
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dashboard-fanout")
+        self._lock = threading.Lock()
+        # key -> [tasks holding a slot, tasks waiting for one]
+        self._keys: Dict[Hashable, list] = {}
+        self._queued = 0
+        self._running = 0
+        self._counters = {"submitted": 0, "completed": 0, "errors": 0, "timeouts": 0, "cancelled": 0, "peak_queued": 0}
+
+    def map(
+        self,
+        items: Sequence[Any],
+        fn: Callable[[Any], Any],
+        key_fn: Optional[Callable[[Any], Hashable]] = None,
+        deadline_sec: Optional[float] = None,
+        default: Any = None,
+    ) -> List[Any]:
+        """``fn(item)`` for every item, in order; ``default`` for errors and stragglers."""
+        if not items:
+            return []
+        deadline = time.monotonic() + deadline_sec if deadline_sec else None
+        tasks = [_Task(fn, item, key_fn(item) if key_fn else _UNKEYED) for item in items]
+        for task in tasks:
+            with self._lock:
+                self._queued += 1
+                self._counters["submitted"] += 1
+                self._counters["peak_queued"] = max(self._counters["peak_queued"], self._queued)
+            self._admit(task)
+
+        futures = [task.future for task in tasks]
+        _done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()) if deadline else None)
+        results = []
+        for item, future in zip(items, futures):
+            if future in not_done:
+                if future.cancel():
+                    with self._lock:
+                        self._queued -= 1
+                        self._counters["cancelled"] += 1
+                else:
+                    with self._lock:
+                        self._counters["timeouts"] += 1
+                self._warn(f"Deadline passed for {_label(item)}.")
+                results.append(default)
+                continue
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                self._warn(f"Failed for {_label(item)}: {exc}")
+                results.append(default)
+        return results
+
+    def _admit(self, task: _Task) -> None:
+        """Hand ``task`` to the pool, or park it until its key has a free slot."""
+        if task.key is not _UNKEYED:
+            with self._lock:
+                state = self._keys.setdefault(task.key, [0, deque()])
+                if state[0] >= self.per_key_concurrency:
+                    state[1].append(task)
+                    return
+                state[0] += 1
+        self._executor.submit(self._run, task)
+
+    def _release(self, key: Hashable) -> None:
+        """Pass a finished task's slot to the next waiting task for ``key``."""
+        if key is _UNKEYED:
+            return
+        following = None
+        with self._lock:
+            state = self._keys[key]
+            waiting: Deque[_Task] = state[1]
+            while waiting:
+                candidate = waiting.popleft()
+                if not candidate.future.cancelled():
+                    following = candidate
+                    break
+            if following is None:
+                state[0] -= 1
+                if not state[0]:
+                    del self._keys[key]
+        if following is not None:
+            self._executor.submit(self._run, following)
+
+    def _run(self, task: _Task) -> None:
+        try:
+            # False when map() cancelled the task after its deadline.
+            if not task.future.set_running_or_notify_cancel():
+                return
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            result, error = None, None
+            try:
+                result = task.fn(task.item)
+            except Exception as exc:
+                error = exc
+            with self._lock:
+                self._running -= 1
+                self._counters["completed" if error is None else "errors"] += 1
+            if error is None:
+                task.future.set_result(result)
+            else:
+                task.future.set_exception(error)
+        finally:
+            self._release(task.key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queued"] = self._queued
+            stats["running"] = self._running
+            stats["max_workers"] = self.max_workers
+            stats["per_key_concurrency"] = self.per_key_concurrency
+        return stats
+
+    def _warn(self, message: str) -> None:
+        if self.logger:
+            self.logger.warning(f"[PARALLEL_FETCH] {message}")
+
+
+def _label(item: Any) -> str:
+    return str(getattr(item, "username", None) or item)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Incremental indicator state for the live strategy frames.
+
+The engine used to rebuild every indicator over the whole bar window on each
+tick even though at most one bar closes in between. The classes here keep the
+running state instead and advance it by one bar at a time:
+
+* ``RollingSMA`` reproduces ``Series.rolling(n, min_periods=n).mean()``,
+  including pandas' compensated (Kahan) running sum, so values are identical
+  to ``misc.pine_optimizer.sma``.
+* ``EWMA`` reproduces ``Series.ewm(..., adjust=False, min_periods=n).mean()``,
+  the building block of ``ema``, ``rsi`` (Wilder/RMA) and ``keltner_channel``.
+* ``KeltnerFrame``, ``MacdSmaFrame`` and ``RsiFrame`` turn closed bars into the
+  same columns ``LocalStrategyEngine`` used to compute with pandas and keep
+  only the last few rows, which is all the entry/exit rules look at.
+
+A frame is seeded from the first bars it sees. The engine's window slides
+forward over time, so the EMA-based values can drift from a fresh recompute
+over the current window by a (1 - alpha) ** window_length sized amount;
+SMA-based values are unaffected.
+"""
+
+from __future__ import annotations
+
+import abc
+import math
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+NAN = float("nan")
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class RollingSMA:
+    def __init__(self, length: int):
+        self.length = int(length)
+        self._window: deque = deque()
+        self._nobs = 0
+        self._sum = 0.0
+        # pandas keeps separate compensation terms for adds and removes.
+        self._add_compensation = 0.0
+        self._remove_compensation = 0.0
+        self._neg_ct = 0
+        self._same_ct = 0
+        self._prev = NAN
+
+    def _add(self, value: float) -> None:
+        if value != value:
+            return
+        self._nobs += 1
+        y = value - self._add_compensation
+        t = self._sum + y
+        self._add_compensation = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, value) < 0:
+            self._neg_ct += 1
+        if value == self._prev:
+            self._same_ct += 1
+        else:
+            self._same_ct = 1
+        self._prev = value
+
+    def _remove(self, value: float) -> None:
+        if value != value:
+            return
+        self._nobs -= 1
+        y = -value - self._remove_compensation
+        t = self._sum + y
+        self._remove_compensation = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, value) < 0:
+            self._neg_ct -= 1
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        if len(self._window) == self.length:
+            self._remove(self._window.popleft())
+        self._window.append(value)
+        self._add(value)
+        if self._nobs < self.length or self._nobs == 0:
+            return NAN
+        if self._same_ct >= self._nobs:
+            return self._prev
+        result = self._sum / self._nobs
+        if self._neg_ct == 0 and result < 0:
+            return 0.0
+        if self._neg_ct == self._nobs and result > 0:
+            return 0.0
+        return result
+
+
+class EWMA:
+    def __init__(self, min_periods: int, span: Optional[float] = None, alpha: Optional[float] = None):
+        # Same span/alpha -> center of mass -> alpha round trip as pandas.
+        com = (float(span) - 1.0) / 2.0 if span is not None else (1.0 - float(alpha)) / float(alpha)
+        self.alpha = 1.0 / (1.0 + com)
+        self._old_wt_factor = 1.0 - self.alpha
+        self.min_periods = max(int(min_periods), 1)
+        self._weighted = NAN
+        self._nobs = 0
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        observed = value == value
+        self._nobs += int(observed)
+        if self._weighted == self._weighted:
+            if observed and self._weighted != value:
+                self._weighted = (self._old_wt_factor * self._weighted + self.alpha * value) / (self._old_wt_factor + self.alpha)
+        elif observed:
+            self._weighted = value
+        return self._weighted if self._nobs >= self.min_periods else NAN
+
+
+class IncrementalFrame(abc.ABC):
+    """Closed bars in, the last ``keep_rows`` complete indicator rows out."""
+
+    columns: Tuple[str, ...] = ()
+    keep_rows = 10
+    check_bars = 8
+
+    def __init__(self, params: Dict):
+        self.params = params
+        self.last_ts: Optional[pd.Timestamp] = None
+        self._consumed: deque = deque(maxlen=self.check_bars)
+        self._rows: deque = deque(maxlen=self.keep_rows)
+
+    @classmethod
+    def params_key(cls, params: Dict) -> tuple:
+        return ()
+
+    @abc.abstractmethod
+    def _step(self, open_: float, high: float, low: float, close: float) -> List[float]:
+        ...
+
+    def update(self, bars: pd.DataFrame) -> bool:
+        """Consume bars newer than the last one seen.
+
+        Returns False when ``bars`` no longer extends what was consumed (a gap,
+        or a revised bar), in which case the caller should start a new frame.
+        """
+        if bars.empty:
+            return self.last_ts is None
+        if self.last_ts is not None:
+            first = bars.index[0]
+            for ts, values in self._consumed:
+                if ts < first:
+                    continue
+                if ts not in bars.index or tuple(float(bars.at[ts, name]) for name in BAR_FIELDS) != values:
+                    return False
+            if self.last_ts < first:
+                return False
+            bars = bars[bars.index > self.last_ts]
+        columns = [bars[name].to_numpy(dtype=float) for name in BAR_FIELDS]
+        for ts, open_, high, low, close, volume in zip(bars.index, *columns):
+            values = (float(open_), float(high), float(low), float(close), float(volume))
+            indicators = self._step(values[0], values[1], values[2], values[3])
+            self._consumed.append((ts, values))
+            self.last_ts = ts
+            row = values + tuple(indicators)
+            if not any(value != value for value in row):
+                self._rows.append((ts, row))
+        return True
+
+    def frame(self) -> pd.DataFrame:
+        names = list(BAR_FIELDS) + list(self.columns)
+        if not self._rows:
+            return pd.DataFrame(columns=names, index=pd.DatetimeIndex([], tz="UTC"))
+        index = pd.DatetimeIndex([ts for ts, _row in self._rows])
+        frame = pd.DataFrame([row for _ts, row in self._rows], index=index, columns=names)
+        for name in self.columns:
+            if name.endswith(("_signal", "_exit")):
+                frame[name] = frame[name].astype(bool)
+        return frame
+
+
+class KeltnerFrame(IncrementalFrame):
+    columns = ("mid_inner", "up_inner", "low_inner")
+
+    def __init__(self, params: Dict):
+        super().__init__(params)
+        length = int(params["inner_kc_length"])
+        self.mult = float(params["inner_kc_mult"])
+        self._basis = EWMA(length, span=length)
+        self._range = EWMA(length, span=length)
+        self._prev_close = NAN
+
+    @classmethod
+    def params_key(cls, params: Dict) -> tuple:
+        return (int(params["inner_kc_length"]), float(params["inner_kc_mult"]))
+
+    def _step(self, open_: float, high: float, low: float, close: float) -> List[float]:
+        true_range = high - low
+        if self._prev_close == self._prev_close:
+            true_range = max(true_range, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        basis = self._basis.update(close)
+        span = self._range.update(true_range)
+        return [basis, basis + span * self.mult, basis - span * self.mult]
+
+
+class MacdSmaFrame(IncrementalFrame):
+    columns = ("fast_ma", "slow_ma", "veryslow_ma", "macd_line", "signal_line", "hist", "long_signal", "short_signal")
+
+    def __init__(self, params: Dict):
+        super().__init__(params)
+        self._fast = RollingSMA(params["macd_fast_length"])
+        self._slow = RollingSMA(params["macd_slow_length"])
+        self._veryslow = RollingSMA(params["macd_sma_length"])
+        self._signal = RollingSMA(params["macd_signal_length"])
+        self._prev_hist = NAN
+
+    @classmethod
+    def params_key(cls, params: Dict) -> tuple:
+        return tuple(int(params[name]) for name in ("macd_fast_length", "macd_slow_length", "macd_sma_length", "macd_signal_length"))
+
+    def _step(self, open_: float, high: float, low: float, close: float) -> List[float]:
+        fast = self._fast.update(close)
+        slow = self._slow.update(close)
+        veryslow = self._veryslow.update(close)
+        macd_line = fast - slow
+        signal_line = self._signal.update(macd_line)
+        hist = macd_line - signal_line
+        prev_hist, self._prev_hist = self._prev_hist, hist
+        long_signal = prev_hist <= 0.0 and hist > 0.0 and macd_line > 0 and close > veryslow
+        short_signal = prev_hist >= 0.0 and hist < 0.0 and macd_line < 0 and close < veryslow
+        return [fast, slow, veryslow, macd_line, signal_line, hist, long_signal, short_signal]
+
+
+class RsiFrame(IncrementalFrame):
+    columns = ("rsi", "trend_ma", "long_signal", "short_signal", "long_exit", "short_exit")
+
+    def __init__(self, params: Dict):
+        super().__init__(params)
+        length = int(params["rsi_length"])
+        self._gain = EWMA(length, alpha=1.0 / float(length))
+        self._loss = EWMA(length, alpha=1.0 / float(length))
+        self._trend = RollingSMA(params["rsi_trend_length"])
+        self._prev_close = NAN
+        self.oversold = params["rsi_oversold"]
+        self.overbought = params["rsi_overbought"]
+        self.exit_level = params["rsi_exit_level"]
+
+    @classmethod
+    def params_key(cls, params: Dict) -> tuple:
+        return tuple(params[name] for name in ("rsi_length", "rsi_trend_length", "rsi_oversold", "rsi_overbought", "rsi_exit_level"))
+
+    def _step(self, open_: float, high: float, low: float, close: float) -> List[float]:
+        delta = close - self._prev_close
+        self._prev_close = close
+        gain = max(delta, 0.0) if delta == delta else NAN
+        loss = max(-delta, 0.0) if delta == delta else NAN
+        avg_gain = self._gain.update(gain)
+        avg_loss = self._loss.update(loss)
+        # Like rsi(): 100 whenever there is no (or not yet any) average loss.
+        value = 100.0 - (100.0 / (1.0 + avg_gain / avg_loss)) if avg_loss > 0 else 100.0
+        trend = self._trend.update(close)
+        return [
+            value,
+            trend,
+            close > trend and value < self.oversold,
+            close < trend and value > self.overbought,
+            value > self.exit_level,
+            value < (100.0 - self.exit_level),
+        ]
+
+
+FRAME_TYPES = {
+    "keltner": KeltnerFrame,
+    "macd_sma": MacdSmaFrame,
+    "rsi_reversion": RsiFrame,
+}
+
+
+def frame_type_for(strategy: Optional[str]):
+    return FRAME_TYPES.get(str(strategy or "keltner").strip().lower(), KeltnerFrame)
+
@@ -19,6 +19,7 @@ from typing import Dict, Iterable, List, Optional
 
 import requests
 
+from event_sink import get_event_sink
 from market_news import MarketNewsCollector, sources_from_env
 
 
@@ -216,7 +217,8 @@ class LLMTradeValidator:
             if news_enabled
             else None
         )
-        self._write_lock = threading.Lock()
+        # The shadow log is the history the report and dataset export read, so it is never pruned.
+        self.event_sink = get_event_sink(log_path, logger, backup_count=0)
         self._semaphore = threading.BoundedSemaphore(max(1, max_workers))
 
     def submit_entry_signal(
@@ -611,11 +613,8 @@ class LLMTradeValidator:
 
     def _write_event(self, event: Dict) -> None:
         try:
-            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
             line = json.dumps(_json_safe(event), ensure_ascii=True, separators=(",", ":"))
-            with self._write_lock:
-                with open(self.log_path, "a", encoding="utf-8") as fh:
-                    fh.write(line + "\n")
+            self.event_sink.write_line(line)
         except Exception as exc:
             self.logger.error("[LLM_SHADOW] failed_to_write_log path=%s error=%s", self.log_path, exc)
 
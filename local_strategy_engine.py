@@ -18,14 +18,21 @@ import os
 import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from typing import Callable, Dict, Optional
 
 import pandas as pd
 
-from alpaca_api import AlpacaAPIError, LegacyCompatibleAlpacaClient
+from alpaca_api import AlpacaAPIError, LegacyCompatibleAlpacaClient, MarketDataStream
+from alpaca_clients import alpaca_clients
+from bar_store import create_bar_store
+from engine_state import FIELD_PREFIX, LEGACY_STATE_FILENAME, STATE_DB_FILENAME, SYMBOL_PREFIX, EngineStateStore
+from event_sink import get_event_sink
+from live_indicators import frame_type_for
 from llm_trade_validator import create_llm_trade_validator
+from market_feed import create_market_feed
 from market_news import create_market_news_collector
 from symbol_memory import create_symbol_memory
 from misc.pine_optimizer import (
@@ -42,7 +49,10 @@ from misc.pine_optimizer import (
 )
 from models import Trade, User, db
 import strategy_config as strategy_store
-from utils import decrypt_data
+from trade_stats import trade_stats
+
+
+NY_TZ = ZoneInfo("America/New_York")
 
 
 class TransientStrategyAPIError(RuntimeError):
@@ -62,6 +72,14 @@ class LocalStrategyEngine:
         self.base_url = base_url
         self.logger = logger
         self.poll_seconds = int(os.getenv("LOCAL_STRATEGY_POLL_SECONDS", "15"))
+        # "bar_close" wakes the loop when the next bar of some universe entry
+        # closes (plus a settle delay) and only evaluates those entries; symbols
+        # with an open position are still re-checked every exit_poll_seconds.
+        # "poll" keeps the legacy fixed-interval loop over the whole universe.
+        self.schedule_mode = os.getenv("LOCAL_STRATEGY_SCHEDULE_MODE", "bar_close").strip().lower()
+        self.bar_settle_seconds = float(os.getenv("LOCAL_STRATEGY_BAR_SETTLE_SECONDS", "3"))
+        self.exit_poll_seconds = int(os.getenv("LOCAL_STRATEGY_EXIT_POLL_SECONDS", str(self.poll_seconds)))
+        self.max_idle_seconds = int(os.getenv("LOCAL_STRATEGY_MAX_IDLE_SECONDS", "60"))
         self.bars_lookback = int(os.getenv("LOCAL_STRATEGY_BARS_LOOKBACK", "260"))
         self.entry_refetch_seconds = int(os.getenv("LOCAL_STRATEGY_ENTRY_REFETCH_SECONDS", "60"))
         self.recovery_base_seconds = int(os.getenv("LOCAL_STRATEGY_RECOVERY_BASE_SECONDS", "15"))
@@ -79,14 +97,70 @@ class LocalStrategyEngine:
         self.daily_max_losses_per_symbol = int(os.getenv("LOCAL_STRATEGY_DAILY_MAX_LOSSES_PER_SYMBOL", "2"))
         self.daily_max_loss_usd_per_symbol = float(os.getenv("LOCAL_STRATEGY_DAILY_MAX_LOSS_USD_PER_SYMBOL", "100"))
         self.event_log_path = os.path.join(self.app.instance_path, "local_strategy_events.jsonl")
+        self.event_sink = get_event_sink(self.event_log_path, self.logger)
+        trade_stats.configure(self.app.instance_path)
         self.dry_run = os.getenv("LOCAL_STRATEGY_DRY_RUN", "false").lower() in ("1", "true", "yes", "y")
-        self.state_path = os.path.join(self.app.instance_path, "local_strategy_state.json")
+        self.state_path = os.path.join(self.app.instance_path, LEGACY_STATE_FILENAME)
+        self.state_store = EngineStateStore(os.path.join(self.app.instance_path, STATE_DB_FILENAME), self.logger)
         self.stop_event = threading.Event()
+        self._wake_event = threading.Event()
         self.thread: Optional[threading.Thread] = None
         self.state_lock = threading.Lock()
         self.state = {"symbols": {}, "recoveries": []}
+        # State is written behind: during a tick (and while the worker pool
+        # runs) save_state only marks it dirty and the tick flushes the changed
+        # rows once at the end. Right after an order the calling thread flushes
+        # its own symbol rows and the recoveries immediately, so order-related
+        # state is on disk as soon as before.
+        self.eval_workers = max(1, int(os.getenv("LOCAL_STRATEGY_EVAL_WORKERS", "4")))
+        self._eval_pool: Optional[ThreadPoolExecutor] = None
+        self._defer_state_saves = 0
+        self._state_dirty = False
+        self._persisted_rows: Dict[str, str] = {}
+        self._touched_keys: set = set()
+        self._durable = threading.local()
+        self._abort_lock = threading.Lock()
         self.llm_validator = create_llm_trade_validator(self.app.instance_path, self.logger)
         self.symbol_memory = create_symbol_memory(self.app.instance_path, self.logger)
+        # Closed bars are cached per (symbol, fetch timeframe, feed) so each tick
+        # only downloads bars newer than the last one seen. The resampled,
+        # session-filtered frame is reused until the underlying bars change.
+        self.bar_store = create_bar_store(self.app.instance_path, self.logger)
+        self._resampled_bars: Dict[tuple, tuple] = {}
+        # Indicator state per (symbol, strategy, indicator params), advanced by
+        # the bars closed since the previous evaluation instead of recomputing
+        # the whole window; see live_indicators.
+        self.incremental_indicators = os.getenv("LOCAL_STRATEGY_INCREMENTAL_INDICATORS", "true").strip().lower() in ("1", "true", "yes", "y", "on")
+        self._indicator_frames: Dict[tuple, object] = {}
+        self._indicator_lock = threading.Lock()
+        # Filled once per tick by prefetch_market_data (batched multi-symbol
+        # requests) and consumed by fetch_closed_bars / get_latest_price.
+        self._prefetched_bars: Dict[tuple, Optional[pd.DataFrame]] = {}
+        self._prefetched_prices: Dict[str, float] = {}
+        # During a tick, open positions come from one list_positions() snapshot
+        # instead of a get_position() call per symbol. Submitting an order drops
+        # the snapshot so the next lookup re-lists.
+        self._positions_tick = False
+        self._positions: Optional[Dict[str, object]] = None
+        self._positions_lock = threading.Lock()
+        # Bar-close scheduler bookkeeping: next due time per state key, the
+        # exchange calendar (NY date -> (open, close)) and what the last tick saw.
+        self._next_bar_due: Dict[str, datetime] = {}
+        self._calendar: Dict = {}
+        self._calendar_day = None
+        self._watch_symbols: set = set()
+        self._open_position_symbols: set = set()
+        self._positions_changed = False
+        self._positions_loaded_at = 0.0
+        # Optional websocket market data (LOCAL_STRATEGY_MARKET_DATA=stream):
+        # prices and recent bars are read from memory, and a trade on a symbol
+        # with an open position wakes the loop so exits react immediately.
+        self.market_feed = create_market_feed(self.app.instance_path, self.logger)
+        self.market_stream: Optional[MarketDataStream] = None
+        self.stream_exit_min_seconds = float(os.getenv("LOCAL_STRATEGY_STREAM_EXIT_MIN_SECONDS", "1"))
+        self._last_stream_wake = 0.0
+        if self.market_feed is not None:
+            self.market_feed.add_listener(self.on_stream_trade)
         # Continuously ingest news into per-symbol memory (independent of the LLM
         # gate) so the knowledge base keeps growing with timestamped items.
         self.memory_ingest_enabled = os.getenv("SYMBOL_MEMORY_INGEST_ENABLED", "true").strip().lower() in ("1", "true", "yes", "y", "on")
@@ -127,7 +201,8 @@ class LocalStrategyEngine:
         self.thread = threading.Thread(target=self.run_forever, name="local-strategy-engine", daemon=True)
         self.thread.start()
         self.logger.info(
-            "[LOCAL_STRATEGY] Engine started poll=%ss dry_run=%s state=%s",
+            "[LOCAL_STRATEGY] Engine started schedule=%s poll=%ss dry_run=%s state=%s",
+            self.schedule_mode,
             self.poll_seconds,
             self.dry_run,
             self.state_path,
@@ -135,26 +210,105 @@ class LocalStrategyEngine:
 
     def stop(self) -> None:
         self.stop_event.set()
+        self._wake_event.set()
+        if self.market_stream is not None:
+            self.market_stream.stop()
+        if self._eval_pool is not None:
+            self._eval_pool.shutdown(wait=False)
+        self.event_sink.flush()
 
     def load_state(self) -> None:
         try:
-            if os.path.exists(self.state_path):
-                with open(self.state_path, "r", encoding="utf-8") as fh:
-                    data = json.load(fh)
-                if isinstance(data, dict):
-                    self.state.update(data)
+            rows = self.state_store.load()
         except Exception as exc:
             self.logger.error("[LOCAL_STRATEGY] Failed to load state: %s", exc)
+            return
+        if not rows and os.path.exists(self.state_path):
+            self.migrate_legacy_state()
+            return
+        with self.state_lock:
+            for row_key, value in rows.items():
+                try:
+                    decoded = json.loads(value)
+                except ValueError:
+                    continue
+                if row_key.startswith(SYMBOL_PREFIX):
+                    self.state.setdefault("symbols", {})[row_key[len(SYMBOL_PREFIX):]] = decoded
+                elif row_key.startswith(FIELD_PREFIX):
+                    self.state[row_key[len(FIELD_PREFIX):]] = decoded
+            self._persisted_rows = dict(rows)
+
+    def migrate_legacy_state(self) -> None:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if isinstance(data, dict):
+                self.state.update(data)
+            self._touched_keys.update(self.state.get("symbols", {}))
+            self.flush_state()
+            os.replace(self.state_path, f"{self.state_path}.migrated")
+            self.logger.info("[LOCAL_STRATEGY] Migrated %s to %s", self.state_path, self.state_store.path)
+        except Exception as exc:
+            self.logger.error("[LOCAL_STRATEGY] Failed to migrate legacy state: %s", exc)
 
     def save_state(self) -> None:
+        pending = getattr(self._durable, "keys", None)
+        if self._defer_state_saves:
+            self._state_dirty = True
+            if pending is not None:
+                self._durable.keys = None
+                self.flush_state(only_keys=pending)
+            return
+        self._durable.keys = None
+        self.flush_state()
+
+    def mark_state_durable(self, symbol: str, strategy: Optional[str] = None) -> None:
+        """Make the calling thread's next save_state write this symbol's rows at once."""
+        keys = getattr(self._durable, "keys", None) or set()
+        keys.update({self.state_symbol_key(symbol), self.state_symbol_key(symbol, strategy)})
+        self._durable.keys = keys
+
+    def flush_state(self, only_keys: Optional[set] = None) -> None:
+        """Upsert the state rows whose JSON changed since they were last written.
+
+        Without ``only_keys`` every symbol touched since the last tick plus the
+        top-level fields are compared, and rows that disappeared are deleted.
+        With ``only_keys`` (a worker right after an order) just those symbols
+        and the top-level fields are written, so no other worker's dict is
+        serialized while it may be changing.
+        """
+        with self.state_lock:
+            symbols = self.state.setdefault("symbols", {})
+            keys = self._touched_keys if only_keys is None else only_keys
+            candidates = {f"{SYMBOL_PREFIX}{key}": symbols[key] for key in list(keys) if key in symbols}
+            for name, value in self.state.items():
+                if name != "symbols":
+                    candidates[f"{FIELD_PREFIX}{name}"] = value
+            upserts = {}
+            for row_key, value in candidates.items():
+                encoded = json.dumps(value, sort_keys=True, default=str)
+                if self._persisted_rows.get(row_key) != encoded:
+                    upserts[row_key] = encoded
+            deletes = [
+                row_key
+                for row_key in self._persisted_rows
+                if (row_key.startswith(FIELD_PREFIX) and row_key[len(FIELD_PREFIX):] not in self.state)
+                or (only_keys is None and row_key.startswith(SYMBOL_PREFIX) and row_key[len(SYMBOL_PREFIX):] not in symbols)
+            ]
+            if only_keys is None:
+                self._state_dirty = False
+        if not upserts and not deletes:
+            return
         try:
-            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
-            tmp_path = f"{self.state_path}.tmp"
-            with open(tmp_path, "w", encoding="utf-8") as fh:
-                json.dump(self.state, fh, indent=2)
-            os.replace(tmp_path, self.state_path)
+            self.state_store.apply(upserts, deletes)
         except Exception as exc:
+            self._state_dirty = True
             self.logger.error("[LOCAL_STRATEGY] Failed to save state: %s", exc)
+            return
+        with self.state_lock:
+            self._persisted_rows.update(upserts)
+            for row_key in deletes:
+                self._persisted_rows.pop(row_key, None)
 
     def emit_event(self, event_type: str, symbol: str, **fields) -> None:
         event = {
@@ -164,9 +318,7 @@ class LocalStrategyEngine:
         }
         event.update(fields)
         try:
-            os.makedirs(os.path.dirname(self.event_log_path), exist_ok=True)
-            with open(self.event_log_path, "a", encoding="utf-8") as fh:
-                fh.write(json.dumps(event, sort_keys=True, default=str) + "\n")
+            self.event_sink.write(event)
         except Exception as exc:
             self.logger.warning("[LOCAL_STRATEGY] Failed to write structured event: %s", exc)
 
@@ -210,10 +362,37 @@ class LocalStrategyEngine:
             except Exception as exc:
                 self.logger.exception("[LOCAL_STRATEGY] Engine tick failed: %s", exc)
             elapsed = time.time() - started
-            self.stop_event.wait(max(1, self.poll_seconds - elapsed))
+            self._wake_event.wait(self.next_wake_delay(elapsed))
+            self._wake_event.clear()
+
+    def next_wake_delay(self, elapsed: float) -> float:
+        """Seconds to sleep before the next tick.
+
+        In bar_close mode this is the time until the earliest scheduled bar
+        close, shortened to the exit cadence while positions or recoveries need
+        watching and capped at max_idle_seconds so config changes and
+        externally opened positions are still noticed.
+        """
+        poll_delay = max(1.0, self.poll_seconds - elapsed)
+        if self.schedule_mode != "bar_close":
+            return poll_delay
+        delay = float(max(1, self.max_idle_seconds))
+        if self._next_bar_due:
+            nearest = (min(self._next_bar_due.values()) - datetime.now(timezone.utc)).total_seconds()
+            # Overdue entries were not evaluated (cooldown, disabled config...);
+            # retry them on the regular cadence instead of spinning.
+            delay = min(delay, nearest if nearest > 0 else poll_delay)
+        if self.exit_watch_needed():
+            delay = min(delay, self.exit_poll_seconds - elapsed)
+        return max(1.0, delay)
+
+    def exit_watch_needed(self) -> bool:
+        if self._positions_changed or self.state.get("recoveries"):
+            return True
+        return bool(self._open_position_symbols & self._watch_symbols)
 
     def tick(self) -> None:
-        cfg = strategy_store.load_strategy_config()
+        cfg = strategy_store.current_strategy_config().config
         if not cfg.get("enabled"):
             return
         user = self.resolve_user(cfg)
@@ -227,6 +406,22 @@ class LocalStrategyEngine:
         if self.api_cooldown_active():
             return
 
+        self._positions_tick = True
+        if not self.positions_snapshot_reusable():
+            self._positions = None
+        self._defer_state_saves += 1
+        try:
+            self.tick_account(user, api, cfg)
+        finally:
+            self._positions_tick = False
+            self._defer_state_saves -= 1
+            if not self._defer_state_saves:
+                if self._state_dirty:
+                    self.flush_state()
+                self._touched_keys.clear()
+
+    def tick_account(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict) -> None:
+        """Recoveries, universe evaluation and memory refresh for one resolved account."""
         try:
             self.process_recoveries(user, api)
         except TransientStrategyAPIError as exc:
@@ -239,11 +434,11 @@ class LocalStrategyEngine:
             return
 
         entries = []
-        for entry in strategy_store.normalize_universe(cfg.get("universe")):
+        snapshot = strategy_store.snapshot_for(cfg)
+        for entry in snapshot.universe:
             if not entry.get("enabled", True):
                 continue
-            symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
-            if not symbol or not strategy_store.local_allowed_for_symbol(symbol, cfg):
+            if snapshot.mode_for(entry["symbol"]) not in {"local", "both"}:
                 continue
             entries.append(entry)
 
@@ -254,7 +449,79 @@ class LocalStrategyEngine:
             )
         )
 
+        self._watch_symbols = {strategy_store.normalize_symbol(entry.get("symbol", "")) for entry in entries}
+        self.sync_market_stream(api, cfg, entries)
+        if self.schedule_mode == "bar_close":
+            self.refresh_market_calendar(api)
+            try:
+                entries = self.due_entries(api, cfg, entries)
+            except TransientStrategyAPIError as exc:
+                self.defer_api_cooldown(str(exc))
+                self.logger.warning(
+                    "[LOCAL_STRATEGY] Alpaca/API transient failure during scheduling; cooling down %ss: %s",
+                    self.api_failure_cooldown_seconds,
+                    exc,
+                )
+                return
+
+        self.prefetch_market_data(api, cfg, entries)
+        try:
+            self.evaluate_entries(user, api, cfg, entries)
+        finally:
+            self._prefetched_bars = {}
+            self._prefetched_prices = {}
+
+        try:
+            self.refresh_symbol_memory(user, api, cfg)
+        except Exception as exc:
+            self.logger.warning("[SYMBOL_MEMORY] poll refresh error: %s", exc)
+
+    def evaluate_entries(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict, entries: list) -> None:
+        """Evaluate the sorted universe entries, one symbol per pool worker.
+
+        All entries of a symbol run on the same worker in priority order, so the
+        strategy-priority and position-ownership rules see the same sequence as
+        a serial pass. A transient API failure stops symbols that have not
+        started yet and puts the engine into cooldown once.
+        """
+        groups: Dict[str, list] = {}
         for entry in entries:
+            groups.setdefault(strategy_store.normalize_symbol(entry.get("symbol", "")), []).append(entry)
+        abort = threading.Event()
+        if self.eval_workers <= 1 or len(groups) <= 1:
+            for group in groups.values():
+                self.evaluate_symbol_group(user, api, cfg, group, abort)
+            return
+        if self._eval_pool is None:
+            self._eval_pool = ThreadPoolExecutor(max_workers=self.eval_workers, thread_name_prefix="local-strategy-eval")
+        self._defer_state_saves += 1
+        try:
+            futures = [
+                self._eval_pool.submit(self._evaluate_symbol_group_in_context, user, api, cfg, group, abort)
+                for group in groups.values()
+            ]
+            for future in futures:
+                future.result()
+        finally:
+            self._defer_state_saves -= 1
+            if not self._defer_state_saves and self._state_dirty:
+                self.flush_state()
+
+    def _evaluate_symbol_group_in_context(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict, group: list, abort: threading.Event) -> None:
+        app_context = getattr(self.app, "app_context", None)
+        if app_context is None:
+            self.evaluate_symbol_group(user, api, cfg, group, abort)
+            return
+        # Each worker gets its own app context and therefore its own SQLAlchemy
+        # session; the user row is re-read there instead of sharing the tick's.
+        with app_context():
+            worker_user = db.session.get(User, user.id) or user
+            self.evaluate_symbol_group(worker_user, api, cfg, group, abort)
+
+    def evaluate_symbol_group(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict, group: list, abort: threading.Event) -> None:
+        for entry in group:
+            if abort.is_set():
+                return
             symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
             backtest = entry.get("backtest")
             if not isinstance(backtest, dict):
@@ -269,7 +536,13 @@ class LocalStrategyEngine:
                 continue
             try:
                 self.evaluate_symbol(user, api, cfg, entry, backtest)
+                self.schedule_next_bar(entry, backtest, cfg)
             except TransientStrategyAPIError as exc:
+                with self._abort_lock:
+                    first_failure = not abort.is_set()
+                    abort.set()
+                if not first_failure:
+                    return
                 self.defer_api_cooldown(str(exc))
                 self.logger.warning(
                     "[LOCAL_STRATEGY] %s transient Alpaca/API failure; cooling down %ss: %s",
@@ -277,14 +550,138 @@ class LocalStrategyEngine:
                     self.api_failure_cooldown_seconds,
                     exc,
                 )
-                break
+                return
             except Exception as exc:
                 self.logger.exception("[LOCAL_STRATEGY] %s evaluation failed: %s", symbol, exc)
+                self.schedule_next_bar(entry, backtest, cfg)
+
+    def sync_market_stream(self, api: LegacyCompatibleAlpacaClient, cfg: Dict, entries: list) -> None:
+        """Keep the market-data websocket subscribed to the enabled universe."""
+        if self.market_feed is None:
+            return
+        feed = str(cfg.get("feed", "iex"))
+        stream = self.market_stream
+        if stream is not None and (stream.api_key, stream.api_secret, stream.feed.value) != (api.api_key, api.api_secret, feed.lower()):
+            stream.stop()
+            stream = None
+        if stream is None:
+            stream = MarketDataStream(
+                api.api_key,
+                api.api_secret,
+                feed,
+                self.logger,
+                on_trade=self.market_feed.on_trade,
+                on_bar=self.market_feed.on_bar,
+                on_connected=self.market_feed.on_connected,
+            )
+            self.market_stream = stream
+        stream.set_symbols(self._watch_symbols)
+
+    def on_stream_trade(self, symbol: str, price: float) -> None:
+        """Wake the loop for a streamed trade on an open position (throttled)."""
+        if symbol not in self._open_position_symbols or symbol not in self._watch_symbols:
+            return
+        now = time.time()
+        if now - self._last_stream_wake < self.stream_exit_min_seconds:
+            return
+        self._last_stream_wake = now
+        self._wake_event.set()
 
+    def due_entries(self, api: LegacyCompatibleAlpacaClient, cfg: Dict, entries: list) -> list:
+        """Entries whose bar closed since their last evaluation, plus open positions.
+
+        Entries never evaluated by this process are due immediately. Symbols
+        with an open position are always due so exits keep the faster cadence.
+        """
+        now = datetime.now(timezone.utc)
+        keys = set()
+        due = []
+        for entry in entries:
+            symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
+            key = self.state_symbol_key(symbol, entry.get("strategy"))
+            keys.add(key)
+            next_due = self._next_bar_due.get(key)
+            if next_due is None or next_due <= now or self.get_position(api, symbol) is not None:
+                due.append(entry)
+        for stale in set(self._next_bar_due) - keys:
+            self._next_bar_due.pop(stale, None)
+        return due
+
+    def schedule_next_bar(self, entry: Dict, backtest: Dict, cfg: Dict) -> None:
+        symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
         try:
-            self.refresh_symbol_memory(user, api, cfg)
+            bar_close = self.next_bar_close(
+                backtest.get("timeframe") or cfg.get("timeframe", "30Min"),
+                str(backtest.get("session") or cfg.get("session", "regular")),
+                datetime.now(timezone.utc),
+            )
+        except ValueError:
+            return
+        self._next_bar_due[self.state_symbol_key(symbol, entry.get("strategy"))] = bar_close + timedelta(seconds=self.bar_settle_seconds)
+
+    def refresh_market_calendar(self, api: LegacyCompatibleAlpacaClient) -> None:
+        """Load the exchange calendar once per NY day; weekday hours are the fallback."""
+        today = datetime.now(NY_TZ).date()
+        if self._calendar_day == today:
+            return
+        self._calendar_day = today
+        try:
+            rows = api.get_calendar(start=today - timedelta(days=1), end=today + timedelta(days=14))
         except Exception as exc:
-            self.logger.warning("[SYMBOL_MEMORY] poll refresh error: %s", exc)
+            self._calendar = {}
+            self.logger.warning("[LOCAL_STRATEGY] Market calendar unavailable, assuming weekday sessions: %s", exc)
+            return
+        calendar = {}
+        for row in rows or []:
+            try:
+                day = pd.Timestamp(getattr(row, "date")).date()
+                bounds = []
+                for value in (getattr(row, "open"), getattr(row, "close")):
+                    ts = pd.Timestamp(f"{day} {value}" if isinstance(value, str) and len(value) <= 5 else value)
+                    ts = ts.tz_localize(NY_TZ) if ts.tzinfo is None else ts.tz_convert(NY_TZ)
+                    bounds.append(ts.to_pydatetime())
+                calendar[day] = (bounds[0], bounds[1])
+            except Exception:
+                continue
+        self._calendar = calendar
+
+    def session_bounds(self, day) -> Optional[tuple[datetime, datetime]]:
+        """Regular-session (open, close) in NY time for a date, or None when closed."""
+        if self._calendar and min(self._calendar) <= day <= max(self._calendar):
+            return self._calendar.get(day)
+        if day.weekday() >= 5:
+            return None
+        return (
+            datetime(day.year, day.month, day.day, 9, 30, tzinfo=NY_TZ),
+            datetime(day.year, day.month, day.day, 16, 0, tzinfo=NY_TZ),
+        )
+
+    def next_bar_close(self, timeframe: str, session: str, now: datetime) -> datetime:
+        """First time after ``now`` at which fetch_closed_bars yields a new bar.
+
+        Resampled bars are labelled on the right edge of a UTC-aligned grid and
+        count as closed one timeframe after their label, so the next close is
+        the next grid point. For the regular session the grid point must follow
+        a label inside an exchange session; nights, weekends and holidays are
+        skipped using the market calendar.
+        """
+        step = int(timeframe_seconds(normalize_timeframe_token(timeframe)))
+        close_ts = (int(now.timestamp()) // step + 1) * step
+        if str(session or "").lower() != "regular" or step >= 24 * 3600:
+            return datetime.fromtimestamp(close_ts, timezone.utc)
+        for _ in range(32):
+            label = datetime.fromtimestamp(close_ts - step, timezone.utc).astimezone(NY_TZ)
+            bounds = self.session_bounds(label.date())
+            if bounds is not None and label < bounds[0]:
+                open_ts = int(bounds[0].timestamp())
+                close_ts = -(-open_ts // step) * step + step
+                continue
+            if bounds is not None and label < bounds[1]:
+                return datetime.fromtimestamp(close_ts, timezone.utc)
+            next_day = label.date() + timedelta(days=1)
+            midnight = datetime(next_day.year, next_day.month, next_day.day, tzinfo=NY_TZ)
+            close_ts = -(-int(midnight.timestamp()) // step) * step + step
+        return datetime.fromtimestamp(close_ts, timezone.utc)
 
     def refresh_symbol_memory(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict) -> None:
         """Constantly ingest fresh news for the routing symbols into the knowledge base.
@@ -312,10 +709,10 @@ class LocalStrategyEngine:
         # locally-executed ones), so the whole list builds a knowledge base.
         seen = set()
         changed = False
-        for entry in strategy_store.normalize_universe(cfg.get("universe")):
+        for entry in strategy_store.snapshot_for(cfg).universe:
             if not entry.get("enabled", True):
                 continue
-            symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
+            symbol = entry["symbol"]
             if not symbol or symbol in seen:
                 continue
             seen.add(symbol)
@@ -352,12 +749,10 @@ class LocalStrategyEngine:
         return User.query.filter_by(is_superuser=False).order_by(User.username).first()
 
     def api_for_user(self, user: User) -> Optional[LegacyCompatibleAlpacaClient]:
-        api_key = decrypt_data(user.encrypted_alpaca_key)
-        api_secret = decrypt_data(user.encrypted_alpaca_secret)
-        if not api_key or not api_secret:
+        api = alpaca_clients.client_for_user(user, self.base_url)
+        if api is None:
             self.logger.error("[LOCAL_STRATEGY] User '%s' has no Alpaca credentials.", user.username)
-            return None
-        return LegacyCompatibleAlpacaClient(api_key, api_secret, self.base_url)
+        return api
 
     def state_symbol_key(self, symbol: str, strategy: Optional[str] = None) -> str:
         normalized_symbol = strategy_store.normalize_symbol(symbol)
@@ -368,6 +763,7 @@ class LocalStrategyEngine:
 
     def symbol_state(self, symbol: str, strategy: Optional[str] = None) -> Dict:
         state_key = self.state_symbol_key(symbol, strategy)
+        self._touched_keys.add(state_key)
         with self.state_lock:
             return self.state.setdefault("symbols", {}).setdefault(state_key, {})
 
@@ -383,6 +779,9 @@ class LocalStrategyEngine:
             return None
 
     def entry_check_deferred(self, symbol: str, timeframe: str, strategy: Optional[str] = None) -> bool:
+        if self.schedule_mode == "bar_close":
+            # due_entries already held this entry back until its bar closed.
+            return False
         st = self.symbol_state(symbol, strategy)
         due = self._parse_state_time(st.get("next_entry_check_utc"))
         now = datetime.now(timezone.utc)
@@ -571,30 +970,11 @@ class LocalStrategyEngine:
         max_losses = int(cfg.get("daily_max_losses_per_symbol", self.daily_max_losses_per_symbol))
         max_loss_usd = float(cfg.get("daily_max_loss_usd_per_symbol", self.daily_max_loss_usd_per_symbol))
         day_start, day_end = self.local_day_bounds_utc()
-        opened_count = (
-            Trade.query
-            .filter(
-                Trade.user_id == user.id,
-                Trade.symbol == symbol,
-                Trade.open_time >= day_start,
-                Trade.open_time < day_end,
-            )
-            .count()
-        )
+        stats = trade_stats.daily(user.id, symbol, day_start, day_end)
+        opened_count = stats.opened
         if opened_count >= max_trades:
             return f"daily trade limit {opened_count}/{max_trades}"
-        closed = (
-            Trade.query
-            .filter(
-                Trade.user_id == user.id,
-                Trade.symbol == symbol,
-                Trade.status == "closed",
-                Trade.close_time >= day_start,
-                Trade.close_time < day_end,
-            )
-            .all()
-        )
-        losses = [float(t.profit_loss or 0.0) for t in closed if float(t.profit_loss or 0.0) < 0]
+        losses = stats.losses
         loss_count = len(losses)
         loss_usd = abs(sum(losses))
         if loss_count >= max_losses:
@@ -620,21 +1000,10 @@ class LocalStrategyEngine:
         min_win_rate = float(cfg.get("symbol_killswitch_min_win_rate_pct", 35))
         cooldown_days = max(1, int(cfg.get("symbol_killswitch_cooldown_days", 14)))
         window_start = datetime.now(timezone.utc) - timedelta(days=cooldown_days)
-        trades = (
-            Trade.query
-            .filter(
-                Trade.user_id == user.id,
-                Trade.symbol == symbol,
-                Trade.status == "closed",
-                Trade.close_time >= window_start,
-            )
-            .order_by(Trade.close_time.desc())
-            .limit(lookback_trades)
-            .all()
-        )
-        if len(trades) < min_trades:
+        # Newest first, so the trades inside the window are a prefix of the list.
+        pls = [pl for close_time, pl in trade_stats.recent_closed(user.id, symbol, lookback_trades) if close_time >= window_start]
+        if len(pls) < min_trades:
             return None
-        pls = [float(t.profit_loss or 0.0) for t in trades]
         net = sum(pls)
         win_rate = (sum(1 for p in pls if p > 0) / len(pls)) * 100.0
         if max_net_loss > 0 and net <= -max_net_loss:
@@ -718,24 +1087,159 @@ class LocalStrategyEngine:
             return False, f"market_uptrend:{regime}"
         return True, f"market_{regime}"
 
-    def fetch_closed_bars(self, api: LegacyCompatibleAlpacaClient, symbol: str, timeframe: str, feed: str, session: str) -> pd.DataFrame:
+    def bars_window(self, timeframe: str, session: str, now: datetime) -> tuple[str, datetime]:
+        """Return the Alpaca fetch timeframe and window start for a strategy timeframe."""
         normalized_tf = normalize_timeframe_token(timeframe)
-        fetch_tf = choose_fetch_timeframe([normalized_tf])
-        now = datetime.now(timezone.utc)
         session_multiplier = 4 if str(session or "").lower() == "regular" else 2
         lookback_seconds = max(
             timeframe_seconds(normalized_tf) * self.bars_lookback * session_multiplier,
             10 * 24 * 3600,
         )
-        start = now - timedelta(seconds=lookback_seconds)
-        bars = api.get_bars(
-            symbol,
-            fetch_tf,
-            start=start.isoformat().replace("+00:00", "Z"),
-            end=now.isoformat().replace("+00:00", "Z"),
-            adjustment="raw",
-            feed=feed,
-        ).df
+        return choose_fetch_timeframe([normalized_tf]), now - timedelta(seconds=lookback_seconds)
+
+    def prefetch_market_data(self, api: LegacyCompatibleAlpacaClient, cfg: Dict, entries: list) -> None:
+        """Batch this tick's bar and latest-price requests across the universe.
+
+        Bars are requested once per (fetch timeframe, full/incremental) group and
+        prices once for all symbols. Cold-start symbols are seeded from the bar
+        warehouse: fully covered windows are read from disk, the rest join a
+        batched request from their first uncovered bar and the result is stored
+        in the warehouse too. Anything that fails here is simply not prefetched,
+        so evaluation falls back to its per-symbol requests.
+        """
+        feed = str(cfg.get("feed", "iex"))
+        now = datetime.now(timezone.utc)
+        windows: Dict[tuple, datetime] = {}
+        symbols = []
+        for entry in entries:
+            backtest = entry.get("backtest")
+            if not isinstance(backtest, dict):
+                continue
+            symbol = strategy_store.normalize_symbol(entry.get("symbol", ""))
+            if symbol not in symbols:
+                symbols.append(symbol)
+            try:
+                fetch_tf, start = self.bars_window(
+                    backtest.get("timeframe") or cfg.get("timeframe", "30Min"),
+                    str(backtest.get("session") or cfg.get("session", "regular")),
+                    now,
+                )
+            except ValueError:
+                continue
+            key = (symbol, fetch_tf)
+            windows[key] = min(start, windows.get(key, start))
+
+        warehouse = self.bar_store.warehouse if self.bar_store is not None else None
+        groups: Dict[tuple, Dict[str, tuple]] = {}
+        for (symbol, fetch_tf), start in windows.items():
+            warm = False
+            if self.bar_store is not None:
+                request_start, full = self.bar_store.plan_fetch(symbol, fetch_tf, feed, start)
+                if not full and self.ingest_streamed_bars(symbol, fetch_tf, feed, request_start, start, now):
+                    continue
+                if full and warehouse is not None:
+                    try:
+                        gaps = warehouse.gaps(symbol, fetch_tf, feed, start, warehouse.closed_until(fetch_tf, now))
+                        if not gaps:
+                            # Covered by the warehouse: seeded from disk without a request.
+                            self.bar_store.fetch(api, symbol, fetch_tf, feed, start, now)
+                            self._prefetched_bars[(symbol, fetch_tf, feed)] = None
+                            continue
+                        request_start, warm = gaps[0][0], True
+                    except Exception as exc:
+                        self.logger.warning("[LOCAL_STRATEGY] Warehouse warmup failed for %s %s: %s", symbol, fetch_tf, exc)
+            else:
+                request_start, full = start, True
+            groups.setdefault((fetch_tf, full, warm), {})[symbol] = (request_start, start)
+
+        for (fetch_tf, full, warm), members in groups.items():
+            request_start = min(item[0] for item in members.values())
+            try:
+                results = api.get_bars_multi(
+                    list(members),
+                    fetch_tf,
+                    start=request_start.isoformat().replace("+00:00", "Z"),
+                    end=now.isoformat().replace("+00:00", "Z"),
+                    adjustment="raw",
+                    feed=feed,
+                )
+            except Exception as exc:
+                self.logger.warning("[LOCAL_STRATEGY] Batched %s bar fetch failed for %s symbol(s): %s", fetch_tf, len(members), exc)
+                continue
+            for symbol, (_own_start, window_start) in members.items():
+                result = results.get(symbol)
+                if result is None:
+                    continue
+                if warm:
+                    try:
+                        warehouse.store(symbol, fetch_tf, feed, result.df, request_start, now, now=now)
+                        bars = warehouse.read(symbol, fetch_tf, feed, window_start, now)
+                    except Exception as exc:
+                        self.logger.warning("[LOCAL_STRATEGY] Warehouse warmup failed for %s %s: %s", symbol, fetch_tf, exc)
+                        continue
+                    self.bar_store.ingest(symbol, fetch_tf, feed, bars, window_start, window_start, now, True)
+                    self._prefetched_bars[(symbol, fetch_tf, feed)] = None
+                elif self.bar_store is not None:
+                    self.bar_store.ingest(symbol, fetch_tf, feed, result.df, request_start, window_start, now, full)
+                    self._prefetched_bars[(symbol, fetch_tf, feed)] = None
+                else:
+                    self._prefetched_bars[(symbol, fetch_tf, feed)] = result.df
+
+        if self.market_feed is not None:
+            symbols = [symbol for symbol in symbols if self.market_feed.latest_price(symbol) is None]
+        if symbols:
+            try:
+                trades = api.get_latest_trades_multi(symbols)
+                self._prefetched_prices = {
+                    symbol: float(trade.price) for symbol, trade in trades.items() if float(trade.price or 0.0) > 0
+                }
+            except Exception as exc:
+                self.logger.warning("[LOCAL_STRATEGY] Batched latest price fetch failed for %s symbol(s): %s", len(symbols), exc)
+
+    def ingest_streamed_bars(self, symbol: str, fetch_tf: str, feed: str, request_start: datetime, window_start: datetime, now: datetime) -> bool:
+        """Top up the bar store from the websocket feed instead of REST, when covered."""
+        if self.market_feed is None:
+            return False
+        bars = self.market_feed.bars(symbol, fetch_tf, request_start, now)
+        if bars is None:
+            return False
+        self.bar_store.ingest(symbol, fetch_tf, feed, bars, request_start, window_start, now, False)
+        self._prefetched_bars[(symbol, fetch_tf, feed)] = None
+        return True
+
+    def fetch_closed_bars(self, api: LegacyCompatibleAlpacaClient, symbol: str, timeframe: str, feed: str, session: str) -> pd.DataFrame:
+        normalized_tf = normalize_timeframe_token(timeframe)
+        now = datetime.now(timezone.utc)
+        fetch_tf, start = self.bars_window(normalized_tf, session, now)
+        cutoff = pd.Timestamp(now - timedelta(seconds=timeframe_seconds(normalized_tf)))
+        prefetch_key = (strategy_store.normalize_symbol(symbol), fetch_tf, feed)
+        if self.bar_store is not None:
+            if prefetch_key in self._prefetched_bars:
+                raw, version = self.bar_store.window(symbol, fetch_tf, feed, start)
+            else:
+                raw, version = self.bar_store.fetch(api, symbol, fetch_tf, feed, start, now)
+            cache_key = (strategy_store.normalize_symbol(symbol), normalized_tf, feed, str(session or "").lower())
+            cached = self._resampled_bars.get(cache_key)
+            if cached and cached[0] == version:
+                bars = cached[1]
+            else:
+                bars = filter_session(resample_bars(raw, normalized_tf), session) if not raw.empty else raw
+                self._resampled_bars[cache_key] = (version, bars)
+            if bars.empty:
+                return bars
+            return bars[(bars.index >= pd.Timestamp(start)) & (bars.index <= cutoff)].dropna()
+        prefetched = self._prefetched_bars.get(prefetch_key)
+        if prefetched is not None:
+            bars = prefetched[pd.to_datetime(prefetched.index, utc=True) >= pd.Timestamp(start)]
+        else:
+            bars = api.get_bars(
+                symbol,
+                fetch_tf,
+                start=start.isoformat().replace("+00:00", "Z"),
+                end=now.isoformat().replace("+00:00", "Z"),
+                adjustment="raw",
+                feed=feed,
+            ).df
         if bars.empty:
             return bars
         bars = bars.copy().sort_index()
@@ -743,7 +1247,6 @@ class LocalStrategyEngine:
         bars = bars[["open", "high", "low", "close", "volume"]]
         bars = resample_bars(bars, normalized_tf)
         bars = filter_session(bars, session)
-        cutoff = pd.Timestamp(now - timedelta(seconds=timeframe_seconds(normalized_tf)))
         return bars[bars.index <= cutoff].dropna()
 
     def evaluate_symbol(self, user: User, api: LegacyCompatibleAlpacaClient, cfg: Dict, entry: Dict, backtest: Dict) -> None:
@@ -907,7 +1410,9 @@ class LocalStrategyEngine:
                 self.save_state()
             return
 
-        if params.get("strategy") == "macd_sma":
+        if self.incremental_indicators:
+            frame = self.indicator_frame(symbol, params, bars)
+        elif params.get("strategy") == "macd_sma":
             frame = self.build_macd_sma_frame(bars, params)
         elif params.get("strategy") == "rsi_reversion":
             frame = self.build_rsi_frame(bars, params)
@@ -946,6 +1451,22 @@ class LocalStrategyEngine:
         else:
             self.evaluate_entry(user, api, cfg, symbol, latest_price, params, frame, last_bar_ts, timeframe, backtest)
 
+    def indicator_frame(self, symbol: str, params: Dict, bars: pd.DataFrame) -> pd.DataFrame:
+        """Last indicator rows for ``bars``, advancing the cached state by the new bars only."""
+        frame_type = frame_type_for(params.get("strategy"))
+        prefix = (strategy_store.normalize_symbol(symbol), params.get("strategy"))
+        key = prefix + (frame_type.params_key(params),)
+        with self._indicator_lock:
+            state = self._indicator_frames.get(key)
+        if state is None or not state.update(bars):
+            state = frame_type(params)
+            state.update(bars)
+            with self._indicator_lock:
+                for stale in [other for other in self._indicator_frames if other[:2] == prefix]:
+                    self._indicator_frames.pop(stale, None)
+                self._indicator_frames[key] = state
+        return state.frame()
+
     def build_macd_sma_frame(self, bars: pd.DataFrame, params: Dict) -> pd.DataFrame:
         frame = bars.copy()
         frame["fast_ma"] = sma(frame["close"], params["macd_fast_length"])
@@ -981,6 +1502,13 @@ class LocalStrategyEngine:
         return frame.dropna()
 
     def get_latest_price(self, api: LegacyCompatibleAlpacaClient, symbol: str) -> float:
+        if self.market_feed is not None:
+            streamed = self.market_feed.latest_price(strategy_store.normalize_symbol(symbol))
+            if streamed:
+                return streamed
+        prefetched = self._prefetched_prices.get(strategy_store.normalize_symbol(symbol))
+        if prefetched:
+            return prefetched
         try:
             trade = api.get_latest_trade(symbol)
             return float(trade.price)
@@ -988,7 +1516,43 @@ class LocalStrategyEngine:
             self.logger.error("[LOCAL_STRATEGY] %s latest price failed: %s", symbol, exc)
             return 0.0
 
+    def positions_map(self, api: LegacyCompatibleAlpacaClient) -> Dict[str, object]:
+        try:
+            positions = api.list_positions()
+        except Exception as exc:
+            if self.is_transient_api_exception(exc):
+                raise TransientStrategyAPIError(f"Alpaca positions snapshot failed: {exc}") from exc
+            raise RuntimeError(f"Alpaca positions snapshot failed: {exc}") from exc
+        snapshot = {
+            strategy_store.normalize_symbol(str(getattr(position, "symbol", "") or "")): position
+            for position in positions or []
+        }
+        self._open_position_symbols = set(snapshot)
+        self._positions_changed = False
+        self._positions_loaded_at = time.time()
+        return snapshot
+
+    def positions_snapshot_reusable(self) -> bool:
+        # Streaming wakes the loop on every watched trade; re-listing positions
+        # each time would put the REST load back, so the last snapshot is kept
+        # for up to exit_poll_seconds unless an order invalidated it.
+        return (
+            self.market_feed is not None
+            and self._positions is not None
+            and time.time() - self._positions_loaded_at < self.exit_poll_seconds
+        )
+
+    def invalidate_positions(self) -> None:
+        with self._positions_lock:
+            self._positions = None
+            self._positions_changed = True
+
     def get_position(self, api: LegacyCompatibleAlpacaClient, symbol: str):
+        if self._positions_tick:
+            with self._positions_lock:
+                if self._positions is None:
+                    self._positions = self.positions_map(api)
+                return self._positions.get(strategy_store.normalize_symbol(symbol))
         try:
             return api.get_position(symbol)
         except AlpacaAPIError as exc:
@@ -1690,6 +2254,8 @@ class LocalStrategyEngine:
             self.logger.info("[LOCAL_STRATEGY_DRY_RUN] user=%s payload=%s", user.username, payload)
             return True
         ok, status, result, _record = self.execute_trade(user, payload)
+        self.invalidate_positions()
+        self.mark_state_durable(payload.get("symbol", ""), payload.get("strategy"))
         if ok and status < 400:
             self.logger.info("[LOCAL_STRATEGY_ORDER_OK] user=%s kind=%s payload=%s result=%s", user.username, kind, payload, result)
             return True
@@ -1741,6 +2307,8 @@ class LocalStrategyEngine:
             attempts = int(item.get("attempts", 0)) + 1
             payload = item.get("payload") or {}
             ok, status, result, _record = self.execute_trade(user, payload)
+            self.invalidate_positions()
+            self.mark_state_durable(payload.get("symbol", ""), payload.get("strategy"))
             if ok and status < 400:
                 self.logger.info("[LOCAL_STRATEGY_RECOVERY_OK] item=%s attempts=%s result=%s", item.get("id"), attempts, result)
                 changed = True
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""In-memory latest prices and minute bars fed by the Alpaca stock stream.
+
+With ``LOCAL_STRATEGY_MARKET_DATA=stream`` the local strategy engine keeps an
+Alpaca data websocket open for the enabled universe. Every trade and minute bar
+lands here, and the engine reads prices and the tail of its bar history from
+memory instead of polling REST:
+
+* ``latest_price`` returns the last streamed trade while it is fresh.
+* ``bars`` rebuilds closed fetch-timeframe bars from streamed minute bars,
+  but only for windows that started after the current connection did. Anything
+  older, or any gap caused by a reconnect, falls back to REST.
+* Trade listeners let the engine react to price moves on open positions
+  immediately instead of on its next poll.
+
+Latest prices are also mirrored to ``instance/market_stream_prices.json`` so
+the dashboard (a separate process) can show them without its own requests.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from bar_store import BAR_COLUMNS, empty_bars
+from misc.pine_optimizer import timeframe_seconds
+
+
+SNAPSHOT_FILENAME = "market_stream_prices.json"
+
+
+class MarketDataFeed:
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        logger=None,
+        max_bars: int = 2000,
+        price_max_age_seconds: float = 60.0,
+        bar_grace_seconds: float = 5.0,
+        snapshot_interval_seconds: float = 2.0,
+    ):
+        self.snapshot_path = snapshot_path
+        self.logger = logger
+        self.max_bars = max(1, int(max_bars))
+        self.price_max_age_seconds = float(price_max_age_seconds)
+        self.bar_grace_seconds = float(bar_grace_seconds)
+        self.snapshot_interval_seconds = float(snapshot_interval_seconds)
+        self._lock = threading.Lock()
+        self._prices: Dict[str, tuple] = {}
+        self._bars: Dict[str, Dict[pd.Timestamp, tuple]] = {}
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._snapshot_written = 0.0
+        self.covered_from: Optional[datetime] = None
+        self.stats = {"connects": 0, "trades": 0, "bars": 0}
+
+    def add_listener(self, callback: Callable[[str, float], None]) -> None:
+        self._listeners.append(callback)
+
+    # -- stream callbacks ------------------------------------------------------
+    def on_connected(self) -> None:
+        """Start a new coverage window; bars from before the reconnect may have gaps."""
+        now = pd.Timestamp.now(tz="UTC").floor("min")
+        with self._lock:
+            self._bars.clear()
+            self.covered_from = now.to_pydatetime()
+            self.stats["connects"] += 1
+
+    def on_trade(self, symbol: str, price: float, ts: Optional[datetime] = None) -> None:
+        received = time.time()
+        with self._lock:
+            self._prices[symbol] = (float(price), ts, received)
+            self.stats["trades"] += 1
+        for callback in list(self._listeners):
+            try:
+                callback(symbol, float(price))
+            except Exception as exc:
+                self._warn("trade listener failed for %s: %s", symbol, exc)
+        if received - self._snapshot_written >= self.snapshot_interval_seconds:
+            self._snapshot_written = received
+            self.write_snapshot()
+
+    def on_bar(self, symbol: str, ts: datetime, open_: float, high: float, low: float, close: float, volume: float) -> None:
+        key = pd.Timestamp(ts).floor("min")
+        with self._lock:
+            bars = self._bars.setdefault(symbol, {})
+            bars[key] = (open_, high, low, close, volume)
+            self.stats["bars"] += 1
+            while len(bars) > self.max_bars:
+                bars.pop(next(iter(bars)))
+
+    # -- reads -----------------------------------------------------------------
+    def latest_price(self, symbol: str) -> Optional[float]:
+        with self._lock:
+            item = self._prices.get(symbol)
+        if not item or time.time() - item[2] > self.price_max_age_seconds:
+            return None
+        return item[0]
+
+    def bars(self, symbol: str, fetch_tf: str, since: datetime, now: datetime) -> Optional[pd.DataFrame]:
+        """Closed ``fetch_tf`` bars since ``since`` built from streamed minutes.
+
+        Returns None when the stream cannot vouch for the whole window (nothing
+        connected yet, window starts before the current connection, or a daily
+        timeframe whose session boundaries minute bars cannot reproduce).
+        Bars are start-labelled like Alpaca's own aggregates; a bucket counts as
+        closed once its last minute arrived or ``bar_grace_seconds`` after its
+        end, because minutes without trades never produce a bar.
+        """
+        step = int(timeframe_seconds(fetch_tf))
+        with self._lock:
+            if self.covered_from is None or since < self.covered_from or step >= 24 * 3600:
+                return None
+            rows = dict(self._bars.get(symbol, {}))
+        if not rows:
+            return empty_bars()
+        frame = pd.DataFrame.from_dict(rows, orient="index", columns=BAR_COLUMNS).sort_index()
+        frame.index = pd.DatetimeIndex(frame.index, name="timestamp")
+        frame = frame[frame.index >= pd.Timestamp(since)]
+        if frame.empty:
+            return empty_bars()
+        minute = pd.Timedelta(minutes=1)
+        delta = pd.Timedelta(seconds=step)
+        if step > 60:
+            frame = frame.resample(delta, label="left", closed="left").agg(
+                {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+            ).dropna(subset=["open", "high", "low", "close"])
+        ends = frame.index + delta
+        closed = (ends <= frame.index[-1] + minute) if step > 60 else ends <= pd.Timestamp(now)
+        closed = closed | (ends + pd.Timedelta(seconds=self.bar_grace_seconds) <= pd.Timestamp(now))
+        return frame[closed]
+
+    # -- dashboard snapshot ------------------------------------------------------
+    def write_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            prices = {
+                symbol: {
+                    "price": price,
+                    "ts_utc": ts.isoformat() if ts else None,
+                    "received_utc": datetime.fromtimestamp(received, timezone.utc).isoformat(),
+                }
+                for symbol, (price, ts, received) in self._prices.items()
+            }
+        try:
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"updated_utc": datetime.now(timezone.utc).isoformat(), "prices": prices}, fh)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as exc:
+            self._warn("failed to write price snapshot: %s", exc)
+
+    def _warn(self, msg, *args):
+        if self.logger:
+            self.logger.warning("[MARKET_STREAM] " + msg, *args)
+
+
+def load_price_snapshot(instance_path: str, max_age_seconds: Optional[float] = None) -> Dict[str, float]:
+    """Streamed prices received within ``max_age_seconds``; empty when unavailable."""
+    if max_age_seconds is None:
+        max_age_seconds = float(os.getenv("MARKET_STREAM_PRICE_MAX_AGE_SECONDS", "60"))
+    try:
+        with open(os.path.join(instance_path, SNAPSHOT_FILENAME), "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return {}
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    prices = {}
+    for symbol, item in (data.get("prices") or {}).items():
+        try:
+            if datetime.fromisoformat(item["received_utc"]) >= cutoff and float(item["price"]) > 0:
+                prices[symbol] = float(item["price"])
+        except Exception:
+            continue
+    return prices
+
+
+def create_market_feed(instance_path: str, logger=None) -> Optional[MarketDataFeed]:
+    if os.getenv("LOCAL_STRATEGY_MARKET_DATA", "rest").strip().lower() != "stream":
+        return None
+
+    def _float_env(name: str, default: float) -> float:
+        try:
+            return float(os.getenv(name, str(default)))
+        except (TypeError, ValueError):
+            return default
+
+    return MarketDataFeed(
+        snapshot_path=os.path.join(instance_path, SNAPSHOT_FILENAME),
+        logger=logger,
+        max_bars=int(_float_env("MARKET_STREAM_MAX_BARS", 2000)),
+        price_max_age_seconds=_float_env("MARKET_STREAM_PRICE_MAX_AGE_SECONDS", 60.0),
+        bar_grace_seconds=_float_env("MARKET_STREAM_BAR_GRACE_SECONDS", 5.0),
+    )
@@ -10,10 +10,15 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 from pathlib import Path
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from event_sink import iter_lines  # noqa: E402
 DEFAULT_INPUT = PROJECT_ROOT / "instance" / "llm_trade_shadow.jsonl"
 DEFAULT_OUTPUT = PROJECT_ROOT / "instance" / "llm_shadow_training_examples.jsonl"
 
@@ -27,18 +32,16 @@ SYSTEM_PROMPT = (
 
 
 def load_events(path: Path):
-    if not path.exists():
-        return []
+    """Events from the live log and its rotated segments, oldest first."""
     events = []
-    with path.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                events.append(json.loads(line))
-            except json.JSONDecodeError:
-                continue
+    for line in iter_lines(str(path)):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
     return events
 
 
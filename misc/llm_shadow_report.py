@@ -7,10 +7,15 @@ import argparse
 import json
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta, timezone
+import sys
 from pathlib import Path
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from event_sink import iter_lines  # noqa: E402
 DEFAULT_LOG = PROJECT_ROOT / "instance" / "llm_trade_shadow.jsonl"
 
 
@@ -31,21 +36,19 @@ def load_events(path: Path, days: int | None):
     if days and days > 0:
         cutoff = datetime.now(timezone.utc) - timedelta(days=days)
     events = []
-    if not path.exists():
-        return events
-    with path.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                event = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            ts = parse_time(event.get("created_at_utc"))
-            if cutoff and ts and ts < cutoff:
-                continue
-            events.append(event)
+    # Rotated segments first, so events stay oldest first.
+    for line in iter_lines(str(path)):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        ts = parse_time(event.get("created_at_utc"))
+        if cutoff and ts and ts < cutoff:
+            continue
+        events.append(event)
     return events
 
 
@@ -338,14 +338,8 @@ def derive_reference_settings(
     return params, cfg, symbol, tf, start_utc, end_utc, raw_symbol
 
 
-def fetch_bars_alpaca(
-    symbol: str,
-    timeframe: str,
-    start_utc: datetime,
-    end_utc: datetime,
-    username: Optional[str],
-    feed: str,
-) -> pd.DataFrame:
+def alpaca_client_for_user(username: Optional[str]):
+    """Alpaca client built from a local DB user's encrypted keys."""
     load_dotenv(PROJECT_ROOT / ".env")
 
     from flask import Flask
@@ -373,16 +367,26 @@ def fetch_bars_alpaca(
             raise RuntimeError(f"User '{user.username}' has no usable Alpaca credentials.")
 
         base_url = __import__("os").getenv("ALPACA_API_BASE_URL", "https://paper-api.alpaca.markets")
-        api = LegacyCompatibleAlpacaClient(key, secret, base_url)
+        return LegacyCompatibleAlpacaClient(key, secret, base_url)
 
-        bars = api.get_bars(
-            symbol,
-            timeframe,
-            start=start_utc.isoformat().replace("+00:00", "Z"),
-            end=end_utc.isoformat().replace("+00:00", "Z"),
-            adjustment="raw",
-            feed=feed,
-        ).df
+
+def fetch_bars_alpaca(
+    symbol: str,
+    timeframe: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    username: Optional[str],
+    feed: str,
+) -> pd.DataFrame:
+    api = alpaca_client_for_user(username)
+    bars = api.get_bars(
+        symbol,
+        timeframe,
+        start=start_utc.isoformat().replace("+00:00", "Z"),
+        end=end_utc.isoformat().replace("+00:00", "Z"),
+        adjustment="raw",
+        feed=feed,
+    ).df
 
     if bars.empty:
         raise RuntimeError("No bars returned from Alpaca. Check symbol/timeframe/feed/range.")
@@ -396,6 +400,29 @@ def fetch_bars_alpaca(
     return bars
 
 
+def fetch_bars_warehouse(
+    symbol: str,
+    timeframe: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    username: Optional[str],
+    feed: str,
+) -> pd.DataFrame:
+    """Bars from the shared instance/bar_warehouse, fetching only uncovered ranges.
+
+    Credentials are only decrypted (and Alpaca only called) when there is a gap.
+    """
+    from bar_warehouse import BarWarehouse, alpaca_fetcher
+
+    load_dotenv(PROJECT_ROOT / ".env")
+    base_dir = os.getenv("BAR_WAREHOUSE_DIR", str(PROJECT_ROOT / "instance" / "bar_warehouse"))
+    warehouse = BarWarehouse(base_dir)
+    bars = warehouse.ensure(alpaca_fetcher(lambda: alpaca_client_for_user(username)), symbol, timeframe, feed, start_utc, end_utc)
+    if bars.empty:
+        raise RuntimeError("No bars in the warehouse or from Alpaca. Check symbol/timeframe/feed/range.")
+    return bars
+
+
 def load_bars_csv(csv_path: Path) -> pd.DataFrame:
     df = pd.read_csv(csv_path)
     needed = {"timestamp", "open", "high", "low", "close"}
@@ -408,6 +435,13 @@ def load_bars_csv(csv_path: Path) -> pd.DataFrame:
     return df[["open", "high", "low", "close", "volume"]]
 
 
+def load_bars_npz(npz_path: Path) -> pd.DataFrame:
+    """Checksummed bar payload written by the dashboard for remote jobs."""
+    from bar_payload import load_bars_npz as _load_bars_npz
+
+    return _load_bars_npz(npz_path)
+
+
 def filter_session(df: pd.DataFrame, mode: str) -> pd.DataFrame:
     mode = (mode or "regular").lower()
     if mode == "all":
@@ -684,14 +718,15 @@ def in_preclose_window(ts_utc: pd.Timestamp, cfg: BacktestConfig) -> bool:
 
 
 # ---------------------------------------------------------------------------
-# Optional Numba JIT fast path for the Keltner simulation.
+# Optional Numba JIT fast path for the strategy simulations.
 #
 # The bar loop is sequential and branch-heavy, so it dominates optimizer runtime.
 # The functions below are written in a Numba-compatible style (numpy + scalars,
 # no pandas/objects). When numba is importable they are JIT-compiled for a large
 # speedup; otherwise they run as plain Python with identical semantics. The
-# original backtest() remains the reference implementation and the fast path is
-# only used after parity is verified (see tests/test_pine_optimizer_numba.py).
+# original backtest(), backtest_macd_sma() and backtest_rsi() remain the
+# reference implementations and the fast paths are only used after parity is
+# verified (see tests/test_pine_optimizer_numba.py).
 # Set STRATEGY_DISABLE_NUMBA=1 to force the reference path.
 # ---------------------------------------------------------------------------
 try:
@@ -992,41 +1027,176 @@ def _preclose_flags(idx, cfg: BacktestConfig) -> np.ndarray:
     return ((minutes_of_day >= start_min) & (minutes_of_day < close_min)).astype(np.int64)
 
 
-def backtest_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
-    df = df[(df.index >= pd.Timestamp(start_utc)) & (df.index <= pd.Timestamp(end_utc))].copy()
-    if len(df) < 100:
-        raise RuntimeError("Not enough bars for backtest after date filtering.")
+@_njit(cache=True)
+def _simulate_signal_exit_core(h, l, c, long_entry, short_entry, long_exit, short_exit, preclose,
+                               long_allowed, short_allowed, order_size_usd, commission_pct,
+                               fixed_sl_pct, fixed_tp_pct, forced_sl_pct, forced_tp_pct,
+                               initial_capital):
+    # Shared bar loop of backtest_macd_sma / backtest_rsi: pre-close flat, then
+    # forced SL/TP on the bar range, fixed SL/TP on the close, then the
+    # strategy's own exit signal. Reason codes: see _signal_exit_reasons().
+    n = c.shape[0]
+    ent_idx = np.empty(n, dtype=np.int64)
+    ex_idx = np.empty(n, dtype=np.int64)
+    ent_px = np.empty(n, dtype=np.float64)
+    ex_px = np.empty(n, dtype=np.float64)
+    qty_arr = np.empty(n, dtype=np.int64)
+    side_arr = np.empty(n, dtype=np.int64)
+    reason_arr = np.empty(n, dtype=np.int64)
+    pnl_arr = np.empty(n, dtype=np.float64)
+    pnlpct_arr = np.empty(n, dtype=np.float64)
+    equity_arr = np.empty(n + 1, dtype=np.float64)
+    equity_arr[0] = initial_capital
+    eq_count = 1
+    tcount = 0
 
-    mid_inner, up_inner, low_inner = keltner_channel(df, params.inner_kc_length, params.inner_kc_mult)
-    df["mid_inner"] = mid_inner
-    df["up_inner"] = up_inner
-    df["low_inner"] = low_inner
-    df = df.dropna()
-    if df.empty:
-        raise RuntimeError("Indicator warm-up removed all bars; widen date range.")
+    equity = initial_capital
+    position = 0
+    entry_price = 0.0
+    qty = 0
+    entry_index = -1
 
-    idx = df.index
-    o = df["open"].to_numpy(dtype=float)
-    h = df["high"].to_numpy(dtype=float)
-    l = df["low"].to_numpy(dtype=float)
-    c = df["close"].to_numpy(dtype=float)
-    mid = df["mid_inner"].to_numpy(dtype=float)
-    uin = df["up_inner"].to_numpy(dtype=float)
-    lin = df["low_inner"].to_numpy(dtype=float)
-    preclose = _preclose_flags(idx, cfg)
+    for i in range(1, n):
+        has_exit = 0
+        exit_price = 0.0
+        reason_code = 0
+        if position != 0:
+            ci = c[i]
+            if preclose[i] == 1:
+                has_exit = 1
+                exit_price = ci
+                reason_code = 1  # Market Close
+            elif position > 0:
+                if l[i] <= entry_price * (1 - forced_sl_pct / 100.0):
+                    has_exit = 1
+                    exit_price = entry_price * (1 - forced_sl_pct / 100.0)
+                    reason_code = 2
+                elif h[i] >= entry_price * (1 + forced_tp_pct / 100.0):
+                    has_exit = 1
+                    exit_price = entry_price * (1 + forced_tp_pct / 100.0)
+                    reason_code = 3
+                elif ci <= entry_price * (1 - fixed_sl_pct / 100.0):
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 4
+                elif ci >= entry_price * (1 + fixed_tp_pct / 100.0):
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 5
+                elif long_exit[i]:
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 6
+            else:
+                if h[i] >= entry_price * (1 + forced_sl_pct / 100.0):
+                    has_exit = 1
+                    exit_price = entry_price * (1 + forced_sl_pct / 100.0)
+                    reason_code = 7
+                elif l[i] <= entry_price * (1 - forced_tp_pct / 100.0):
+                    has_exit = 1
+                    exit_price = entry_price * (1 - forced_tp_pct / 100.0)
+                    reason_code = 8
+                elif ci >= entry_price * (1 + fixed_sl_pct / 100.0):
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 9
+                elif ci <= entry_price * (1 - fixed_tp_pct / 100.0):
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 10
+                elif short_exit[i]:
+                    has_exit = 1
+                    exit_price = ci
+                    reason_code = 11
+
+        if has_exit == 1:
+            notional_entry = qty * entry_price
+            notional_exit = qty * exit_price
+            fees = (notional_entry + notional_exit) * (commission_pct / 100.0)
+            pnl = (exit_price - entry_price) * qty * position - fees
+            pnl_pct = (pnl / notional_entry) * 100.0 if notional_entry != 0 else 0.0
+
+            equity += pnl
+            equity_arr[eq_count] = equity
+            eq_count += 1
+
+            ent_idx[tcount] = entry_index
+            ex_idx[tcount] = i
+            ent_px[tcount] = entry_price
+            ex_px[tcount] = exit_price
+            qty_arr[tcount] = qty
+            side_arr[tcount] = position
+            reason_arr[tcount] = reason_code
+            pnl_arr[tcount] = pnl
+            pnlpct_arr[tcount] = pnl_pct
+            tcount += 1
+
+            position = 0
+            entry_price = 0.0
+            qty = 0
+            entry_index = -1
+            # Exit bars never re-enter, matching the reference loop's `continue`.
+            continue
 
-    long_allowed = 1 if params.trade_direction in ("Both", "Long Only") else 0
-    short_allowed = 1 if params.trade_direction in ("Both", "Short Only") else 0
+        if position == 0:
+            entry_side = 0
+            if long_allowed == 1 and long_entry[i]:
+                entry_side = 1
+            elif short_allowed == 1 and short_entry[i]:
+                entry_side = -1
+            if entry_side != 0:
+                q = int(math.floor(order_size_usd / c[i]))
+                if q > 0:
+                    position = entry_side
+                    entry_price = c[i]
+                    qty = q
+                    entry_index = i
 
+    if position != 0 and qty > 0:
+        final_price = c[n - 1]
+        notional_entry = qty * entry_price
+        notional_exit = qty * final_price
+        fees = (notional_entry + notional_exit) * (commission_pct / 100.0)
+        pnl = (final_price - entry_price) * qty * position - fees
+        pnl_pct = (pnl / notional_entry) * 100.0 if notional_entry != 0 else 0.0
+        equity += pnl
+        equity_arr[eq_count] = equity
+        eq_count += 1
+        ent_idx[tcount] = entry_index
+        ex_idx[tcount] = n - 1
+        ent_px[tcount] = entry_price
+        ex_px[tcount] = final_price
+        qty_arr[tcount] = qty
+        side_arr[tcount] = position
+        reason_arr[tcount] = 12  # Final Close
+        pnl_arr[tcount] = pnl
+        pnlpct_arr[tcount] = pnl_pct
+        tcount += 1
+
+    return (tcount, ent_idx, ex_idx, ent_px, ex_px, qty_arr, side_arr, reason_arr,
+            pnl_arr, pnlpct_arr, eq_count, equity_arr)
+
+
+def _signal_exit_reasons(prefix: str, long_exit_reason: str, short_exit_reason: str) -> Dict[int, str]:
+    return {
+        1: f"{prefix} Market Close",
+        2: f"{prefix} Forced SL Long", 3: f"{prefix} Forced TP Long",
+        4: f"{prefix} Fixed Stop Loss Long", 5: f"{prefix} Fixed Take Profit Long",
+        6: long_exit_reason,
+        7: f"{prefix} Forced SL Short", 8: f"{prefix} Forced TP Short",
+        9: f"{prefix} Fixed Stop Loss Short", 10: f"{prefix} Fixed Take Profit Short",
+        11: short_exit_reason,
+        12: "Final Close",
+    }
+
+
+_MACD_REASON_CODE_TO_TEXT = _signal_exit_reasons("MACD", "MACD Opposite Short Signal", "MACD Opposite Long Signal")
+_RSI_REASON_CODE_TO_TEXT = _signal_exit_reasons("RSI", "RSI Mean Reversion Exit Long", "RSI Mean Reversion Exit Short")
+
+
+def _result_from_core(idx, core_out, reason_text: Dict[int, str], params: StrategyParams, cfg: BacktestConfig) -> BacktestResult:
     (tcount, ent_idx, ex_idx, ent_px, ex_px, qty_arr, side_arr, reason_arr,
-     pnl_arr, pnlpct_arr, eq_count, equity_arr) = _simulate_keltner_core(
-        o, h, l, c, mid, uin, lin, preclose,
-        long_allowed, short_allowed, float(cfg.order_size_usd), float(cfg.commission_pct),
-        float(params.fixed_stop_loss_pct), float(params.fixed_take_profit_pct),
-        float(params.forced_stop_loss_pct), float(params.forced_take_profit_pct),
-        int(params.trailing_offset_ticks), float(params.tick_size), float(params.trailing_offset_pct),
-        float(cfg.initial_capital),
-    )
+     pnl_arr, pnlpct_arr, eq_count, equity_arr) = core_out
 
     winners = 0
     losers = 0
@@ -1057,7 +1227,7 @@ def backtest_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig,
             "qty": int(qty_arr[t]),
             "pnl": round(pnl, 2),
             "pnl_pct": round(float(pnlpct_arr[t]), 4),
-            "reason": _REASON_CODE_TO_TEXT.get(int(reason_arr[t]), "Unknown"),
+            "reason": reason_text.get(int(reason_arr[t]), "Unknown"),
             "bars_held": bars_held,
         })
 
@@ -1069,6 +1239,59 @@ def backtest_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig,
     )
 
 
+def _simulate_signal_exit(df: pd.DataFrame, long_exit: np.ndarray, short_exit: np.ndarray, reason_text: Dict[int, str],
+                          params: StrategyParams, cfg: BacktestConfig) -> BacktestResult:
+    long_allowed = 1 if params.trade_direction in ("Both", "Long Only") else 0
+    short_allowed = 1 if params.trade_direction in ("Both", "Short Only") else 0
+    core_out = _simulate_signal_exit_core(
+        df["high"].to_numpy(dtype=float), df["low"].to_numpy(dtype=float), df["close"].to_numpy(dtype=float),
+        df["long_signal"].to_numpy(dtype=np.bool_), df["short_signal"].to_numpy(dtype=np.bool_),
+        long_exit, short_exit, _preclose_flags(df.index, cfg),
+        long_allowed, short_allowed, float(cfg.order_size_usd), float(cfg.commission_pct),
+        float(params.fixed_stop_loss_pct), float(params.fixed_take_profit_pct),
+        float(params.forced_stop_loss_pct), float(params.forced_take_profit_pct),
+        float(cfg.initial_capital),
+    )
+    return _result_from_core(df.index, core_out, reason_text, params, cfg)
+
+
+def backtest_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+    df = df[(df.index >= pd.Timestamp(start_utc)) & (df.index <= pd.Timestamp(end_utc))].copy()
+    if len(df) < 100:
+        raise RuntimeError("Not enough bars for backtest after date filtering.")
+
+    mid_inner, up_inner, low_inner = keltner_channel(df, params.inner_kc_length, params.inner_kc_mult)
+    df["mid_inner"] = mid_inner
+    df["up_inner"] = up_inner
+    df["low_inner"] = low_inner
+    df = df.dropna()
+    if df.empty:
+        raise RuntimeError("Indicator warm-up removed all bars; widen date range.")
+
+    idx = df.index
+    o = df["open"].to_numpy(dtype=float)
+    h = df["high"].to_numpy(dtype=float)
+    l = df["low"].to_numpy(dtype=float)
+    c = df["close"].to_numpy(dtype=float)
+    mid = df["mid_inner"].to_numpy(dtype=float)
+    uin = df["up_inner"].to_numpy(dtype=float)
+    lin = df["low_inner"].to_numpy(dtype=float)
+    preclose = _preclose_flags(idx, cfg)
+
+    long_allowed = 1 if params.trade_direction in ("Both", "Long Only") else 0
+    short_allowed = 1 if params.trade_direction in ("Both", "Short Only") else 0
+
+    core_out = _simulate_keltner_core(
+        o, h, l, c, mid, uin, lin, preclose,
+        long_allowed, short_allowed, float(cfg.order_size_usd), float(cfg.commission_pct),
+        float(params.fixed_stop_loss_pct), float(params.fixed_take_profit_pct),
+        float(params.forced_stop_loss_pct), float(params.forced_take_profit_pct),
+        int(params.trailing_offset_ticks), float(params.tick_size), float(params.trailing_offset_pct),
+        float(cfg.initial_capital),
+    )
+    return _result_from_core(idx, core_out, _REASON_CODE_TO_TEXT, params, cfg)
+
+
 def backtest(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
     df = df[(df.index >= pd.Timestamp(start_utc)) & (df.index <= pd.Timestamp(end_utc))].copy()
     if len(df) < 100:
@@ -1446,7 +1669,7 @@ def _finalize_result(
     )
 
 
-def backtest_macd_sma(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+def _macd_sma_frame(df: pd.DataFrame, params: StrategyParams, start_utc: datetime, end_utc: datetime) -> pd.DataFrame:
     df = df[(df.index >= pd.Timestamp(start_utc)) & (df.index <= pd.Timestamp(end_utc))].copy()
     if len(df) < max(100, params.macd_sma_length + params.macd_slow_length + params.macd_signal_length + 5):
         raise RuntimeError("Not enough bars for MACD/SMA backtest after date filtering.")
@@ -1477,7 +1700,11 @@ def backtest_macd_sma(df: pd.DataFrame, params: StrategyParams, cfg: BacktestCon
     df = df.dropna()
     if df.empty:
         raise RuntimeError("MACD/SMA indicator warm-up removed all bars; widen date range.")
+    return df
+
 
+def backtest_macd_sma(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+    df = _macd_sma_frame(df, params, start_utc, end_utc)
     idx = df.index
     c = df["close"].to_numpy(dtype=float)
     h = df["high"].to_numpy(dtype=float)
@@ -1617,18 +1844,7 @@ def backtest_macd_sma(df: pd.DataFrame, params: StrategyParams, cfg: BacktestCon
     )
 
 
-def backtest_rsi(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
-    """RSI(2) mean-reversion with a trend filter (Connors-style).
-
-    Edge being traded: in an uptrend, a short, sharp pullback (RSI(2) very low)
-    tends to snap back; symmetrically for downtrends. It fires often, so the win
-    rate it reports is backed by a real sample instead of a handful of lucky
-    trades — the opposite failure mode to the few-trade/100%-win combos.
-
-    Long  entry: close > trend SMA  AND  RSI < oversold
-    Short entry: close < trend SMA  AND  RSI > overbought
-    Exit: RSI reverts past the exit level, or forced/fixed SL/TP, or pre-close.
-    """
+def _rsi_frame(df: pd.DataFrame, params: StrategyParams, start_utc: datetime, end_utc: datetime) -> pd.DataFrame:
     df = df[(df.index >= pd.Timestamp(start_utc)) & (df.index <= pd.Timestamp(end_utc))].copy()
     warmup = max(100, params.rsi_trend_length + params.rsi_length + 5)
     if len(df) < warmup:
@@ -1646,7 +1862,22 @@ def backtest_rsi(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig,
     df = df.dropna()
     if df.empty:
         raise RuntimeError("RSI indicator warm-up removed all bars; widen date range.")
+    return df
+
+
+def backtest_rsi(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+    """RSI(2) mean-reversion with a trend filter (Connors-style).
+
+    Edge being traded: in an uptrend, a short, sharp pullback (RSI(2) very low)
+    tends to snap back; symmetrically for downtrends. It fires often, so the win
+    rate it reports is backed by a real sample instead of a handful of lucky
+    trades — the opposite failure mode to the few-trade/100%-win combos.
 
+    Long  entry: close > trend SMA  AND  RSI < oversold
+    Short entry: close < trend SMA  AND  RSI > overbought
+    Exit: RSI reverts past the exit level, or forced/fixed SL/TP, or pre-close.
+    """
+    df = _rsi_frame(df, params, start_utc, end_utc)
     idx = df.index
     c = df["close"].to_numpy(dtype=float)
     h = df["high"].to_numpy(dtype=float)
@@ -1788,10 +2019,31 @@ def backtest_rsi(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig,
     )
 
 
+def backtest_macd_sma_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+    df = _macd_sma_frame(df, params, start_utc, end_utc)
+    # The opposite entry signal is the MACD exit signal.
+    return _simulate_signal_exit(
+        df, df["short_signal"].to_numpy(dtype=np.bool_), df["long_signal"].to_numpy(dtype=np.bool_),
+        _MACD_REASON_CODE_TO_TEXT, params, cfg,
+    )
+
+
+def backtest_rsi_fast(df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
+    df = _rsi_frame(df, params, start_utc, end_utc)
+    return _simulate_signal_exit(
+        df, df["long_exit"].to_numpy(dtype=np.bool_), df["short_exit"].to_numpy(dtype=np.bool_),
+        _RSI_REASON_CODE_TO_TEXT, params, cfg,
+    )
+
+
 def run_strategy_backtest(strategy: str, df: pd.DataFrame, params: StrategyParams, cfg: BacktestConfig, start_utc: datetime, end_utc: datetime) -> BacktestResult:
     if strategy == "macd_sma":
+        if NUMBA_AVAILABLE:
+            return backtest_macd_sma_fast(df, params, cfg, start_utc, end_utc)
         return backtest_macd_sma(df, params, cfg, start_utc, end_utc)
     if strategy == "rsi_reversion":
+        if NUMBA_AVAILABLE:
+            return backtest_rsi_fast(df, params, cfg, start_utc, end_utc)
         return backtest_rsi(df, params, cfg, start_utc, end_utc)
     if NUMBA_AVAILABLE:
         return backtest_fast(df, params, cfg, start_utc, end_utc)
@@ -2106,9 +2358,15 @@ def main() -> None:
     parser.add_argument("--accelerator", type=str, default="auto", choices=["auto", "cpu", "gpu"])
     parser.add_argument("--pine", type=Path, default=None)
     parser.add_argument("--reference-xlsx", type=Path, default=DEFAULT_XLSX)
-    parser.add_argument("--bars-csv", type=Path, default=None, help="Optional CSV with timestamp,open,high,low,close[,volume]")
+    parser.add_argument("--bars-csv", type=Path, default=None, help="Optional CSV with timestamp,open,high,low,close[,volume], or a checksummed .npz bar payload")
     parser.add_argument("--alpaca-user", type=str, default=None, help="Username from local DB to use Alpaca keys")
     parser.add_argument("--feed", type=str, default="iex", help="Alpaca feed (iex/sip). For free plans use iex.")
+    parser.add_argument(
+        "--bars-source",
+        choices=["alpaca", "warehouse"],
+        default="alpaca",
+        help="Where to load bars when --bars-csv is not given: straight from Alpaca, or the shared on-disk warehouse (only missing ranges are fetched).",
+    )
     parser.add_argument("--symbol", type=str, default=None)
     parser.add_argument("--timeframe", type=str, default=None)
     parser.add_argument("--timeframes", type=str, default=None, help="Comma-separated sweep, e.g. 5Min,10Min,1Hour,2Day")
@@ -2211,10 +2469,13 @@ def main() -> None:
     base_params.macd_sma_length = int(pine_defaults.get("macd_sma_length", 200))
     base_params.max_intraday_loss_pct = float(pine_defaults.get("max_intraday_loss_pct", 50.0))
 
-    if args.bars_csv:
+    if args.bars_csv and args.bars_csv.suffix.lower() == ".npz":
+        bars = load_bars_npz(args.bars_csv)
+    elif args.bars_csv:
         bars = load_bars_csv(args.bars_csv)
     else:
-        bars = fetch_bars_alpaca(
+        fetch_bars = fetch_bars_warehouse if args.bars_source == "warehouse" else fetch_bars_alpaca
+        bars = fetch_bars(
             symbol=symbol,
             timeframe=fetch_timeframe,
             start_utc=start_utc,
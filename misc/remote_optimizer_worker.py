@@ -14,6 +14,7 @@ import os
 import socket
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
@@ -24,6 +25,9 @@ import requests
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+BAR_CACHE_MAX_FILES = 64
 
 
 def build_url(base: str, path: str) -> str:
@@ -54,18 +58,64 @@ def set_optimizer_option(args: list[str], option: str, value: str | None) -> lis
     return out
 
 
-def poll_job(server: str, token: str, worker: str, timeout: int) -> dict | None:
+def poll_job(server: str, token: str, worker: str, timeout: int, wait: int = 0) -> dict | None:
+    """Claim the next job; with ``wait`` the server holds the request until a job is queued."""
+    # bars=npz: the job references a checksummed bar file instead of inlining CSV.
+    params = {"worker": worker, "bars": "npz"}
+    if wait > 0:
+        params["wait"] = wait
     response = requests.get(
         build_url(server, "/api/admin/strategy/remote_jobs/next"),
         headers={"X-Strategy-Worker-Token": token, "X-Strategy-Worker": worker},
-        params={"worker": worker},
-        timeout=timeout,
+        params=params,
+        timeout=timeout + max(0, wait),
     )
     response.raise_for_status()
     payload = response.json()
     return payload.get("job")
 
 
+def fetch_bars(server: str, token: str, bars: dict, cache_dir: Path, timeout: int) -> Path:
+    """Path of the job's .npz bars, downloading them only if not already cached by hash."""
+    from bar_payload import is_bars_digest, load_bars_npz
+
+    digest = str(bars.get("sha256") or "")
+    if not is_bars_digest(digest):
+        raise ValueError(f"Invalid bar payload digest: {digest!r}")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{digest}.npz"
+    if path.exists():
+        path.touch()
+        return path
+    response = requests.get(
+        build_url(server, bars.get("url") or f"/api/admin/strategy/bars/{digest}.npz"),
+        headers={"X-Strategy-Worker-Token": token},
+        timeout=timeout,
+        stream=True,
+    )
+    response.raise_for_status()
+    # A unique temp file: other slots may be fetching the same digest.
+    fd, tmp_name = tempfile.mkstemp(prefix=f"{digest}.", suffix=".part", dir=cache_dir)
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        load_bars_npz(tmp_path, expected_digest=digest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(path)
+    prune_bar_cache(cache_dir)
+    return path
+
+
+def prune_bar_cache(cache_dir: Path, max_files: int = BAR_CACHE_MAX_FILES) -> None:
+    files = sorted(cache_dir.glob("*.npz"), key=lambda item: item.stat().st_mtime, reverse=True)
+    for stale in files[max_files:]:
+        stale.unlink(missing_ok=True)
+
+
 def complete_job(server: str, token: str, job_id: str, payload: dict, timeout: int) -> None:
     response = requests.post(
         build_url(server, f"/api/admin/strategy/remote_jobs/{job_id}/complete"),
@@ -76,6 +126,54 @@ def complete_job(server: str, token: str, job_id: str, payload: dict, timeout: i
     response.raise_for_status()
 
 
+def send_heartbeat(server: str, token: str, worker: str, status: str, job_id: str | None = None,
+                   info: dict | None = None, timeout: int = 10) -> None:
+    response = requests.post(
+        build_url(server, "/api/admin/strategy/remote_workers/heartbeat"),
+        headers={"X-Strategy-Worker-Token": token, "X-Strategy-Worker": worker},
+        json={"worker": worker, "status": status, "job_id": job_id, "info": info},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+
+
+class Heartbeat:
+    """Reports a worker slot as busy every ``interval`` seconds while a job runs."""
+
+    def __init__(self, server: str, token: str, worker: str, job_id: str, interval: int, info: dict | None = None):
+        self.args = (server, token, worker)
+        self.job_id = job_id
+        self.interval = max(5, int(interval))
+        self.info = info
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{worker}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join(5)
+        return False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                send_heartbeat(*self.args, "busy", job_id=self.job_id, info=self.info)
+            except Exception as exc:
+                print(f"[{self.args[2]}] Heartbeat failed: {exc}", file=sys.stderr, flush=True)
+
+
+def worker_info(args) -> dict:
+    return {
+        "host": socket.gethostname(),
+        "slots": max(1, int(args.workers)),
+        "optimizer_jobs": resolve_optimizer_jobs_value(args.optimizer_jobs),
+        "accelerator": args.accelerator,
+    }
+
+
 def resolve_optimizer_jobs_value(spec: str | None) -> str | None:
     """Translate an --optimizer-jobs spec into a concrete --jobs value.
 
@@ -97,14 +195,16 @@ def resolve_optimizer_jobs_value(spec: str | None) -> str | None:
         return str(os.cpu_count() or 1)
 
 
-def run_job(job: dict, python_bin: str, work_dir: Path, accelerator: str | None = None, optimizer_jobs: str | None = "max") -> dict:
+def run_job(job: dict, python_bin: str, work_dir: Path, accelerator: str | None = None, optimizer_jobs: str | None = "max",
+            bars_path: Path | None = None) -> dict:
     job_id = job["id"]
     job_dir = work_dir / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
-    bars_path = job_dir / "bars.csv"
     report_path = job_dir / "report.json"
     top_path = job_dir / "top.csv"
-    bars_path.write_text(job.get("bars_csv", ""), encoding="utf-8")
+    if bars_path is None:
+        bars_path = job_dir / "bars.csv"
+        bars_path.write_text(job.get("bars_csv", ""), encoding="utf-8")
 
     optimizer_args = substitute_args(
         list(job.get("optimizer_args") or []),
@@ -138,19 +238,38 @@ def run_job(job: dict, python_bin: str, work_dir: Path, accelerator: str | None
     }
 
 
+def execute_job(job: dict, server: str, token: str, work_dir: Path, args) -> dict:
+    """Fetch the job's bars and run it; a failed fetch is reported as a failed run.
+
+    The job is already claimed, so every failure has to reach ``complete_job``
+    or it stays ``running`` on the server.
+    """
+    try:
+        bars_path = fetch_bars(server, token, job["bars"], work_dir / "bars_cache", args.request_timeout) if job.get("bars") else None
+    except Exception as exc:
+        return {"returncode": 1, "stdout": "", "stderr": f"Failed to fetch bars: {exc}", "report": None, "top_csv": ""}
+    return run_job(job, args.python, work_dir, args.accelerator, args.optimizer_jobs, bars_path)
+
+
 def worker_loop(args, work_dir: Path, stop_event: threading.Event, worker_name: str) -> int:
     processed = 0
+    info = worker_info(args)
     while not stop_event.is_set():
         try:
-            job = poll_job(args.server, args.token, worker_name, args.request_timeout)
+            wait = 0 if args.once else max(0, args.long_poll_seconds)
+            started = time.monotonic()
+            job = poll_job(args.server, args.token, worker_name, args.request_timeout, wait=wait)
             if not job:
                 if args.once:
                     return processed
-                stop_event.wait(max(1, args.poll_seconds))
+                # Servers without long-poll support answer at once; fall back to the poll interval.
+                if time.monotonic() - started < min(wait, 1):
+                    stop_event.wait(max(1, args.poll_seconds))
                 continue
 
             print(f"[{worker_name}] Running job {job['id']} for {job.get('symbol')} {job.get('timeframe')}", flush=True)
-            payload = run_job(job, args.python, work_dir, args.accelerator, args.optimizer_jobs)
+            with Heartbeat(args.server, args.token, worker_name, job["id"], args.heartbeat_seconds, info):
+                payload = execute_job(job, args.server, args.token, work_dir, args)
             complete_job(args.server, args.token, job["id"], payload, args.request_timeout)
             processed += 1
             print(f"[{worker_name}] Completed job {job['id']} with returncode={payload['returncode']}", flush=True)
@@ -164,17 +283,23 @@ def worker_loop(args, work_dir: Path, stop_event: threading.Event, worker_name:
             if args.once:
                 return processed
             stop_event.wait(max(1, args.poll_seconds))
+    try:
+        send_heartbeat(args.server, args.token, worker_name, "stopped", info=info)
+    except Exception:
+        pass
     return processed
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(description="Poll PI5 Strategy Lab jobs and run optimizer remotely.")
+    parser = argparse.ArgumentParser(description="Claim PI5 Strategy Lab jobs and run optimizer remotely.")
     parser.add_argument("--server", required=True, help="Dashboard base URL, e.g. https://salavat.home.ro/trading")
     parser.add_argument("--token", default=os.getenv("STRATEGY_WORKER_TOKEN", ""))
     parser.add_argument("--worker", default=socket.gethostname())
     parser.add_argument("--python", default=sys.executable)
     parser.add_argument("--work-dir", default=str(PROJECT_ROOT / ".remote_optimizer_work"))
-    parser.add_argument("--poll-seconds", type=int, default=10)
+    parser.add_argument("--poll-seconds", type=int, default=10, help="Retry delay after errors or when the server cannot long-poll.")
+    parser.add_argument("--long-poll-seconds", type=int, default=25, help="How long the server may hold a claim open waiting for a job (0 disables).")
+    parser.add_argument("--heartbeat-seconds", type=int, default=30, help="Busy heartbeat interval while a job runs.")
     parser.add_argument("--request-timeout", type=int, default=180)
     parser.add_argument("--workers", type=int, default=1, help="Parallel queue workers. Use with optimizer --jobs carefully.")
     parser.add_argument("--once", action="store_true", help="Process at most one job and exit.")
@@ -2,7 +2,7 @@
 """Windows-friendly Strategy Lab remote optimizer agent.
 
 This is a small standalone runner for Windows 11. It can either connect to the
-dashboard over HTTPS or create an outbound SSH tunnel first, then poll PI5 jobs.
+dashboard over HTTPS or create an outbound SSH tunnel first, then long-poll PI5 jobs.
 Run it with Task Scheduler to keep it in the background.
 """
 
@@ -17,7 +17,7 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from remote_optimizer_worker import complete_job, poll_job, run_job
+from remote_optimizer_worker import Heartbeat, complete_job, execute_job, poll_job, send_heartbeat, worker_info
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -55,14 +55,19 @@ def start_ssh_tunnel(args, log_file: Path) -> subprocess.Popen | None:
 
 def agent_worker_loop(args, server: str, work_dir: Path, log_file: Path, stop_event: threading.Event, worker_name: str) -> int:
     processed = 0
+    info = worker_info(args)
     while not stop_event.is_set():
         try:
-            job = poll_job(server, args.token, worker_name, args.request_timeout)
+            wait = max(0, args.long_poll_seconds)
+            started = time.monotonic()
+            job = poll_job(server, args.token, worker_name, args.request_timeout, wait=wait)
             if not job:
-                stop_event.wait(max(1, args.poll_seconds))
+                if time.monotonic() - started < min(wait, 1):
+                    stop_event.wait(max(1, args.poll_seconds))
                 continue
             log(f"[{worker_name}] Running job {job['id']} for {job.get('symbol')} {job.get('timeframe')}", log_file)
-            payload = run_job(job, args.python, work_dir, args.accelerator, args.optimizer_jobs)
+            with Heartbeat(server, args.token, worker_name, job["id"], args.heartbeat_seconds, info):
+                payload = execute_job(job, server, args.token, work_dir, args)
             complete_job(server, args.token, job["id"], payload, args.request_timeout)
             processed += 1
             log(f"[{worker_name}] Completed job {job['id']} returncode={payload['returncode']}", log_file)
@@ -72,6 +77,10 @@ def agent_worker_loop(args, server: str, work_dir: Path, log_file: Path, stop_ev
         except Exception as exc:
             log(f"[{worker_name}] Worker error: {exc}", log_file)
             stop_event.wait(max(1, args.poll_seconds))
+    try:
+        send_heartbeat(server, args.token, worker_name, "stopped", info=info)
+    except Exception:
+        pass
     return processed
 
 
@@ -82,7 +91,9 @@ def main() -> int:
     parser.add_argument("--worker", default=os.getenv("COMPUTERNAME", "windows-agent"))
     parser.add_argument("--python", default=sys.executable)
     parser.add_argument("--work-dir", default=str(PROJECT_ROOT / ".remote_optimizer_work"))
-    parser.add_argument("--poll-seconds", type=int, default=10)
+    parser.add_argument("--poll-seconds", type=int, default=10, help="Retry delay after errors or when the server cannot long-poll.")
+    parser.add_argument("--long-poll-seconds", type=int, default=25, help="How long the server may hold a claim open waiting for a job (0 disables).")
+    parser.add_argument("--heartbeat-seconds", type=int, default=30, help="Busy heartbeat interval while a job runs.")
     parser.add_argument("--request-timeout", type=int, default=180)
     parser.add_argument("--workers", type=int, default=1, help="Parallel queue workers for multiple queued symbols.")
     parser.add_argument("--accelerator", choices=["auto", "cpu", "gpu"], default=os.getenv("STRATEGY_ACCELERATOR", "auto"))
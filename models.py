@@ -41,3 +41,9 @@ class Trade(db.Model):
     action = db.Column(db.String, nullable=True)
     strategy = db.Column(db.String, nullable=True)
     strategy_job_id = db.Column(db.String, nullable=True)
+
+    # Back the per-symbol entry guards (daily counts and recent closed P/L).
+    __table_args__ = (
+        db.Index('ix_trade_user_symbol_status_close', 'user_id', 'symbol', 'status', 'close_time'),
+        db.Index('ix_trade_user_symbol_open_time', 'user_id', 'symbol', 'open_time'),
+    )
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Single-flight, stale-while-revalidate cache for dashboard Alpaca reads.
+
+The dashboard polls positions and account data for every page and every
+user. With a plain TTL cache, an expired entry sent every concurrent request
+(and every user on the same keys) to Alpaca at once. ``ResponseCache``:
+
+* runs one loader per key at a time - concurrent misses wait for the call
+  already in flight instead of starting their own,
+* serves an entry that is past its TTL but younger than ``ttl + stale_sec``
+  immediately and refreshes it in the background,
+* is bounded to ``max_entries`` with LRU eviction,
+* counts hits, stale hits, misses, coalesced waits, errors and loader latency
+  (``stats()``).
+
+Loader errors are raised to every waiter and never cached.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, stale_sec: float = 30.0, refresh_workers: int = 4, logger=None):
+        self.max_entries = max(1, int(max_entries))
+        self.stale_sec = max(0.0, float(stale_sec))
+        self.logger = logger
+        self._lock = threading.Lock()
+        # key -> (loaded_at, value)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._refresher = ThreadPoolExecutor(max_workers=max(1, int(refresh_workers)), thread_name_prefix="cache-refresh")
+        self._counters = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+            "refreshes": 0, "errors": 0, "evictions": 0, "loads": 0,
+        }
+        self._load_ms_total = 0.0
+        self._load_ms_max = 0.0
+
+    def get(self, key: str, ttl: float, loader: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < ttl:
+                    self._counters["hits"] += 1
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                if age < ttl + self.stale_sec:
+                    self._counters["stale_hits"] += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._inflight:
+                        self._counters["refreshes"] += 1
+                        self._inflight[key] = future = Future()
+                        self._refresher.submit(self._load, key, loader, future)
+                    return entry[1]
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                leader = False
+            else:
+                self._counters["misses"] += 1
+                self._inflight[key] = future = Future()
+                leader = True
+        if leader:
+            self._load(key, loader, future)
+        return future.result()
+
+    def _load(self, key: str, loader: Callable[[], Any], future: Future) -> None:
+        started = time.monotonic()
+        try:
+            value = loader()
+        except BaseException as exc:
+            with self._lock:
+                self._counters["errors"] += 1
+                self._inflight.pop(key, None)
+            if self.logger:
+                self.logger.warning(f"[ALPACA_CACHE] Load failed for {key}: {exc}")
+            future.set_exception(exc)
+            return
+        finished = time.monotonic()
+        elapsed_ms = (finished - started) * 1000.0
+        with self._lock:
+            self._counters["loads"] += 1
+            self._load_ms_total += elapsed_ms
+            self._load_ms_max = max(self._load_ms_max, elapsed_ms)
+            self._entries[key] = (finished, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def invalidate(self, prefix: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if prefix is None or k.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+            stats["load_ms_avg"] = round(self._load_ms_total / stats["loads"], 1) if stats["loads"] else None
+            stats["load_ms_max"] = round(self._load_ms_max, 1)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else None
+        return stats
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Cached per-account state for the pre-trade risk checks.
+
+``bot._validate_trade_risk`` used to call ``list_positions()`` and
+``get_account()`` before every order. ``RiskSnapshotCache`` keeps one snapshot
+per Alpaca account (open position symbols, equity, buying power) and only
+refetches it when:
+
+* it is older than ``ttl_sec``,
+* a check would reject the order - the rejection is re-evaluated against a
+  fresh snapshot, so stale data can cost a round trip but never a trade.
+
+Fills from the trade-updates stream (``TradeUpdatesHub.add_listener``) keep
+the position set current between refreshes. Orders this process is about to
+submit are *reserved* inside the same lock as the check: a reservation counts
+as an open position and its notional is taken off the buying power until the
+order is submitted (then applied to the snapshot) or abandoned. Concurrent
+entries for one account therefore see each other without waiting on Alpaca.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+FILL_EVENTS = ("fill", "partial_fill")
+
+
+class RiskView:
+    """What a risk check sees: the snapshot with pending reservations applied."""
+
+    __slots__ = ("open_positions", "equity", "buying_power", "age_sec")
+
+    def __init__(self, open_positions: int, equity: Optional[float], buying_power: Optional[float], age_sec: float):
+        self.open_positions = open_positions
+        self.equity = equity
+        self.buying_power = buying_power
+        self.age_sec = age_sec
+
+
+class _AccountState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.positions: Set[str] = set()
+        self.equity: Optional[float] = None
+        self.buying_power: Optional[float] = None
+        self.fetched_at = 0.0
+        # token -> (symbol, notional, reserved_at)
+        self.reservations: Dict[int, Tuple[str, float, float]] = {}
+
+
+def _as_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RiskSnapshotCache:
+    def __init__(self, ttl_sec: float = 30.0, reservation_ttl_sec: float = 120.0):
+        self.ttl_sec = max(0.0, float(ttl_sec))
+        self.reservation_ttl_sec = max(1.0, float(reservation_ttl_sec))
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, _AccountState] = {}
+        self._tokens = itertools.count(1)
+        self._counters = {"checks": 0, "refreshes": 0, "forced_refreshes": 0}
+
+    def _state(self, account_key: str) -> _AccountState:
+        with self._lock:
+            state = self._accounts.get(account_key)
+            if state is None:
+                state = self._accounts[account_key] = _AccountState()
+            return state
+
+    def check_and_reserve(
+        self,
+        account_key: str,
+        api_client,
+        symbol: str,
+        notional: float,
+        check: Callable[[RiskView], Tuple[bool, int, Optional[str]]],
+    ) -> Tuple[bool, int, Optional[str], Optional[int]]:
+        """Run ``check`` on the account view and reserve ``notional`` when it passes.
+
+        Returns ``(ok, status, error, reservation token)``; fetch errors propagate.
+        """
+        state = self._state(account_key)
+        with state.lock:
+            self._counters["checks"] += 1
+            now = time.time()
+            if now - state.fetched_at > self.ttl_sec:
+                self._refresh_locked(state, api_client)
+            ok, status, error = check(self._view_locked(state))
+            if not ok and state.fetched_at < now:
+                self._counters["forced_refreshes"] += 1
+                self._refresh_locked(state, api_client)
+                ok, status, error = check(self._view_locked(state))
+            if not ok:
+                return ok, status, error, None
+            token = next(self._tokens)
+            state.reservations[token] = (symbol, float(notional or 0.0), time.time())
+            return ok, status, error, token
+
+    def release(self, account_key: str, token: Optional[int], submitted: bool) -> None:
+        """Drop a reservation; a submitted order is applied to the snapshot."""
+        if token is None:
+            return
+        state = self._state(account_key)
+        with state.lock:
+            reservation = state.reservations.pop(token, None)
+            if reservation and submitted:
+                symbol, notional, _ts = reservation
+                state.positions.add(symbol)
+                if state.buying_power is not None:
+                    state.buying_power -= notional
+
+    def note_closed(self, account_key: str, symbol: str) -> None:
+        state = self._state(account_key)
+        with state.lock:
+            state.positions.discard(symbol)
+
+    def on_trade_update(self, account_key: str, event) -> None:
+        """``TradeUpdatesHub`` listener: track position open/close from fills."""
+        if event.event not in FILL_EVENTS or not event.symbol or event.position_qty is None:
+            return
+        with self._lock:
+            state = self._accounts.get(account_key)
+        if state is None:
+            return
+        # Crypto orders report "BTC/USD"; positions are keyed "BTCUSD".
+        symbol = str(event.symbol).replace("/", "")
+        with state.lock:
+            if event.position_qty == 0:
+                state.positions.discard(symbol)
+            else:
+                state.positions.add(symbol)
+
+    def invalidate(self, account_key: Optional[str] = None) -> None:
+        with self._lock:
+            states = list(self._accounts.values()) if account_key is None else [self._accounts.get(account_key)]
+        for state in states:
+            if state is not None:
+                with state.lock:
+                    state.fetched_at = 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["accounts"] = len(self._accounts)
+            stats["reservations"] = sum(len(state.reservations) for state in self._accounts.values())
+        return stats
+
+    # -- internals (caller holds state.lock) --------------------------------------
+    def _refresh_locked(self, state: _AccountState, api_client) -> None:
+        positions = api_client.list_positions()
+        account = api_client.get_account()
+        state.positions = {str(getattr(position, "symbol", "") or "") for position in positions} - {""}
+        state.equity = _as_float(getattr(account, "equity", None))
+        state.buying_power = _as_float(getattr(account, "buying_power", None))
+        state.fetched_at = time.time()
+        self._counters["refreshes"] += 1
+
+    def _view_locked(self, state: _AccountState) -> RiskView:
+        now = time.time()
+        for token, (_sym, _notional, reserved_at) in list(state.reservations.items()):
+            if now - reserved_at > self.reservation_ttl_sec:
+                state.reservations.pop(token, None)
+        reserved_symbols = {sym for sym, _notional, _ts in state.reservations.values()}
+        reserved_notional = sum(notional for _sym, notional, _ts in state.reservations.values())
+        buying_power = state.buying_power - reserved_notional if state.buying_power is not None else None
+        return RiskView(
+            open_positions=len(state.positions | reserved_symbols),
+            equity=state.equity,
+            buying_power=buying_power,
+            age_sec=now - state.fetched_at,
+        )
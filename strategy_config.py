@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
-"""Shared local strategy configuration helpers."""
+"""Shared local strategy configuration helpers.
+
+``load_strategy_config`` parses the file on every call and returns a dict the
+caller may edit (the dashboard's save paths). Hot paths - the engine tick and
+every TradingView signal in the bot - use ``current_strategy_config`` instead:
+it returns a shared, read-only ``StrategyConfigSnapshot`` that is rebuilt only
+when the file's mtime/size/inode changes or ``save_strategy_config`` ran in
+this process. The snapshot indexes the universe by symbol, so the per-symbol
+helpers below are dict lookups when given its ``config``.
+"""
 
 from __future__ import annotations
 
 import json
 import os
-from typing import Dict, List
+import threading
+from typing import Dict, List, Optional, Tuple
 
 
 PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
@@ -214,6 +224,12 @@ def normalize_universe(raw_entries) -> List[Dict]:
 
 
 def load_strategy_config() -> Dict:
+    data = _read_strategy_config()
+    return data if data is not None else get_default_strategy_config()
+
+
+def _read_strategy_config() -> Optional[Dict]:
+    """Parsed and normalized config; None when the file exists but cannot be read."""
     data = get_default_strategy_config()
     if not os.path.exists(STRATEGY_CONFIG_FILE):
         return data
@@ -223,7 +239,7 @@ def load_strategy_config() -> Dict:
         if isinstance(file_data, dict):
             data.update(file_data)
     except Exception:
-        return data
+        return None
     data["universe"] = normalize_universe(data.get("universe"))
     data["tester_symbols"] = normalize_tester_symbols(data.get("tester_symbols"), data.get("symbol"))
     data["symbol"] = ", ".join(item["symbol"] for item in data["tester_symbols"] if item.get("selected", True))
@@ -253,20 +269,18 @@ def save_strategy_config(cfg: Dict) -> None:
     if data["accelerator"] not in ACCELERATOR_CHOICES:
         data["accelerator"] = "auto"
     os.makedirs(os.path.dirname(STRATEGY_CONFIG_FILE), exist_ok=True)
-    with open(STRATEGY_CONFIG_FILE, "w", encoding="utf-8") as f:
+    # Write-then-rename so readers never parse a half-written file.
+    tmp_path = f"{STRATEGY_CONFIG_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, STRATEGY_CONFIG_FILE)
+    bump_strategy_config_version()
 
 
-def strategy_mode_for_symbol(symbol: str, cfg: Dict | None = None) -> str:
-    cfg = cfg or load_strategy_config()
-    target = normalize_symbol(symbol)
+def _symbol_mode(entries) -> str:
     modes = set()
-    seen_symbol = False
     enabled_rows = 0
-    for entry in normalize_universe(cfg.get("universe")):
-        if entry["symbol"] != target:
-            continue
-        seen_symbol = True
+    for entry in entries:
         if not entry.get("enabled", True):
             continue
         enabled_rows += 1
@@ -281,22 +295,95 @@ def strategy_mode_for_symbol(symbol: str, cfg: Dict | None = None) -> str:
         return "local"
     if "tw" in modes:
         return "tw"
-    if seen_symbol and enabled_rows == 0:
+    if entries and enabled_rows == 0:
         return "disabled"
     return "tw"
 
 
+class StrategyConfigSnapshot:
+    """A loaded config plus its universe indexed by symbol. Treat as read-only."""
+
+    def __init__(self, config: Dict, version: Optional[Tuple] = None):
+        self.config = config
+        self.version = version
+        self.universe: Tuple[Dict, ...] = tuple(normalize_universe(config.get("universe")))
+        by_symbol: Dict[str, List[Dict]] = {}
+        for entry in self.universe:
+            by_symbol.setdefault(entry["symbol"], []).append(entry)
+        self.entries_by_symbol: Dict[str, Tuple[Dict, ...]] = {symbol: tuple(rows) for symbol, rows in by_symbol.items()}
+        self.enabled_by_symbol: Dict[str, Tuple[Dict, ...]] = {
+            symbol: tuple(entry for entry in rows if entry.get("enabled", True))
+            for symbol, rows in by_symbol.items()
+        }
+        self.mode_by_symbol: Dict[str, str] = {symbol: _symbol_mode(rows) for symbol, rows in by_symbol.items()}
+
+    def mode_for(self, symbol: str) -> str:
+        return self.mode_by_symbol.get(normalize_symbol(symbol), "tw")
+
+    def entries_for(self, symbol: str, enabled_only: bool = False) -> List[Dict]:
+        index = self.enabled_by_symbol if enabled_only else self.entries_by_symbol
+        return list(index.get(normalize_symbol(symbol), ()))
+
+
+_snapshot: Optional[StrategyConfigSnapshot] = None
+_snapshot_lock = threading.Lock()
+_config_version = 0
+
+
+def bump_strategy_config_version() -> None:
+    """Force the next ``current_strategy_config`` call to reload the file."""
+    global _config_version
+    _config_version += 1
+
+
+def _config_file_version() -> Tuple:
+    try:
+        st = os.stat(STRATEGY_CONFIG_FILE)
+        file_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        file_key = None
+    return (STRATEGY_CONFIG_FILE, file_key, _config_version)
+
+
+def current_strategy_config() -> StrategyConfigSnapshot:
+    """Shared snapshot of the config file, reparsed only after it changed.
+
+    A file that cannot be parsed (e.g. mid-write by another process) keeps
+    the previous snapshot and is retried on the next call.
+    """
+    global _snapshot
+    version = _config_file_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot.version == version:
+            return _snapshot
+        data = _read_strategy_config()
+        if data is None:
+            if _snapshot is not None:
+                return _snapshot
+            return StrategyConfigSnapshot(get_default_strategy_config())
+        _snapshot = StrategyConfigSnapshot(data, version)
+        return _snapshot
+
+
+def snapshot_for(cfg: Dict | None = None) -> StrategyConfigSnapshot:
+    """The indexed snapshot for ``cfg``; cached when it is the current snapshot's config."""
+    if not cfg:
+        return current_strategy_config()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.config is cfg:
+        return snapshot
+    return StrategyConfigSnapshot(cfg)
+
+
+def strategy_mode_for_symbol(symbol: str, cfg: Dict | None = None) -> str:
+    return snapshot_for(cfg).mode_for(symbol)
+
+
 def strategy_entries_for_symbol(symbol: str, cfg: Dict | None = None, *, enabled_only: bool = False) -> List[Dict]:
-    cfg = cfg or load_strategy_config()
-    target = normalize_symbol(symbol)
-    out = []
-    for entry in normalize_universe(cfg.get("universe")):
-        if entry["symbol"] != target:
-            continue
-        if enabled_only and not entry.get("enabled", True):
-            continue
-        out.append(entry)
-    return out
+    return snapshot_for(cfg).entries_for(symbol, enabled_only)
 
 
 def tradingview_allowed_for_symbol(symbol: str, cfg: Dict | None = None) -> bool:
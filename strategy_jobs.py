@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""SQLite index for optimizer (strategy) jobs.
+
+Jobs used to be one JSON file each in ``instance/strategy_jobs/``, and every
+listing - the admin page, ``find_active_strategy_job`` and each remote worker
+poll - listed the directory and parsed every file. ``StrategyJobStore`` keeps
+them in a WAL-mode SQLite table instead:
+
+* The job dict is stored as JSON next to indexed ``status``, ``created_at``,
+  ``symbol`` and ``worker`` columns, so listings read only the rows they
+  return.
+* ``claim_next`` hands the oldest queued job to a worker with a single
+  ``UPDATE ... RETURNING``, so two workers (or dashboard processes) can never
+  claim the same job and no process-wide lock is needed.
+* Bulky artifacts (bars CSV, report JSON, top CSV) stay as files in the jobs
+  directory; the job only references them.
+* ``record_worker`` / ``workers`` keep a registry of remote worker slots
+  (status, current job, last heartbeat) shared by every dashboard process,
+  so the admin page can show live worker capacity.
+* ``JobSignal`` lets long-poll claims sleep until a job is queued in this
+  process instead of polling the table.
+
+Legacy ``<id>.json`` job files are imported on first use and renamed to
+``*.json.migrated``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+
+JOBS_DB_FILENAME = "strategy_jobs.sqlite3"
+_ARTIFACT_SUFFIXES = ("_report.json",)
+
+
+class StrategyJobStore:
+    def __init__(self, path: str, legacy_dir: Optional[str] = None, logger=None):
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened (and legacy files imported) on first use, not at import time.
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS strategy_jobs ("
+                    "id TEXT PRIMARY KEY, status TEXT, compute_target TEXT, symbol TEXT, worker TEXT, "
+                    "created_at TEXT NOT NULL, updated_at TEXT, job TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_strategy_jobs_status ON strategy_jobs (status, created_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_strategy_jobs_created ON strategy_jobs (created_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_strategy_jobs_symbol ON strategy_jobs (symbol, created_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_strategy_jobs_worker ON strategy_jobs (worker, status)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS strategy_workers ("
+                    "worker TEXT PRIMARY KEY, status TEXT NOT NULL, job_id TEXT, last_seen REAL NOT NULL, info TEXT)"
+                )
+            self._conn = conn
+            self._import_legacy(conn)
+        return self._conn
+
+    def save(self, job: Dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO strategy_jobs (id, status, compute_target, symbol, worker, created_at, updated_at, job) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "status = excluded.status, compute_target = excluded.compute_target, symbol = excluded.symbol, "
+                    "worker = excluded.worker, created_at = excluded.created_at, updated_at = excluded.updated_at, "
+                    "job = excluded.job",
+                    _row(job),
+                )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT job FROM strategy_jobs WHERE id = ?", (str(job_id),)).fetchone()
+        return json.loads(row["job"]) if row else None
+
+    def list(self, limit: int = 8, statuses: Optional[Iterable[str]] = None, compute_target: Optional[str] = None,
+             oldest_first: bool = False) -> List[Dict]:
+        clauses, params = [], []
+        if statuses is not None:
+            statuses = list(statuses)
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if compute_target is not None:
+            clauses.append("compute_target = ?")
+            params.append(compute_target)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if oldest_first else "DESC"
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT job FROM strategy_jobs{where} ORDER BY created_at {order} LIMIT ?",
+                (*params, int(limit)),
+            ).fetchall()
+        return [json.loads(row["job"]) for row in rows]
+
+    def count(self, statuses: Iterable[str]) -> int:
+        statuses = list(statuses)
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT COUNT(*) AS n FROM strategy_jobs WHERE status IN ({','.join('?' * len(statuses))})", statuses
+            ).fetchone()
+        return int(row["n"])
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cur = conn.execute("DELETE FROM strategy_jobs WHERE id = ?", (str(job_id),))
+        return cur.rowcount > 0
+
+    def claim_next(self, worker: str) -> Optional[Dict]:
+        """Mark the oldest queued job ``running`` for ``worker`` and return it."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                rows = conn.execute(
+                    "UPDATE strategy_jobs SET status = 'running', worker = ?, updated_at = ?, "
+                    "job = json_set(job, '$.status', 'running', '$.worker', ?, '$.started_at_utc', ?, '$.updated_at_utc', ?) "
+                    "WHERE id = (SELECT id FROM strategy_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1) "
+                    "RETURNING job",
+                    (worker, now, worker, now, now),
+                ).fetchall()
+        return json.loads(rows[0]["job"]) if rows else None
+
+    def record_worker(self, worker: str, status: str, job_id: Optional[str] = None, info: Optional[Dict] = None) -> None:
+        """Heartbeat for one worker slot; ``status`` is ``waiting``, ``busy``, ``idle`` or ``stopped``."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO strategy_workers (worker, status, job_id, last_seen, info) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(worker) DO UPDATE SET status = excluded.status, job_id = excluded.job_id, "
+                    "last_seen = excluded.last_seen, info = COALESCE(excluded.info, strategy_workers.info)",
+                    (worker, status, job_id, time.time(), json.dumps(info) if info else None),
+                )
+
+    def workers(self, live_sec: float = 90.0, keep_sec: float = 86400.0) -> List[Dict]:
+        """Worker slots seen in the last ``keep_sec``, newest first; ``live`` if seen within ``live_sec``."""
+        now = time.time()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM strategy_workers WHERE last_seen >= ? ORDER BY last_seen DESC", (now - keep_sec,)
+            ).fetchall()
+        out = []
+        for row in rows:
+            age = now - row["last_seen"]
+            out.append({
+                "worker": row["worker"],
+                "status": row["status"],
+                "job_id": row["job_id"],
+                "last_seen_utc": datetime.fromtimestamp(row["last_seen"], timezone.utc).isoformat(),
+                "age_sec": round(age, 1),
+                "live": age <= live_sec and row["status"] != "stopped",
+                "info": json.loads(row["info"]) if row["info"] else {},
+            })
+        return out
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        if not self.legacy_dir or not os.path.isdir(self.legacy_dir):
+            return
+        imported = []
+        for name in sorted(os.listdir(self.legacy_dir)):
+            if not name.endswith(".json") or name.endswith(_ARTIFACT_SUFFIXES):
+                continue
+            path = os.path.join(self.legacy_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[STRATEGY_JOBS] Could not import legacy job file {name}: {e}")
+                continue
+            if isinstance(job, dict) and job.get("id") == name[:-5]:
+                imported.append((path, job))
+        if not imported:
+            return
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO strategy_jobs (id, status, compute_target, symbol, worker, created_at, updated_at, job) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [_row(job) for _path, job in imported],
+            )
+        for path, _job in imported:
+            try:
+                os.replace(path, f"{path}.migrated")
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"[STRATEGY_JOBS] Could not rename imported job file {path}: {e}")
+        if self.logger:
+            self.logger.info(f"[STRATEGY_JOBS] Imported {len(imported)} legacy job file(s) into {self.path}.")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobSignal:
+    """Condition variable that job creation bumps; long-poll claims wait on it."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        with self._cond:
+            return self._generation
+
+    def notify(self) -> None:
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def wait(self, seen_generation: int, timeout: float) -> bool:
+        """Block until ``notify`` runs after ``seen_generation`` was read; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._generation != seen_generation, timeout=max(0.0, timeout))
+
+
+def _row(job: Dict):
+    return (
+        str(job.get("id", "unknown")),
+        job.get("status"),
+        job.get("compute_target"),
+        job.get("symbol"),
+        job.get("worker"),
+        str(job.get("created_at_utc") or job.get("updated_at_utc") or ""),
+        job.get("updated_at_utc"),
+        json.dumps(job, default=str),
+    )
@@ -0,0 +1,44 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import alpaca_clients as registry_mod
+from alpaca_clients import AlpacaClientRegistry
+from utils import encrypt_data
+
+BASE_URL = "https://paper-api.alpaca.markets"
+
+
+def _user(user_id, key, secret):
+    return SimpleNamespace(id=user_id, username=f"u{user_id}", encrypted_alpaca_key=encrypt_data(key), encrypted_alpaca_secret=encrypt_data(secret))
+
+
+def test_registry_reuses_clients_without_decrypting_and_rebuilds_on_key_change(monkeypatch):
+    registry = AlpacaClientRegistry()
+    decrypts = []
+    real_decrypt = registry_mod.decrypt_data
+    monkeypatch.setattr(registry_mod, "decrypt_data", lambda value: decrypts.append(value) or real_decrypt(value))
+
+    alice = _user(1, "key-a", "secret-a")
+    client = registry.client_for_user(alice, BASE_URL)
+    assert registry.client_for_user(alice, BASE_URL) is client
+    assert len(decrypts) == 2
+
+    # A second user on the same Alpaca account shares the client.
+    shared = _user(2, "key-a", "secret-a")
+    assert registry.client_for_user(shared, BASE_URL) is client
+
+    alice.encrypted_alpaca_key = encrypt_data("key-b")
+    rotated = registry.client_for_user(alice, BASE_URL)
+    assert rotated is not client and rotated.api_key == "key-b"
+    assert registry.client_for_user(shared, BASE_URL) is client
+
+    registry.invalidate(2)
+    stats = registry.stats()
+    assert stats["clients"] == 1 and stats["users"] == 1
+    assert stats["builds"] == 2 and stats["hits"] == 3
+    assert stats["http_requests"] == 0 and stats["http_connection_reuse"] is None
+
+    assert registry.client_for_user(_user(3, "", ""), BASE_URL) is None
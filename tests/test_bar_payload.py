@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bar_payload import bars_to_csv, load_bars_npz, read_bars_csv, write_bars_npz
+
+
+def _bars(rows=500):
+    index = pd.date_range("2024-01-02 14:30", periods=rows, freq="1min", tz="UTC")
+    close = 100 + np.cumsum(np.sin(np.arange(rows)))
+    return pd.DataFrame({"open": close - 0.1, "high": close + 0.5, "low": close - 0.5, "close": close,
+                         "volume": np.arange(rows) * 10.0}, index=index)
+
+
+def test_npz_round_trip_is_content_addressed_and_matches_csv(tmp_path):
+    bars = _bars()
+    digest, path, rows = write_bars_npz(bars, str(tmp_path))
+    assert rows == 500 and os.path.basename(path) == f"{digest}.npz"
+
+    # The same values in a different row order give the same file.
+    assert write_bars_npz(bars.iloc[::-1].reset_index(names="timestamp"), str(tmp_path))[0] == digest
+    assert os.listdir(tmp_path) == [f"{digest}.npz"]
+
+    loaded = load_bars_npz(path)
+    pd.testing.assert_frame_equal(loaded, bars, check_names=False, check_freq=False, check_index_type=False)
+    csv_path = tmp_path / "bars.csv"
+    csv_path.write_text(bars_to_csv(loaded))
+    pd.testing.assert_frame_equal(read_bars_csv(csv_path), bars, check_names=False, check_freq=False, check_index_type=False)
+    assert os.path.getsize(path) < len(bars_to_csv(bars)) / 2
+
+
+def test_corrupted_payload_is_rejected(tmp_path):
+    digest, path, _rows = write_bars_npz(_bars(50), str(tmp_path))
+    other = _bars(51)
+    copied = tmp_path / "copy"
+    copied.mkdir()
+    _other_digest, other_path, _ = write_bars_npz(other, str(copied))
+    os.replace(other_path, path)
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        load_bars_npz(path)
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        load_bars_npz(path, expected_digest=digest)
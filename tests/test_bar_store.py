@@ -0,0 +1,64 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bar_store import BarStore
+
+
+def _minute_bars(start, count):
+    idx = pd.date_range(start, periods=count, freq="1min", tz="UTC")
+    close = pd.Series(range(count), index=idx, dtype=float) + 100.0
+    return pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 10.0}, index=idx)
+
+
+class FakeBarsAPI:
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def get_bars(self, symbol, timeframe, start=None, end=None, adjustment="raw", feed=None):
+        self.calls.append((symbol, timeframe, pd.Timestamp(start), pd.Timestamp(end)))
+        mask = (self.bars.index >= pd.Timestamp(start)) & (self.bars.index <= pd.Timestamp(end))
+        return SimpleNamespace(df=self.bars[mask])
+
+
+def test_bar_store_only_requests_bars_after_last_cached(tmp_path):
+    origin = datetime(2026, 6, 2, 14, 0, tzinfo=timezone.utc)
+    api = FakeBarsAPI(_minute_bars(origin, 120))
+    store = BarStore(str(tmp_path), overlap_bars=2)
+
+    now = origin + timedelta(minutes=60, seconds=30)
+    bars, version = store.fetch(api, "AAPL", "1Min", "iex", origin, now)
+    # The bar starting at 14:59 closes at 15:00 and is kept; 15:00 is still forming.
+    assert len(bars) == 60
+    assert api.calls[0][2] == pd.Timestamp(origin)
+
+    now2 = now + timedelta(minutes=1)
+    bars2, version2 = store.fetch(api, "AAPL", "1Min", "iex", origin, now2)
+    assert len(bars2) == 61
+    assert version2 > version
+    assert api.calls[1][2] == pd.Timestamp(origin + timedelta(minutes=57))
+    assert store.stats["full_fetches"] == 1
+    assert store.stats["incremental_fetches"] == 1
+
+
+def test_bar_store_reloads_persisted_history(tmp_path):
+    origin = datetime(2026, 6, 2, 14, 0, tzinfo=timezone.utc)
+    api = FakeBarsAPI(_minute_bars(origin, 120))
+    now = origin + timedelta(minutes=30)
+    BarStore(str(tmp_path)).fetch(api, "AAPL", "1Min", "iex", origin, now)
+    BarStore(str(tmp_path)).fetch(api, "AAPL", "1Min", "iex", origin, now + timedelta(minutes=5))
+
+    reloaded = BarStore(str(tmp_path))
+    request_start, full = reloaded.plan_fetch("AAPL", "1Min", "iex", origin)
+    bars, _version = reloaded.window("AAPL", "1Min", "iex", origin)
+
+    assert full is False
+    assert request_start > origin
+    assert len(bars) == 35
+    assert bars["close"].iloc[-1] == 134.0
@@ -0,0 +1,86 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bar_store import BarStore
+from bar_warehouse import BarWarehouse, alpaca_fetcher
+
+
+def _minute_bars(start, count):
+    idx = pd.date_range(start, periods=count, freq="1min", tz="UTC")
+    close = pd.Series(range(count), index=idx, dtype=float) + 100.0
+    return pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 10.0}, index=idx)
+
+
+class FakeBarsAPI:
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def get_bars(self, symbol, timeframe, start=None, end=None, adjustment="raw", feed=None):
+        self.calls.append((pd.Timestamp(start), pd.Timestamp(end)))
+        mask = (self.bars.index >= pd.Timestamp(start)) & (self.bars.index <= pd.Timestamp(end))
+        return SimpleNamespace(df=self.bars[mask])
+
+
+def test_warehouse_fetches_only_gaps_and_partitions_by_day(tmp_path):
+    origin = datetime(2026, 6, 2, 23, 0, tzinfo=timezone.utc)
+    api = FakeBarsAPI(_minute_bars(origin, 240))
+    warehouse = BarWarehouse(str(tmp_path))
+    later = origin + timedelta(hours=10)
+
+    first = warehouse.ensure(alpaca_fetcher(api), "aapl", "1Min", "IEX", origin + timedelta(minutes=30), origin + timedelta(minutes=90), now=later)
+    assert len(first) == 60 and len(api.calls) == 1
+
+    # Overlapping wider request: only the two uncovered edges are fetched.
+    wide = warehouse.ensure(alpaca_fetcher(api), "AAPL", "1Min", "iex", origin, origin + timedelta(minutes=180), now=later)
+    assert len(wide) == 180
+    assert [call[0] for call in api.calls[1:]] == [pd.Timestamp(origin), pd.Timestamp(origin + timedelta(minutes=90))]
+    pd.testing.assert_frame_equal(wide, api.bars.iloc[:180], check_freq=False, check_names=False, check_index_type=False)
+    assert sorted(os.listdir(tmp_path / "iex" / "AAPL" / "1Min")) == ["2026-06-02.npy", "2026-06-03.npy", "coverage.json"]
+
+    # Fully covered: served from disk, and the fetcher (credentials) is never touched.
+    def no_credentials():
+        raise AssertionError("fetcher should not be created")
+    again = BarWarehouse(str(tmp_path)).ensure(alpaca_fetcher(no_credentials), "AAPL", "1Min", "iex", origin, origin + timedelta(minutes=180), now=later)
+    assert len(again) == 180 and len(api.calls) == 3
+
+
+def test_open_bars_are_not_covered_and_are_topped_up_later(tmp_path):
+    origin = datetime(2026, 6, 2, 14, 0, tzinfo=timezone.utc)
+    api = FakeBarsAPI(_minute_bars(origin, 120))
+    warehouse = BarWarehouse(str(tmp_path))
+    now = origin + timedelta(minutes=60, seconds=30)
+
+    bars = warehouse.ensure(alpaca_fetcher(api), "AAPL", "1Min", "iex", origin, now, now=now)
+    # 14:59 closed at 15:00; 15:00 is still forming and stays uncovered, and
+    # the last five closed bars are stored but not yet settled.
+    assert len(bars) == 59 + 1
+    assert warehouse.gaps("AAPL", "1Min", "iex", origin, now) == [(origin + timedelta(minutes=54, seconds=30), now)]
+
+    # A revision of a recent bar is picked up by the next top-up.
+    api.bars.iloc[56, api.bars.columns.get_loc("close")] = 999.0
+    now2 = now + timedelta(minutes=5)
+    bars = warehouse.ensure(alpaca_fetcher(api), "AAPL", "1Min", "iex", origin, now2, now=now2)
+    assert len(bars) == 65
+    assert bars["close"].iloc[56] == 999.0
+    assert api.calls[-1][0] == pd.Timestamp(origin + timedelta(minutes=54, seconds=30))
+
+
+def test_bar_store_cold_start_is_seeded_from_the_warehouse(tmp_path):
+    origin = datetime(2026, 6, 2, 14, 0, tzinfo=timezone.utc)
+    api = FakeBarsAPI(_minute_bars(origin, 120))
+    warehouse = BarWarehouse(str(tmp_path / "warehouse"))
+    warehouse.ensure(alpaca_fetcher(api), "AAPL", "1Min", "iex", origin, origin + timedelta(minutes=100), now=origin + timedelta(hours=1, minutes=45))
+    calls = len(api.calls)
+
+    store = BarStore(str(tmp_path / "cache"), warehouse=warehouse)
+    now = origin + timedelta(minutes=100)
+    bars, _version = store.fetch(api, "AAPL", "1Min", "iex", origin, now)
+    assert len(bars) == 100
+    assert len(api.calls) == calls and store.stats["warehouse_seeds"] == 1
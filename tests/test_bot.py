@@ -73,3 +73,92 @@ def test_mirror_close_skips_when_no_db_open_trade(app, monkeypatch):
 
         assert result is None
         assert Trade.query.count() == 0
+
+
+def test_dispatch_account_groups_runs_accounts_concurrently_in_order(monkeypatch):
+    import threading
+    import time
+
+    users = {i: SimpleNamespace(id=i, username=f"user{i}") for i in range(1, 5)}
+    monkeypatch.setattr(bot.db.session, 'get', lambda _model, user_id: users[user_id], raising=False)
+    active = []
+    peak = []
+    calls = []
+    lock = threading.Lock()
+    # Every account must be in flight at once to get past the barrier.
+    gate = {'barrier': threading.Barrier(4, timeout=5)}
+
+    def fake_process(user, payload):
+        with lock:
+            active.append(user.id)
+            peak.append(len(active))
+            calls.append((user.id, payload['n']))
+        if gate['barrier'] is not None:
+            gate['barrier'].wait()
+        else:
+            time.sleep(0.05)
+        with lock:
+            active.remove(user.id)
+        return True, 200, {"result": "opened", "n": payload['n']}, None
+
+    monkeypatch.setattr(bot, 'process_trade_for_user', fake_process)
+    groups = [(f"acct{i}", [users[i]]) for i in range(1, 5)]
+
+    outcomes = bot.dispatch_account_groups(groups, {'symbol': 'AAPL', 'action': 'buy', 'n': 1})
+    assert max(peak) == 4
+    assert [o[2]['n'] for o in outcomes] == [1, 1, 1, 1]
+    assert set(outcomes[0][4]) == {'queue', 'account_wait', 'process', 'total'}
+
+    # Two signals for the same account never overlap and keep arrival order.
+    calls.clear()
+    peak.clear()
+    gate['barrier'] = None
+    first = threading.Thread(target=bot.dispatch_account_groups, args=([("acct1", [users[1]]), ("acct2", [users[2]])], {'n': 1}))
+    first.start()
+    time.sleep(0.01)
+    bot.dispatch_account_groups([("acct1", [users[1]]), ("acct3", [users[3]])], {'n': 2})
+    first.join()
+    assert [n for uid, n in calls if uid == 1] == [1, 2]
+
+
+def test_webhook_queues_tradingview_alerts_and_reports_status(tmp_path, monkeypatch):
+    from webhook_queue import WebhookQueue
+
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    notified = []
+    monkeypatch.setattr(bot, 'WEBHOOK_QUEUE', queue)
+    monkeypatch.setattr(bot, 'WEBHOOK_WORKERS', SimpleNamespace(notify=lambda: notified.append(1)))
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', '')
+    monkeypatch.setattr(bot.app, 'instance_path', str(tmp_path))
+    client = bot.app.test_client()
+
+    payload = {'user': 'tv', 'symbol': 'AAPL', 'action': 'buy', 'amount': 10, 'passphrase': 'tv-secret'}
+    first = client.post('/webhook', json=payload)
+    assert first.status_code == 202
+    job_id = first.get_json()['job_id']
+    second = client.post('/webhook', json=payload)
+    assert second.status_code == 200
+    assert second.get_json() == {'status': 'duplicate', 'job_id': job_id, 'status_url': f'/webhook/status/{job_id}'}
+    assert notified == [1]
+
+    assert client.get(f'/webhook/status/{job_id}').get_json()['status'] == 'queued'
+    claimed_id, queued_payload = queue.claim('1:test')
+    assert claimed_id == job_id
+    assert queued_payload == {'user': 'tv', 'symbol': 'AAPL', 'action': 'buy', 'amount': 10}
+    queue.finish(job_id, 'done', 200, {'success_count': 1})
+    status = client.get(f'/webhook/status/{job_id}').get_json()
+    assert status['status'] == 'done' and status['response'] == {'success_count': 1}
+    assert client.get('/webhook/status/unknown').status_code == 404
+
+
+def test_trade_updates_health_is_not_ready_without_streams(monkeypatch):
+    monkeypatch.setattr(bot, '_is_internal_dashboard_proxy', lambda: True)
+    streams = []
+    monkeypatch.setattr(bot, 'TRADE_UPDATES', SimpleNamespace(readiness=lambda: list(streams)))
+    client = bot.app.test_client()
+
+    assert client.get('/health/trade_updates').get_json() == {'ready': False, 'streams': []}
+    streams.append({'account': 'k1...', 'ready': True})
+    assert client.get('/health/trade_updates').get_json()['ready'] is True
+    streams.append({'account': 'k2...', 'ready': False})
+    assert client.get('/health/trade_updates').get_json()['ready'] is False
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bulk_close import close_positions
+
+
+class FakeApi:
+    def __init__(self, name, fail=()):
+        self.name = name
+        self.fail = set(fail)
+        self.closed = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get_position(self, symbol):
+        if symbol in self.fail:
+            raise RuntimeError("position not found")
+        return SimpleNamespace(symbol=symbol, qty=1, avg_entry_price=100, current_price=99, side="long")
+
+    def close_position(self, symbol):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+            self.closed.append(symbol)
+        return SimpleNamespace(id=f"{self.name}-{symbol}")
+
+
+def test_close_positions_runs_accounts_concurrently_and_shares_fills_on_one_account():
+    filled_at = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    a, b = FakeApi("a"), FakeApi("b", fail={"NVDA"})
+
+    def wait_for_fill(api, order_id, symbol, timeout_sec=None):
+        return (None, None) if symbol == "MSFT" else (101.0, filled_at)
+
+    targets = [
+        {"user_id": 1, "username": "u1", "symbol": "AAPL", "api": a, "account_key": "a"},
+        {"user_id": 2, "username": "u2", "symbol": "AAPL", "api": a, "account_key": "a"},
+        {"user_id": 1, "username": "u1", "symbol": "MSFT", "api": a, "account_key": "a"},
+        {"user_id": 1, "username": "u1", "symbol": "TSLA", "api": a, "account_key": "a"},
+        {"user_id": 3, "username": "u3", "symbol": "AAPL", "api": b, "account_key": "b"},
+        {"user_id": 3, "username": "u3", "symbol": "NVDA", "api": b, "account_key": "b"},
+    ]
+    started = time.monotonic()
+    results = close_positions(targets, wait_for_fill, per_account_concurrency=2, min_interval_sec=0)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.2
+    assert a.peak == 2
+    assert sorted(a.closed) == ["AAPL", "MSFT", "TSLA"]
+    assert [r["status"] for r in results] == ["closed", "linked", "closed", "closed", "closed", "error"]
+    assert results[1]["linked_to"] == "u1" and results[1]["close_order_id"] == "a-AAPL"
+    # The shared AAPL close is priced per user from their own open trade.
+    assert results[0]["position_obj"] is None and results[1]["position_obj"] is None
+    assert results[2]["position_obj"] is not None
+    assert (results[0]["close_price"], results[0]["price_source"]) == (101.0, "fill")
+    assert (results[2]["close_price"], results[2]["price_source"]) == (99.0, "position_fallback")
+    assert results[5]["error"] == "position not found"
+    assert set(results[0]["timing_ms"]) == {"submit", "fill", "total"}
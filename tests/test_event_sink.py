@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from event_sink import EventSink, iter_lines, rotated_segments, tail_events
+
+
+def test_sink_rotates_compresses_and_prunes_segments(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    sink = EventSink(path, max_bytes=400, backup_count=2, compress=True)
+    try:
+        for i in range(60):
+            sink.write({"i": i, "event": "tick", "pad": "x" * 20})
+            if i % 10 == 9:
+                assert sink.flush()
+    finally:
+        sink.close()
+
+    segments = rotated_segments(path)
+    assert len(segments) == 2
+    assert all(segment.endswith(".gz") for segment in segments)
+    with gzip.open(segments[-1], "rt", encoding="utf-8") as fh:
+        assert json.loads(fh.readline())["event"] == "tick"
+    assert not os.path.exists(path) or os.path.getsize(path) < 400
+
+
+def test_tail_reads_only_the_end_and_spans_rotated_segments(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    sink = EventSink(path, max_bytes=0, compress=False)
+    for i in range(5000):
+        sink.write({"i": i})
+    sink.flush()
+    assert [item["i"] for item in tail_events(path, 3)] == [4997, 4998, 4999]
+
+    sink.max_bytes = 1  # next write rotates the live file into a segment
+    sink.write({"i": 5000})
+    sink.flush()
+    sink.max_bytes = 0
+    sink.write({"i": 5001})
+    sink.close()
+    assert len(rotated_segments(path)) == 1
+    assert [item["i"] for item in tail_events(path, 3)] == [4999, 5000, 5001]
+    assert tail_events(str(tmp_path / "missing.jsonl"), 5) == []
+
+
+def test_concurrent_writers_lose_no_events_across_rotations(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    # Separate sinks stand in for separate processes: each has its own file and lock handles.
+    sinks = [EventSink(path, max_bytes=2000, backup_count=1000, compress=True) for _ in range(3)]
+    try:
+        for i in range(600):
+            for n, sink in enumerate(sinks):
+                sink.write({"writer": n, "i": i, "pad": "x" * 20})
+            if i % 25 == 24:
+                assert all(sink.flush() for sink in sinks)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    seen = []
+    for segment in rotated_segments(path) + [path]:
+        opener = gzip.open if segment.endswith(".gz") else open
+        if os.path.exists(segment):
+            with opener(segment, "rt", encoding="utf-8") as fh:
+                seen.extend((item["writer"], item["i"]) for item in map(json.loads, fh))
+    assert len(rotated_segments(path)) > 3
+    assert sorted(seen) == [(n, i) for n in range(3) for i in range(600)]
+
+
+def test_rotation_age_survives_restarts_and_ignores_appends(tmp_path, monkeypatch):
+    import event_sink
+
+    path = str(tmp_path / "events.jsonl")
+    clock = [1_000_000.0]
+    monkeypatch.setattr(event_sink.time, "time", lambda: clock[0])
+
+    sink = EventSink(path, max_bytes=0, rotate_seconds=3600, compress=False)
+    sink.write({"i": 0})
+    sink.close()
+    # A restart 50 minutes later: the segment is 50 minutes old, not brand new.
+    clock[0] += 3000
+    sink = EventSink(path, max_bytes=0, rotate_seconds=3600, compress=False)
+    sink.write({"i": 1})
+    sink.flush()
+    assert rotated_segments(path) == []
+    clock[0] += 700
+    sink.write({"i": 2})
+    sink.close()
+    assert len(rotated_segments(path)) == 1
+
+
+def test_backup_count_zero_keeps_every_segment_for_iter_lines(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    sink = EventSink(path, max_bytes=200, backup_count=0, compress=True)
+    try:
+        for i in range(80):
+            sink.write({"i": i, "pad": "x" * 20})
+            assert sink.flush()
+    finally:
+        sink.close()
+
+    assert len(rotated_segments(path)) > 3
+    assert [json.loads(line)["i"] for line in iter_lines(path)] == list(range(80))
+    assert list(iter_lines(str(tmp_path / "missing.jsonl"))) == []
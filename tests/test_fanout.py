@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fanout import FanoutExecutor
+
+
+def test_per_key_limit_global_bound_and_results_in_order():
+    executor = FanoutExecutor(max_workers=4, per_key_concurrency=1)
+    lock = threading.Lock()
+    active = {}
+    peaks = {}
+
+    def work(item):
+        key = item[0]
+        with lock:
+            active[key] = active.get(key, 0) + 1
+            peaks[key] = max(peaks.get(key, 0), active[key])
+        time.sleep(0.02)
+        with lock:
+            active[key] -= 1
+        if item == "b2":
+            raise RuntimeError("boom")
+        return item.upper()
+
+    items = ["a1", "a2", "a3", "b1", "b2", "c1"]
+    assert executor.map(items, work, key_fn=lambda item: item[0]) == ["A1", "A2", "A3", "B1", None, "C1"]
+    assert peaks == {"a": 1, "b": 1, "c": 1}
+    stats = executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["errors"], stats["queued"], stats["running"]) == (6, 5, 1, 0, 0)
+
+
+def test_deadline_cancels_queued_work_and_abandons_stragglers():
+    executor = FanoutExecutor(max_workers=1)
+    release = threading.Event()
+
+    def work(item):
+        if item == "slow":
+            release.wait(2)
+        return item
+
+    started = time.monotonic()
+    assert executor.map(["slow", "queued"], work, deadline_sec=0.05, default="late") == ["late", "late"]
+    assert time.monotonic() - started < 0.5
+    release.set()
+    stats = executor.stats()
+    assert (stats["timeouts"], stats["cancelled"]) == (1, 1)
+    assert stats["queued"] == 0 and stats["peak_queued"] >= 1
+
+
+def test_tasks_waiting_on_a_busy_account_do_not_hold_pool_workers():
+    executor = FanoutExecutor(max_workers=2, per_key_concurrency=1)
+    release = threading.Event()
+
+    def work(item):
+        if item.startswith("slow"):
+            release.wait(5)
+        return item.upper()
+
+    busy = threading.Thread(target=executor.map, args=(["slow1", "slow2", "slow3"], work), kwargs={"key_fn": lambda item: "slow"})
+    busy.start()
+    try:
+        # One worker runs slow1; slow2 and slow3 wait off the pool, so the
+        # other account still gets a worker.
+        assert executor.map(["fast1"], work, key_fn=lambda item: "fast", deadline_sec=1.0) == ["FAST1"]
+        assert executor.stats()["running"] == 1
+    finally:
+        release.set()
+        busy.join(5)
+    stats = executor.stats()
+    assert (stats["completed"], stats["queued"], stats["running"]) == (4, 0, 0)
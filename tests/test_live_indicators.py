@@ -0,0 +1,113 @@
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from live_indicators import EWMA, KeltnerFrame, MacdSmaFrame, RollingSMA, RsiFrame
+from local_strategy_engine import LocalStrategyEngine
+from misc.pine_optimizer import ema, keltner_channel, rsi, sma
+
+
+def _bars(seed=7, n=600):
+    rng = np.random.RandomState(seed)
+    idx = pd.date_range("2026-06-01 13:30", periods=n, freq="15min", tz="UTC")
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.8, n))
+    close[n // 3:n // 3 + 15] = close[n // 3]  # flat run exercises pandas' constant-window path
+    spread = np.abs(rng.normal(0.5, 0.2, n)) + 0.05
+    return pd.DataFrame(
+        {"open": close + rng.normal(0, 0.2, n), "high": close + spread, "low": close - spread, "close": close, "volume": 1000.0},
+        index=idx,
+    )
+
+
+def _engine(tmp_path):
+    app = SimpleNamespace(instance_path=str(tmp_path))
+    return LocalStrategyEngine(app, lambda *_args: None, "https://paper-api.alpaca.markets", logging.getLogger("test"))
+
+
+def test_rolling_sma_and_ewma_match_pine_optimizer_exactly():
+    close = _bars()["close"]
+    for length in (5, 14, 50):
+        rolling = RollingSMA(length)
+        assert np.array_equal([rolling.update(v) for v in close], sma(close, length).to_numpy(), equal_nan=True)
+        basis = EWMA(length, span=length)
+        assert np.array_equal([basis.update(v) for v in close], ema(close, length).to_numpy(), equal_nan=True)
+
+    rsi_frame = RsiFrame({"rsi_length": 14, "rsi_trend_length": 50, "rsi_oversold": 30, "rsi_overbought": 70, "rsi_exit_level": 55})
+    values = [rsi_frame._step(0.0, 0.0, 0.0, v)[0] for v in close]
+    assert np.array_equal(values, rsi(close, 14).to_numpy())
+
+
+def test_incremental_frames_match_full_recompute_bar_by_bar(tmp_path):
+    engine = _engine(tmp_path)
+    bars = _bars()
+    keltner = {"inner_kc_length": 20, "inner_kc_mult": 1.5}
+    macd = {"macd_fast_length": 12, "macd_slow_length": 26, "macd_sma_length": 100, "macd_signal_length": 9}
+    rsi_params = {"rsi_length": 14, "rsi_trend_length": 100, "rsi_oversold": 30, "rsi_overbought": 70, "rsi_exit_level": 55}
+    states = [KeltnerFrame(keltner), MacdSmaFrame(macd), RsiFrame(rsi_params)]
+
+    for end in range(150, len(bars) + 1, 37):
+        window = bars.iloc[:end]
+        mid, upper, lower = keltner_channel(window, 20, 1.5)
+        expected = [
+            window.assign(mid_inner=mid, up_inner=upper, low_inner=lower).dropna(),
+            engine.build_macd_sma_frame(window, macd),
+            engine.build_rsi_frame(window, rsi_params),
+        ]
+        for state, reference in zip(states, expected):
+            assert state.update(window)
+            tail = state.frame()
+            pd.testing.assert_frame_equal(tail, reference.tail(len(tail))[tail.columns], check_exact=True, check_freq=False)
+
+
+def test_revised_bar_starts_a_new_indicator_frame(tmp_path):
+    engine = _engine(tmp_path)
+    bars = _bars(n=200)
+    params = {"strategy": "keltner", "inner_kc_length": 20, "inner_kc_mult": 1.5}
+
+    engine.indicator_frame("AAPL", params, bars.iloc[:-1])
+    first = next(iter(engine._indicator_frames.values()))
+    engine.indicator_frame("AAPL", params, bars)
+    assert next(iter(engine._indicator_frames.values())) is first
+
+    revised = bars.copy()
+    revised.iloc[-3, revised.columns.get_loc("close")] += 1.0
+    frame = engine.indicator_frame("AAPL", params, revised)
+    assert next(iter(engine._indicator_frames.values())) is not first
+    mid, _upper, _lower = keltner_channel(revised, 20, 1.5)
+    assert frame["mid_inner"].iloc[-1] == mid.iloc[-1]
+
+
+def test_incremental_frames_track_a_sliding_window_within_tolerance(tmp_path):
+    engine = _engine(tmp_path)
+    bars = _bars()
+    keltner = {"inner_kc_length": 20, "inner_kc_mult": 1.5}
+    macd = {"macd_fast_length": 12, "macd_slow_length": 26, "macd_sma_length": 100, "macd_signal_length": 9}
+    rsi_params = {"rsi_length": 14, "rsi_trend_length": 100, "rsi_oversold": 30, "rsi_overbought": 70, "rsi_exit_level": 55}
+    states = [KeltnerFrame(keltner), MacdSmaFrame(macd), RsiFrame(rsi_params)]
+
+    # The frames keep their seed while the engine's window slides forward, so the
+    # EMA/RMA columns differ from a recompute over the window by roughly
+    # (1 - alpha) ** 300: ~1e-13 for the Keltner EMA and ~1e-10 for RSI(14).
+    # The rolling sums also carry their compensation terms across the slide, so
+    # the SMA columns may differ in the last bits. rtol=1e-8 (atol=1e-9 for
+    # values near zero such as the MACD histogram) covers both.
+    for end in range(300, len(bars) + 1, 37):
+        window = bars.iloc[end - 300:end]
+        mid, upper, lower = keltner_channel(window, 20, 1.5)
+        expected = [
+            window.assign(mid_inner=mid, up_inner=upper, low_inner=lower).dropna(),
+            engine.build_macd_sma_frame(window, macd),
+            engine.build_rsi_frame(window, rsi_params),
+        ]
+        for state, reference in zip(states, expected):
+            assert state.update(window)
+            tail = state.frame()
+            pd.testing.assert_frame_equal(
+                tail, reference.tail(len(tail))[tail.columns], check_exact=False, rtol=1e-8, atol=1e-9, check_freq=False
+            )
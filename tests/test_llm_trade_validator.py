@@ -135,6 +135,7 @@ def test_shadow_event_records_lmstudio_decision_and_news(tmp_path, monkeypatch):
     )
 
     validator._run_signal(event, "key", "secret")
+    validator.event_sink.flush()
 
     line = (tmp_path / "shadow.jsonl").read_text(encoding="utf-8").strip()
     recorded = json.loads(line)
@@ -184,6 +185,7 @@ def test_shadow_event_supports_lmstudio_native_chat_api(tmp_path, monkeypatch):
     )
 
     validator._run_signal(event, "key", "secret")
+    validator.event_sink.flush()
 
     line = (tmp_path / "native-shadow.jsonl").read_text(encoding="utf-8").strip()
     recorded = json.loads(line)
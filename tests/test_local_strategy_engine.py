@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import logging
@@ -417,3 +418,305 @@ def test_forced_refresh_bypasses_throttle_and_records_sources(tmp_path):
     assert engine.symbol_memory.archive_count("AAPL") == 1  # ingested despite throttle (forced)
     snap = engine.symbol_memory.load_dossier("AAPL")["last_sources"]
     assert snap["ok"] == ["Alpaca"] and "Nasdaq" in snap["failed"]
+
+
+def test_prefetch_batches_bars_and_prices_for_universe(tmp_path):
+    from datetime import datetime, timezone, timedelta
+
+    engine = _make_engine(tmp_path, [])
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    idx = pd.date_range(now - timedelta(days=3), now - timedelta(minutes=1), freq="15min", tz="UTC")
+    bars = pd.DataFrame({"open": 100.0, "high": 101.0, "low": 99.0, "close": 100.5, "volume": 10.0}, index=idx)
+
+    class BatchAPI:
+        def __init__(self):
+            self.multi_calls = []
+            self.starts = []
+            self.price_calls = []
+
+        def get_bars_multi(self, symbols, timeframe, start=None, end=None, adjustment="raw", feed=None):
+            self.multi_calls.append((tuple(symbols), timeframe))
+            self.starts.append(pd.Timestamp(start))
+            return {symbol: SimpleNamespace(df=bars) for symbol in symbols}
+
+        def get_latest_trades_multi(self, symbols):
+            self.price_calls.append(tuple(symbols))
+            return {symbol: SimpleNamespace(price=101.25) for symbol in symbols}
+
+        def get_bars(self, *args, **kwargs):
+            raise AssertionError("per-symbol bar request after prefetch")
+
+        def get_latest_trade(self, symbol):
+            raise AssertionError("per-symbol price request after prefetch")
+
+    api = BatchAPI()
+    cfg = {"feed": "iex"}
+    entries = [
+        {"symbol": "AAPL", "strategy": "keltner", "backtest": {"timeframe": "15Min", "session": "all"}},
+        {"symbol": "MSFT", "strategy": "keltner", "backtest": {"timeframe": "15Min", "session": "all"}},
+        {"symbol": "MSFT", "strategy": "macd_sma", "backtest": {"timeframe": "30Min", "session": "all"}},
+    ]
+    engine.prefetch_market_data(api, cfg, entries)
+
+    # One request per fetch timeframe, one for all prices.
+    assert api.multi_calls == [(("AAPL", "MSFT"), "15Min"), (("MSFT",), "30Min")]
+    assert api.price_calls == [("AAPL", "MSFT")]
+    assert len(engine.fetch_closed_bars(api, "MSFT", "15Min", "iex", "all")) > 0
+    assert engine.get_latest_price(api, "AAPL") == 101.25
+
+    # A cold engine sharing the warehouse still batches, and only asks for the unsettled tail.
+    (tmp_path / "other").mkdir()
+    other = _make_engine(tmp_path / "other", [])
+    other.bar_store.warehouse = engine.bar_store.warehouse
+    api.multi_calls.clear()
+    api.starts.clear()
+    other.prefetch_market_data(api, cfg, entries)
+    assert api.multi_calls == [(("AAPL", "MSFT"), "15Min"), (("MSFT",), "30Min")]
+    assert all(start >= pd.Timestamp(now - timedelta(hours=4)) for start in api.starts)
+    seeded = other.fetch_closed_bars(api, "MSFT", "15Min", "iex", "all")
+    assert list(seeded.index) == list(engine.fetch_closed_bars(api, "MSFT", "15Min", "iex", "all").index)
+
+
+def test_positions_snapshot_is_shared_within_tick_and_refreshed_after_orders(tmp_path):
+    executed = []
+    engine = _make_engine(tmp_path, executed)
+
+    class PositionsAPI:
+        def __init__(self):
+            self.list_calls = 0
+
+        def list_positions(self):
+            self.list_calls += 1
+            return [SimpleNamespace(symbol="AAPL", side="long", avg_entry_price="100")]
+
+        def get_position(self, symbol):
+            raise AssertionError("per-symbol position request inside a tick")
+
+    api = PositionsAPI()
+    user = SimpleNamespace(id=3, username="paper", per_trade_amount=1000)
+    engine._positions_tick = True
+
+    assert engine.get_position(api, "AAPL").side == "long"
+    assert engine.get_position(api, "MSFT") is None
+    assert engine.recovery_obsolete(api, {"kind": "open", "payload": {"symbol": "AAPL"}}) is True
+    assert api.list_calls == 1
+
+    engine.execute_or_recover(user, {"symbol": "MSFT", "action": "buy"}, kind="open")
+    engine.get_position(api, "MSFT")
+    assert api.list_calls == 2
+
+
+def test_entries_evaluated_concurrently_keep_per_symbol_order(tmp_path):
+    import threading
+    import time as _time
+
+    engine = _make_engine(tmp_path, [])
+    engine.eval_workers = 3
+    seen = []
+    threads = {}
+    lock = threading.Lock()
+
+    def fake_evaluate(user, api, cfg, entry, backtest):
+        _time.sleep(0.01)
+        st = engine.symbol_state(entry["symbol"], entry["strategy"])
+        st["last_decision"] = "no_entry"
+        engine.save_state()
+        with lock:
+            seen.append((entry["symbol"], entry["strategy"]))
+            threads.setdefault(entry["symbol"], set()).add(threading.current_thread().name)
+
+    engine.evaluate_symbol = fake_evaluate
+    entries = [
+        {"symbol": symbol, "strategy": strategy, "backtest": {}}
+        for symbol in ("AAPL", "MSFT", "NVDA", "TSM")
+        for strategy in ("macd_sma", "keltner")
+    ]
+    engine.evaluate_entries(SimpleNamespace(id=1), None, {}, entries)
+
+    assert len(seen) == len(entries)
+    for symbol in ("AAPL", "MSFT", "NVDA", "TSM"):
+        assert [s for sym, s in seen if sym == symbol] == ["macd_sma", "keltner"]
+        assert len(threads[symbol]) == 1
+    assert engine._state_dirty is False
+    rows = engine.state_store.load()
+    assert json.loads(rows["symbols/AAPL::keltner"]) == {"last_decision": "no_entry"}
+
+
+def test_transient_failure_in_worker_triggers_single_cooldown(tmp_path):
+    from local_strategy_engine import TransientStrategyAPIError
+
+    engine = _make_engine(tmp_path, [])
+    engine.eval_workers = 2
+    cooldowns = []
+    engine.defer_api_cooldown = lambda reason: cooldowns.append(reason)
+
+    def failing_evaluate(user, api, cfg, entry, backtest):
+        raise TransientStrategyAPIError("read timed out")
+
+    engine.evaluate_symbol = failing_evaluate
+    entries = [{"symbol": symbol, "strategy": "keltner", "backtest": {}} for symbol in ("AAPL", "MSFT", "NVDA")]
+    engine.evaluate_entries(SimpleNamespace(id=1), None, {}, entries)
+
+    assert len(cooldowns) == 1
+
+
+def test_next_bar_close_skips_closed_market_using_calendar(tmp_path):
+    from datetime import date, datetime
+    from local_strategy_engine import NY_TZ
+
+    engine = _make_engine(tmp_path, [])
+    # 2026-07-03 is an exchange holiday, so the calendar only lists the 2nd and 6th.
+    calendar = [
+        SimpleNamespace(date=date(2026, 7, 2), open=datetime(2026, 7, 2, 9, 30), close=datetime(2026, 7, 2, 16, 0)),
+        SimpleNamespace(date=date(2026, 7, 6), open=datetime(2026, 7, 6, 9, 30), close=datetime(2026, 7, 6, 16, 0)),
+    ]
+    engine.refresh_market_calendar(SimpleNamespace(get_calendar=lambda start, end: calendar))
+
+    def close_after(hour, minute, day=2, timeframe="30Min", session="regular"):
+        now = datetime(2026, 7, day, hour, minute, tzinfo=NY_TZ)
+        return engine.next_bar_close(timeframe, session, now).astimezone(NY_TZ)
+
+    assert close_after(10, 5) == datetime(2026, 7, 2, 10, 30, tzinfo=NY_TZ)
+    assert close_after(15, 40) == datetime(2026, 7, 2, 16, 0, tzinfo=NY_TZ)
+    assert close_after(16, 5) == datetime(2026, 7, 6, 10, 0, tzinfo=NY_TZ)
+    assert close_after(3, 0, timeframe="1Hour") == datetime(2026, 7, 2, 11, 0, tzinfo=NY_TZ)
+    assert close_after(16, 5, session="all") == datetime(2026, 7, 2, 16, 30, tzinfo=NY_TZ)
+
+
+def test_bar_close_schedule_evaluates_only_due_entries_and_open_positions(tmp_path):
+    from datetime import datetime, timedelta, timezone
+
+    engine = _make_engine(tmp_path, [])
+    engine.schedule_mode = "bar_close"
+    engine.eval_workers = 1
+    engine.refresh_symbol_memory = lambda *args: None
+    engine.prefetch_market_data = lambda *args: None
+    evaluated = []
+    engine.evaluate_symbol = lambda user, api, cfg, entry, backtest: evaluated.append(entry["symbol"])
+
+    class ScheduleAPI:
+        def __init__(self):
+            self.positions = []
+
+        def get_calendar(self, start=None, end=None):
+            raise RuntimeError("calendar down")
+
+        def list_positions(self):
+            return self.positions
+
+    api = ScheduleAPI()
+    cfg = {"enabled": True, "universe": [
+        {"symbol": "AAPL", "strategy": "keltner", "enabled": True, "backtest": {"timeframe": "30Min", "session": "all"}},
+        {"symbol": "MSFT", "strategy": "keltner", "enabled": True, "backtest": {"timeframe": "30Min", "session": "all"}},
+    ]}
+    user = SimpleNamespace(id=1)
+
+    def run_tick():
+        engine._positions_tick = True
+        engine._positions = None
+        try:
+            engine.tick_account(user, api, cfg)
+        finally:
+            engine._positions_tick = False
+
+    run_tick()
+    assert evaluated == ["AAPL", "MSFT"]
+    assert all(due > datetime.now(timezone.utc) for due in engine._next_bar_due.values())
+    assert engine.next_wake_delay(0) <= engine.max_idle_seconds
+
+    # Nothing closed yet: only the symbol with an open position is re-checked.
+    api.positions = [SimpleNamespace(symbol="MSFT", side="long")]
+    run_tick()
+    assert evaluated == ["AAPL", "MSFT", "MSFT"]
+    assert engine.next_wake_delay(0) == engine.exit_poll_seconds
+
+    engine._next_bar_due["AAPL::keltner"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+    run_tick()
+    assert evaluated[-2:] == ["AAPL", "MSFT"]
+
+
+def test_streamed_bars_and_prices_replace_rest_polling(tmp_path):
+    from datetime import datetime, timedelta, timezone
+    from market_feed import MarketDataFeed
+
+    engine = _make_engine(tmp_path, [])
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    idx = pd.date_range(now - timedelta(days=3), now - timedelta(minutes=30), freq="15min", tz="UTC")
+    bars = pd.DataFrame({"open": 100.0, "high": 101.0, "low": 99.0, "close": 100.5, "volume": 10.0}, index=idx)
+
+    class RestAPI:
+        def __init__(self):
+            self.calls = 0
+
+        def get_bars_multi(self, symbols, timeframe, **kwargs):
+            self.calls += 1
+            return {symbol: SimpleNamespace(df=bars) for symbol in symbols}
+
+        def get_latest_trades_multi(self, symbols):
+            self.calls += 1
+            return {symbol: SimpleNamespace(price=100.0) for symbol in symbols}
+
+    api = RestAPI()
+    cfg = {"feed": "iex"}
+    entries = [{"symbol": "AAPL", "strategy": "keltner", "backtest": {"timeframe": "15Min", "session": "all"}}]
+    engine.prefetch_market_data(api, cfg, entries)
+    assert api.calls == 2
+
+    engine.market_feed = MarketDataFeed()
+    engine.market_feed.covered_from = idx[-1].to_pydatetime() - timedelta(hours=3)
+    for minute in pd.date_range(idx[-1] + timedelta(minutes=15), now - timedelta(minutes=1), freq="1min", tz="UTC"):
+        engine.market_feed.on_bar("AAPL", minute.to_pydatetime(), 100.0, 103.0, 99.0, 102.0, 5.0)
+    engine.market_feed.on_trade("AAPL", 102.5)
+    engine._prefetched_bars = {}
+    engine.prefetch_market_data(api, cfg, entries)
+
+    assert api.calls == 2
+    assert engine.get_latest_price(api, "AAPL") == 102.5
+    closed = engine.fetch_closed_bars(api, "AAPL", "15Min", "iex", "all")
+    assert closed["high"].iloc[-1] == 103.0
+
+
+def test_state_store_writes_changed_rows_once_per_tick_and_orders_immediately(tmp_path):
+    engine = _make_engine(tmp_path, [])
+    writes = []
+    apply = engine.state_store.apply
+    engine.state_store.apply = lambda upserts, deletes=(): (writes.append(dict(upserts)), apply(upserts, deletes))
+
+    engine._defer_state_saves += 1
+    engine.symbol_state("AAPL", "keltner")["last_decision"] = "no_entry"
+    engine.save_state()
+    engine.symbol_state("MSFT", "keltner")["last_decision"] = "no_entry"
+    engine.save_state()
+    assert writes == []
+
+    user = SimpleNamespace(id=3, username="paper")
+    engine.execute_or_recover(user, {"symbol": "NVDA", "strategy": "keltner", "action": "buy"}, kind="open")
+    engine.symbol_state("NVDA", "keltner")["last_entry_bar"] = "2026-06-02T15:00:00Z"
+    engine.save_state()
+    assert set(writes[0]) == {"symbols/NVDA::keltner", "state/recoveries"}
+
+    engine._defer_state_saves -= 1
+    engine.flush_state()
+    assert set(writes[1]) == {"symbols/AAPL::keltner", "symbols/MSFT::keltner"}
+    engine.flush_state()
+    assert len(writes) == 2
+
+    reloaded = _make_engine(tmp_path, [])
+    reloaded.load_state()
+    assert reloaded.state["symbols"]["NVDA::keltner"] == {"last_entry_bar": "2026-06-02T15:00:00Z"}
+    assert reloaded.state["recoveries"] == []
+
+
+def test_legacy_json_state_is_migrated_on_load(tmp_path):
+    legacy = {"symbols": {"AAPL::macd_sma": {"last_entry_bar": "x"}}, "recoveries": [{"id": "r1"}], "api_cooldown_until_utc": "t"}
+    (tmp_path / "local_strategy_state.json").write_text(json.dumps(legacy))
+
+    engine = _make_engine(tmp_path, [])
+    engine.load_state()
+    assert engine.state == legacy
+    assert not (tmp_path / "local_strategy_state.json").exists()
+    assert (tmp_path / "local_strategy_state.json.migrated").exists()
+
+    reloaded = _make_engine(tmp_path, [])
+    reloaded.load_state()
+    assert reloaded.state == legacy
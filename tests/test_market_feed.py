@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+import pandas as pd
+from websockets.asyncio.server import serve
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from alpaca_api import MarketDataStream
+from market_feed import MarketDataFeed, load_price_snapshot
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class FakeAlpacaDataServer:
+    """Minimal Alpaca market-data websocket speaking the msgpack protocol."""
+
+    def __init__(self, drop_first_connection=False):
+        self.drop_first_connection = drop_first_connection
+        self.connections = 0
+        self.subscriptions = []
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), daemon=True)
+
+    async def _handler(self, ws):
+        self.connections += 1
+        connection = self.connections
+        await ws.send(msgpack.packb([{"T": "success", "msg": "connected"}]))
+        auth = msgpack.unpackb(await ws.recv())
+        assert auth["action"] == "auth"
+        await ws.send(msgpack.packb([{"T": "success", "msg": "authenticated"}]))
+        sub = msgpack.unpackb(await ws.recv())
+        self.subscriptions.append(sub)
+        await ws.send(msgpack.packb([{"T": "subscription", "trades": sub.get("trades", []), "bars": sub.get("bars", [])}]))
+        minute = pd.Timestamp.now(tz="UTC").floor("min")
+        stamp = msgpack.Timestamp.from_unix_nano(int(minute.value))
+        await ws.send(msgpack.packb([
+            {"T": "t", "S": "AAPL", "p": 100.0 + connection, "s": 5, "t": stamp, "i": connection, "x": "V", "z": "C", "c": []},
+            {"T": "b", "S": "AAPL", "o": 100.0, "h": 102.0, "l": 99.5, "c": 101.0, "v": 1200, "t": stamp, "n": 10, "vw": 100.8},
+        ], datetime=True))
+        if self.drop_first_connection and connection == 1:
+            await ws.close()
+            return
+        try:
+            await ws.wait_closed()
+        except Exception:
+            pass
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with serve(self._handler, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait(5)
+        return f"ws://127.0.0.1:{self.port}"
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(5)
+
+
+def test_feed_builds_closed_bars_only_inside_stream_coverage():
+    feed = MarketDataFeed(bar_grace_seconds=5)
+    origin = datetime(2026, 6, 2, 14, 0, tzinfo=timezone.utc)
+    assert feed.bars("AAPL", "15Min", origin, origin) is None
+
+    feed.covered_from = origin
+    for minute in list(range(0, 15)) + [15, 16]:
+        feed.on_bar("AAPL", origin + timedelta(minutes=minute), 10.0 + minute, 11.0 + minute, 9.0, 10.5 + minute, 100.0)
+
+    now = origin + timedelta(minutes=17, seconds=1)
+    bars = feed.bars("AAPL", "15Min", origin, now)
+    # 14:00 bucket has its last minute; 14:15 is still forming.
+    assert list(bars.index) == [pd.Timestamp(origin)]
+    assert bars.iloc[0]["open"] == 10.0
+    assert bars.iloc[0]["high"] == 25.0
+    assert bars.iloc[0]["close"] == 24.5
+    assert bars.iloc[0]["volume"] == 1500.0
+    assert len(feed.bars("AAPL", "1Min", origin, now)) == 17
+    assert feed.bars("AAPL", "15Min", origin - timedelta(minutes=15), now) is None
+
+
+def test_market_stream_feeds_prices_and_reconnects_against_fake_server(tmp_path):
+    server = FakeAlpacaDataServer(drop_first_connection=True)
+    url = server.start()
+    feed = MarketDataFeed(snapshot_path=str(tmp_path / "market_stream_prices.json"), snapshot_interval_seconds=0)
+    woken = []
+    feed.add_listener(lambda symbol, price: woken.append((symbol, price)))
+    stream = MarketDataStream(
+        "key",
+        "secret",
+        "iex",
+        logging.getLogger("test"),
+        on_trade=feed.on_trade,
+        on_bar=feed.on_bar,
+        on_connected=feed.on_connected,
+        url_override=url,
+    )
+    try:
+        stream.set_symbols(["aapl", "MSFT"])
+        assert _wait_for(lambda: feed.stats["connects"] >= 2 and feed.latest_price("AAPL") == 102.0)
+    finally:
+        stream.stop()
+        server.stop()
+
+    assert set(server.subscriptions[0]["trades"]) == {"AAPL", "MSFT"}
+    assert ("AAPL", 101.0) in woken
+    assert feed.covered_from is not None
+    assert feed.bars("AAPL", "1Min", feed.covered_from, datetime.now(timezone.utc) + timedelta(minutes=1)).iloc[-1]["close"] == 101.0
+    assert load_price_snapshot(str(tmp_path)) == {"AAPL": 102.0}
@@ -101,3 +101,68 @@ def test_fast_matches_reference_percent_trailing(trail_pct):
     ref = po.backtest(df.copy(), params, cfg, start, end)
     fast = po.backtest_fast(df.copy(), params, cfg, start, end)
     _assert_result_parity(ref, fast)
+
+
+def _window(df: pd.DataFrame):
+    start = df.index[0].to_pydatetime().replace(tzinfo=timezone.utc)
+    end = df.index[-1].to_pydatetime().replace(tzinfo=timezone.utc)
+    return start, end
+
+
+@pytest.mark.parametrize("seed", [1, 2, 7, 13, 42])
+@pytest.mark.parametrize("direction", ["Both", "Long Only", "Short Only"])
+def test_macd_sma_fast_matches_reference(seed, direction):
+    df = _make_bars(seed, n=2000)
+    cfg = _cfg()
+    params = _params(trade_direction=direction, macd_sma_length=100, fixed_stop_loss_pct=2.0, fixed_take_profit_pct=2.5,
+                     forced_stop_loss_pct=3.0, forced_take_profit_pct=4.0)
+    start, end = _window(df)
+    ref = po.backtest_macd_sma(df.copy(), params, cfg, start, end)
+    fast = po.backtest_macd_sma_fast(df.copy(), params, cfg, start, end)
+    _assert_result_parity(ref, fast)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 7, 13, 42])
+@pytest.mark.parametrize("direction", ["Both", "Long Only", "Short Only"])
+def test_rsi_fast_matches_reference(seed, direction):
+    df = _make_bars(seed, n=2000)
+    cfg = _cfg()
+    params = _params(trade_direction=direction, rsi_trend_length=50, rsi_oversold=20.0, rsi_overbought=80.0,
+                     fixed_stop_loss_pct=2.0, fixed_take_profit_pct=2.5, forced_stop_loss_pct=3.0, forced_take_profit_pct=4.0)
+    start, end = _window(df)
+    ref = po.backtest_rsi(df.copy(), params, cfg, start, end)
+    fast = po.backtest_rsi_fast(df.copy(), params, cfg, start, end)
+    _assert_result_parity(ref, fast)
+
+
+@pytest.mark.parametrize("seed", [3, 11])
+@pytest.mark.parametrize("stops", [(2.0, 2.5, 3.0, 4.0), (20.0, 20.0, 30.0, 30.0)])
+def test_signal_strategies_fast_match_reference_with_preclose(seed, stops):
+    # A 30-minute pre-close window lines up with the 30-minute bars, and wide
+    # stops leave room for the strategies' own signal exits.
+    df = _make_bars(seed, n=2000)
+    cfg = _cfg()
+    cfg.close_before_minutes = 30
+    fixed_sl, fixed_tp, forced_sl, forced_tp = stops
+    stop_params = dict(fixed_stop_loss_pct=fixed_sl, fixed_take_profit_pct=fixed_tp,
+                       forced_stop_loss_pct=forced_sl, forced_take_profit_pct=forced_tp)
+    start, end = _window(df)
+    reasons = set()
+    for ref_fn, fast_fn, params in (
+        (po.backtest_macd_sma, po.backtest_macd_sma_fast, _params(macd_sma_length=100, **stop_params)),
+        (po.backtest_rsi, po.backtest_rsi_fast, _params(rsi_trend_length=50, rsi_oversold=20.0, rsi_overbought=80.0, **stop_params)),
+    ):
+        ref = ref_fn(df.copy(), params, cfg, start, end)
+        fast = fast_fn(df.copy(), params, cfg, start, end)
+        _assert_result_parity(ref, fast)
+        reasons.update(t["reason"] for t in fast.trades)
+    assert {"MACD Market Close", "RSI Market Close"} <= reasons
+
+
+def test_run_strategy_backtest_dispatches_to_fast_paths(monkeypatch):
+    calls = []
+    monkeypatch.setattr(po, "backtest_macd_sma_fast", lambda *a: calls.append("macd_sma") or "macd")
+    monkeypatch.setattr(po, "backtest_rsi_fast", lambda *a: calls.append("rsi_reversion") or "rsi")
+    assert po.run_strategy_backtest("macd_sma", None, None, None, None, None) == "macd"
+    assert po.run_strategy_backtest("rsi_reversion", None, None, None, None, None) == "rsi"
+    assert calls == ["macd_sma", "rsi_reversion"]
@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_concurrent_misses_share_one_load_and_errors_are_not_cached():
+    cache = ResponseCache()
+    calls = []
+    gate = threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(2)
+        return ["AAPL"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("positions:a", 5, loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [["AAPL"]] * 8
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"]) == (1, 7)
+
+    def failing():
+        raise RuntimeError("rate limited")
+
+    with pytest.raises(RuntimeError):
+        cache.get("account:a", 5, failing)
+    assert cache.get("account:a", 5, lambda: {"equity": 1}) == {"equity": 1}
+
+
+def test_stale_entries_are_served_while_refreshing_and_lru_is_bounded():
+    cache = ResponseCache(max_entries=2, stale_sec=10)
+    assert cache.get("k", 0.01, lambda: 1) == 1
+    time.sleep(0.02)
+    refreshed = threading.Event()
+
+    def slow_refresh():
+        time.sleep(0.05)
+        refreshed.set()
+        return 2
+
+    started = time.monotonic()
+    assert cache.get("k", 0.01, slow_refresh) == 1
+    assert time.monotonic() - started < 0.04
+    assert refreshed.wait(2)
+    time.sleep(0.01)
+    assert cache.get("k", 60, lambda: 3) == 2
+
+    cache.get("a", 60, lambda: "a")
+    cache.get("b", 60, lambda: "b")
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("k", 60, lambda: "reloaded") == "reloaded"
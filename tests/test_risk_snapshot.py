@@ -0,0 +1,86 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from risk_snapshot import RiskSnapshotCache
+
+
+class FakeApi:
+    def __init__(self, symbols, equity=10000.0, buying_power=1000.0):
+        self.symbols = list(symbols)
+        self.equity = equity
+        self.buying_power = buying_power
+        self.calls = 0
+
+    def list_positions(self):
+        self.calls += 1
+        return [SimpleNamespace(symbol=symbol) for symbol in self.symbols]
+
+    def get_account(self):
+        return SimpleNamespace(equity=str(self.equity), buying_power=str(self.buying_power))
+
+
+def max_positions(limit):
+    def check(view):
+        if view.open_positions >= limit:
+            return False, 409, "max positions"
+        if view.buying_power is not None and view.buying_power < 400:
+            return False, 400, "buying power"
+        return True, 200, None
+    return check
+
+
+def test_reservations_count_against_positions_and_buying_power_without_refetching():
+    cache = RiskSnapshotCache(ttl_sec=60)
+    api = FakeApi(["AAPL"])
+
+    ok, _status, _error, first = cache.check_and_reserve("acct", api, "MSFT", 300, max_positions(3))
+    assert ok and first is not None
+    ok, _status, _error, second = cache.check_and_reserve("acct", api, "NVDA", 300, max_positions(3))
+    assert ok
+    assert api.calls == 1
+
+    # AAPL + two reservations fill the three slots; the rejection is re-checked once against Alpaca.
+    ok, status, _error, token = cache.check_and_reserve("acct", api, "TSLA", 300, max_positions(3))
+    assert (ok, status, token) == (False, 409, None)
+    assert api.calls == 2
+
+    cache.release("acct", first, submitted=False)
+    # 1000 buying power - 300 still reserved leaves 700.
+    ok, _status, _error, third = cache.check_and_reserve("acct", api, "TSLA", 300, max_positions(3))
+    assert ok
+    cache.release("acct", second, submitted=True)
+    cache.release("acct", third, submitted=True)
+    assert cache.stats()["reservations"] == 0
+
+    # Submitted orders are applied to the cached snapshot until the next refresh.
+    views = []
+    cache.check_and_reserve("acct", api, "AMD", 100, lambda view: views.append(view) or (True, 200, None))
+    assert (views[0].open_positions, views[0].buying_power) == (3, 400.0)
+    assert api.calls == 2
+
+
+def test_trade_update_fills_track_positions_between_refreshes():
+    cache = RiskSnapshotCache(ttl_sec=60)
+    api = FakeApi(["AAPL", "MSFT"])
+    cache.check_and_reserve("acct", api, "AAPL", 10, max_positions(10))
+
+    cache.on_trade_update("acct", SimpleNamespace(event="fill", symbol="AAPL", position_qty=0.0))
+    cache.on_trade_update("acct", SimpleNamespace(event="new", symbol="MSFT", position_qty=None))
+    views = []
+    cache.check_and_reserve("acct", api, "X", 10, lambda view: views.append(view.open_positions) or (True, 200, None))
+    # MSFT plus the still-reserved AAPL entry from the first check.
+    assert views == [2]
+    assert api.calls == 1
+
+
+def test_crypto_fills_match_positions_keyed_without_slash():
+    cache = RiskSnapshotCache(ttl_sec=60)
+    api = FakeApi(["BTCUSD", "AAPL"])
+    cache.check_and_reserve("acct", api, "AAPL", 10, max_positions(10))
+
+    cache.on_trade_update("acct", SimpleNamespace(event="fill", symbol="BTC/USD", position_qty=0.0))
+    cache.on_trade_update("acct", SimpleNamespace(event="fill", symbol="ETH/USD", position_qty=1.5))
+    assert cache._accounts["acct"].positions == {"AAPL", "ETHUSD"}
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 
@@ -35,3 +36,41 @@ def test_strategy_mode_for_symbol_aggregates_duplicate_rows():
     assert strategy_config.tradingview_allowed_for_symbol("AAPL", cfg) is False
     assert strategy_config.strategy_mode_for_symbol("MSFT", cfg) == "tw"
     assert strategy_config.strategy_mode_for_symbol("NVDA", cfg) == "disabled"
+
+
+def test_current_strategy_config_reloads_only_when_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "strategy_config.json"
+    monkeypatch.setattr(strategy_config, "STRATEGY_CONFIG_FILE", str(path))
+    strategy_config.save_strategy_config({
+        "enabled": True,
+        "universe": [
+            {"symbol": "aapl", "strategy": "keltner", "mode": "local"},
+            {"symbol": "AAPL", "strategy": "macd_sma", "mode": "tw"},
+            {"symbol": "MSFT", "strategy": "keltner", "mode": "local", "enabled": False},
+        ],
+    })
+    reads = []
+    original_read = strategy_config._read_strategy_config
+    monkeypatch.setattr(strategy_config, "_read_strategy_config", lambda: reads.append(1) or original_read())
+
+    first = strategy_config.current_strategy_config()
+    assert strategy_config.current_strategy_config() is first
+    assert len(reads) == 1
+    assert strategy_config.strategy_mode_for_symbol("AAPL", first.config) == "both"
+    assert strategy_config.strategy_mode_for_symbol("MSFT", first.config) == "disabled"
+    assert [e["strategy"] for e in strategy_config.strategy_entries_for_symbol("aapl", first.config)] == ["keltner", "macd_sma"]
+    assert strategy_config.strategy_entries_for_symbol("MSFT", first.config, enabled_only=True) == []
+    assert len(reads) == 1
+
+    # Another process rewriting the file is picked up through its stat key.
+    cfg = strategy_config.load_strategy_config()
+    cfg["universe"] = [{"symbol": "NVDA", "strategy": "rsi_reversion", "mode": "local"}]
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(cfg, fh)
+    second = strategy_config.current_strategy_config()
+    assert second is not first
+    assert strategy_config.local_allowed_for_symbol("NVDA", second.config) is True
+
+    # A half-written file keeps serving the last good snapshot.
+    path.write_text('{"enabled": tr', encoding="utf-8")
+    assert strategy_config.current_strategy_config() is second
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from strategy_jobs import JobSignal, StrategyJobStore
+
+
+def _job(job_id, status, created, symbol="AAPL", compute_target="remote"):
+    return {"id": job_id, "status": status, "compute_target": compute_target, "symbol": symbol,
+            "created_at_utc": created, "updated_at_utc": created, "config": {"symbol": symbol}}
+
+
+def test_claim_next_hands_out_each_queued_job_once_oldest_first(tmp_path):
+    store = StrategyJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.save(_job("b", "queued", "2024-01-02T00:00:00+00:00"))
+    store.save(_job("a", "queued", "2024-01-01T00:00:00+00:00"))
+    store.save(_job("c", "completed", "2023-12-31T00:00:00+00:00"))
+
+    claimed = []
+
+    def claim(worker):
+        while True:
+            job = store.claim_next(worker)
+            if job is None:
+                return
+            claimed.append(job)
+
+    threads = [threading.Thread(target=claim, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [job["id"] for job in claimed] == ["a", "b"]
+    stored = store.get("a")
+    assert stored["status"] == "running"
+    assert stored["worker"] == claimed[0]["worker"]
+    assert stored["started_at_utc"] == stored["updated_at_utc"]
+    assert stored["config"] == {"symbol": "AAPL"}
+    assert store.list(statuses=("queued",)) == []
+
+
+def test_list_filters_and_legacy_files_are_imported_once(tmp_path):
+    jobs_dir = tmp_path / "strategy_jobs"
+    jobs_dir.mkdir()
+    (jobs_dir / "old1.json").write_text(json.dumps(_job("old1", "completed", "2024-01-01T00:00:00+00:00")))
+    (jobs_dir / "old2.json").write_text(json.dumps(_job("old2", "running", "2024-01-03T00:00:00+00:00", compute_target="local")))
+    (jobs_dir / "old1_report.json").write_text("{}")
+
+    store = StrategyJobStore(str(tmp_path / "jobs.sqlite3"), legacy_dir=str(jobs_dir))
+    store.save(_job("new", "queued", "2024-01-02T00:00:00+00:00", symbol="MSFT"))
+
+    assert [job["id"] for job in store.list(limit=10)] == ["old2", "new", "old1"]
+    assert [job["id"] for job in store.list(limit=10, statuses=("queued", "running"), compute_target="remote")] == ["new"]
+    assert sorted(os.listdir(jobs_dir)) == ["old1.json.migrated", "old1_report.json", "old2.json.migrated"]
+
+    assert store.delete("old1")
+    assert not store.delete("old1")
+    store.close()
+    assert [job["id"] for job in StrategyJobStore(str(tmp_path / "jobs.sqlite3"), legacy_dir=str(jobs_dir)).list()] == ["old2", "new"]
+
+
+def test_job_signal_wakes_waiter_and_worker_registry_tracks_liveness(tmp_path):
+    signal = JobSignal()
+    seen = signal.generation
+    assert not signal.wait(seen, 0.01)
+    woke = []
+    waiter = threading.Thread(target=lambda: woke.append(signal.wait(seen, 5)))
+    waiter.start()
+    signal.notify()
+    waiter.join(5)
+    assert woke == [True]
+    # A notify that lands before the wait starts is not lost.
+    assert signal.wait(seen, 0)
+
+    store = StrategyJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.record_worker("pc-1", "waiting", info={"host": "pc", "slots": 2})
+    store.record_worker("pc-1", "busy", job_id="a")
+    store.record_worker("pc-2", "stopped")
+    workers = {item["worker"]: item for item in store.workers(live_sec=60)}
+    assert (workers["pc-1"]["status"], workers["pc-1"]["job_id"], workers["pc-1"]["live"]) == ("busy", "a", True)
+    assert workers["pc-1"]["info"] == {"host": "pc", "slots": 2}
+    assert workers["pc-2"]["live"] is False
+    assert [item["live"] for item in store.workers(live_sec=-1)] == [False, False]
@@ -266,3 +266,189 @@ def test_record_closed_trade_skips_when_no_open_trade(app, monkeypatch):
         }
         assert trade_db.record_closed_trade(close_data, {'symbol': 'AAPL', 'action': 'sell'}, user.id, position_obj) is None
         assert Trade.query.count() == 0
+
+
+def test_trade_stats_cache_tracks_records_and_external_changes(app, monkeypatch, tmp_path):
+    from datetime import timedelta
+    from sqlalchemy import event
+    from trade_stats import TradeStatsCache
+
+    cache = TradeStatsCache()
+    cache.configure(str(tmp_path))
+    monkeypatch.setattr(trade_db, 'trade_stats', cache)
+    now = datetime.now(timezone.utc)
+    day_start, day_end = now - timedelta(hours=1), now + timedelta(hours=1)
+
+    with app.app_context():
+        user = User(username='tester', email='tester@example.com', password_hash='hashed')
+        db.session.add(user)
+        db.session.add(Trade(user_id=1, trade_id='old', symbol='AAPL', side='buy', qty=1, open_price=10, status='closed',
+                             open_time=now - timedelta(days=3), close_time=now - timedelta(days=3), profit_loss=5.0))
+        db.session.commit()
+        user_id = user.id
+        index_names = {index.name for index in Trade.__table__.indexes}
+        assert {'ix_trade_user_symbol_status_close', 'ix_trade_user_symbol_open_time'} <= index_names
+
+        assert cache.daily(user_id, 'AAPL', day_start, day_end).opened == 0
+        assert cache.recent_closed(user_id, 'AAPL', 5) == [(now - timedelta(days=3), 5.0)]
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        trade_db.record_open_trade({'order_id': '1', 'side': 'buy', 'qty': 10, 'price': 100}, {'symbol': 'AAPL', 'action': 'buy'}, user_id)
+
+        class MockAPI(SimpleNamespace):
+            def get_order(self, order_id):
+                return SimpleNamespace(status='filled', filled_avg_price=95, filled_at=now)
+
+        monkeypatch.setattr(trade_db, 'get_api_for_user', lambda user_id: MockAPI())
+        position = SimpleNamespace(avg_entry_price=100, qty=10, side='long')
+        trade_db.record_closed_trade({'close_order_id': 'c1'}, {'symbol': 'AAPL', 'action': 'sell'}, user_id, position)
+
+        statements.clear()
+        stats = cache.daily(user_id, 'AAPL', day_start, day_end)
+        recent = cache.recent_closed(user_id, 'AAPL', 5)
+        assert statements == []
+        assert (stats.opened, stats.losses) == (1, [-50.0])
+        assert [pl for _ts, pl in recent] == [-50.0, 5.0]
+
+        # A trade recorded by another process only shows up through the marker file.
+        db.session.add(Trade(user_id=user_id, trade_id='ext', symbol='AAPL', side='buy', qty=1, open_price=10, open_time=now))
+        db.session.commit()
+        other = TradeStatsCache()
+        other.configure(str(tmp_path))
+        other.note_open(user_id, 'AAPL', now)
+        assert cache.daily(user_id, 'AAPL', day_start, day_end).opened == 2
+
+        # A local bump right after a foreign one must not mark the foreign change as seen.
+        db.session.add(Trade(user_id=user_id, trade_id='ext2', symbol='AAPL', side='buy', qty=1, open_price=10, open_time=now))
+        db.session.commit()
+        other.note_open(user_id, 'AAPL', now)
+        cache.invalidate(user_id, 'MSFT')
+        assert cache.daily(user_id, 'AAPL', day_start, day_end).opened == 3
+
+
+def test_wait_for_order_fill_wakes_on_trade_update_and_backs_off_without_stream(monkeypatch):
+    filled_at = datetime(2023, 1, 4, tzinfo=timezone.utc)
+    calls = []
+
+    class PendingAPI(SimpleNamespace):
+        def get_order(self, order_id):
+            calls.append(order_id)
+            return SimpleNamespace(status='new', filled_avg_price=None, filled_at=None)
+
+    class FakeHub:
+        ready = True
+
+        def is_ready(self, api_key, base_url):
+            return self.ready
+
+        def wait_for_order(self, api_key, api_secret, base_url, order_id, timeout_sec=15.0):
+            assert self.ready, "waited on a stream that is not running"
+            return SimpleNamespace(event='fill', filled_avg_price=101.5, timestamp=filled_at)
+
+    sleeps = []
+    monkeypatch.setattr(trade_db.time, 'sleep', sleeps.append)
+    hub = FakeHub()
+    monkeypatch.setattr(trade_db, 'TRADE_UPDATES', hub)
+    api = PendingAPI(api_key='key', api_secret='secret')
+    assert trade_db.wait_for_order_fill(api, 'c1', 'AAPL') == (101.5, filled_at)
+    assert calls == ['c1']
+    assert sleeps == []
+
+    calls.clear()
+    assert trade_db.wait_for_order_fill(PendingAPI(), 'c2', 'AAPL', timeout_sec=10) == (None, None)
+    assert sleeps == [0.25, 0.5, 1.0, 2.0, 4.0, 2.25]
+    assert len(calls) == len(sleeps) + 1
+
+    # Keys but no running stream in this process: REST backoff only.
+    hub.ready = False
+    sleeps.clear()
+    assert trade_db.wait_for_order_fill(api, 'c3', 'AAPL', timeout_sec=1) == (None, None)
+    assert sleeps == [0.25, 0.5, 0.25]
+
+
+def test_trade_db_and_bot_share_one_trade_updates_hub():
+    import alpaca_clients
+    import bot
+
+    assert trade_db.TRADE_UPDATES is alpaca_clients.trade_updates
+    assert bot.TRADE_UPDATES is alpaca_clients.trade_updates
+
+
+def test_record_closed_trades_commits_once(app):
+    from sqlalchemy import event
+
+    with app.app_context():
+        user = User(username='bulk', email='bulk@example.com', password_hash='hashed')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        for symbol in ('AAPL', 'MSFT'):
+            trade_db.record_open_trade({'order_id': symbol, 'side': 'buy', 'qty': 2, 'price': 100}, {'symbol': symbol, 'action': 'buy'}, user_id)
+
+        commits = []
+        event.listen(db.session, 'after_commit', lambda session: commits.append(1))
+        position = SimpleNamespace(avg_entry_price=100, qty=2, side='long')
+        closes = [
+            {'user_id': user_id, 'symbol': 'AAPL', 'payload': {'action': 'close'}, 'position_obj': position, 'close_price': 110,
+             'close_time': datetime(2024, 1, 2, tzinfo=timezone.utc)},
+            {'user_id': user_id, 'symbol': 'MSFT', 'payload': {'action': 'close'}, 'position_obj': position, 'close_price': 95,
+             'close_time': None},
+            {'user_id': user_id, 'symbol': 'TSLA', 'payload': {'action': 'close'}, 'position_obj': position, 'close_price': 10,
+             'close_time': None},
+        ]
+        results = trade_db.record_closed_trades(closes)
+        assert len(commits) == 1
+        assert [t.profit_loss if t else None for t in results] == [20, -10, None]
+        assert Trade.query.filter_by(status='closed').count() == 2
+
+
+def test_record_closed_trades_prices_shared_closes_from_each_users_open_trade(app):
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@example.com', password_hash='hashed') for name in ('primary', 'linked')]
+        db.session.add_all(users)
+        db.session.commit()
+        primary_id, linked_id = (user.id for user in users)
+        trade_db.record_open_trade({'order_id': 'p1', 'side': 'buy', 'qty': 3, 'price': 100}, {'symbol': 'AAPL', 'action': 'buy'}, primary_id)
+        trade_db.record_open_trade({'order_id': 'l1', 'side': 'buy', 'qty': 7, 'price': 110}, {'symbol': 'AAPL', 'action': 'buy'}, linked_id)
+
+        # One close order covered the shared account position (3 + 7 shares);
+        # close_positions hands back no position_obj for either user.
+        close_time = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        primary, linked = trade_db.record_closed_trades([
+            {'user_id': primary_id, 'symbol': 'AAPL', 'payload': {'action': 'close'}, 'position_obj': None,
+             'close_price': 120, 'close_time': close_time},
+            {'user_id': linked_id, 'symbol': 'AAPL', 'payload': {'action': 'close'}, 'position_obj': None,
+             'close_price': 120, 'close_time': close_time},
+        ])
+        assert (primary.qty, primary.profit_loss) == (3, 60)
+        assert (linked.qty, linked.open_price, linked.side) == (7, 110, 'buy')
+        assert linked.profit_loss == 70
+        assert round(linked.profit_loss_pct, 4) == round(70 / 770 * 100, 4)
+
+
+def test_bulk_close_fill_waits_open_no_trade_update_streams():
+    from alpaca_clients import trade_updates
+    from bulk_close import close_positions
+
+    filled_at = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    class AccountAPI(SimpleNamespace):
+        def get_position(self, symbol):
+            return SimpleNamespace(symbol=symbol, qty=1, avg_entry_price=100, current_price=99, side='long')
+
+        def close_position(self, symbol):
+            return SimpleNamespace(id=f'{self.api_key}-{symbol}')
+
+        def get_order(self, order_id):
+            return SimpleNamespace(status='filled', filled_avg_price=101.0, filled_at=filled_at)
+
+    targets = [
+        {'user_id': i, 'username': f'u{i}', 'symbol': 'AAPL', 'api': AccountAPI(api_key=f'key{i}', api_secret='s'),
+         'account_key': f'key{i}'}
+        for i in range(3)
+    ]
+    runners_before = set(trade_updates._runners)
+    results = close_positions(targets, trade_db.wait_for_order_fill, min_interval_sec=0)
+    assert [r['status'] for r in results] == ['closed'] * 3
+    assert set(trade_updates._runners) == runners_before
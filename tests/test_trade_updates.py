@@ -0,0 +1,66 @@
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from alpaca_api import TradeUpdateEvent, TradeUpdatesHub, _TradeUpdatesRunner
+
+
+class FakeRest:
+    def __init__(self, orders):
+        self.orders = orders
+        self.filters = []
+
+    def get_orders(self, filter=None):
+        self.filters.append(filter)
+        return self.orders
+
+
+def test_backfill_after_connect_wakes_waiters_and_marks_stream_ready():
+    filled_at = datetime(2024, 1, 2, 15, 30, tzinfo=timezone.utc)
+    seen = []
+    runner = _TradeUpdatesRunner("key", "secret", "https://paper-api.alpaca.markets", logging.getLogger("test"), on_event=seen.append)
+    runner.start = lambda: None
+    runner._rest = FakeRest([
+        SimpleNamespace(id="o1", status=SimpleNamespace(value="filled"), filled_avg_price="101.25", filled_qty="3",
+                        filled_at=filled_at, symbol="AAPL", side=SimpleNamespace(value="buy")),
+        SimpleNamespace(id="o2", status="accepted", filled_avg_price=None, filled_qty="0", symbol="MSFT", side="buy"),
+        SimpleNamespace(id="o3", status="canceled", filled_avg_price=None, filled_qty="0", canceled_at=filled_at,
+                        symbol="TSLA", side="sell"),
+    ])
+    # o3's cancel already came over the stream; backfill must not replay it.
+    runner._record(TradeUpdateEvent(order_id="o3", event="canceled", status="canceled", timestamp=filled_at, price=None, qty=None))
+    seen.clear()
+    assert not runner.ready
+
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(event=runner.wait_for_terminal_event("o1", timeout_sec=5)))
+    waiter.start()
+    runner._on_connected()
+    waiter.join(5)
+
+    assert runner.wait_ready(5)
+    event = result["event"]
+    assert (event.event, event.filled_avg_price, event.qty, event.symbol, event.side) == ("fill", 101.25, 3.0, "AAPL", "buy")
+    assert [item.order_id for item in seen] == ["o1"]
+    assert runner.backfilled == 1 and runner.connects == 1
+    assert runner._rest.filters[0].nested is False
+
+    runner._on_disconnected()
+    assert not runner.ready
+
+
+def test_hub_warm_up_starts_each_account_once(monkeypatch):
+    hub = TradeUpdatesHub(logger=logging.getLogger("test"))
+    started = []
+    monkeypatch.setattr(_TradeUpdatesRunner, "start", lambda self: started.append(self.api_key))
+    accounts = [("k1", "s1", "https://paper-api.alpaca.markets"), ("k2", "s2", "https://paper-api.alpaca.markets")]
+    assert hub.warm_up(accounts) == 2
+    assert hub.warm_up(accounts) == 0
+    assert started == ["k1", "k2", "k1", "k2"]
+    assert [item["ready"] for item in hub.readiness()] == [False, False]
+    assert not hub.is_ready("k1", "https://paper-api.alpaca.markets")
@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from webhook_queue import TERMINAL_STATUSES, WebhookQueue, WebhookWorkerPool
+
+
+def test_enqueue_deduplicates_within_window_and_claims_once(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    job_id, created = queue.enqueue({"symbol": "AAPL"}, dedup_key="tv:AAPL:buy", dedup_window_sec=8)
+    assert created
+    assert queue.enqueue({"symbol": "AAPL"}, dedup_key="tv:AAPL:buy", dedup_window_sec=8) == (job_id, False)
+    assert queue.enqueue({"symbol": "AAPL"}, dedup_key="tv:AAPL:buy", dedup_window_sec=0)[1]
+    assert queue.pending() == 2
+
+    claimed = []
+
+    def claim():
+        while True:
+            job = queue.claim("1:test")
+            if job is None:
+                return
+            claimed.append(job[0])
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == len(set(claimed)) == 2
+    assert claimed[0] == job_id
+
+    queue.finish(job_id, "done", 200, {"success_count": 1})
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["response"] == {"success_count": 1}
+    assert job["queue_ms"] is not None and job["run_ms"] is not None
+    assert queue.get("missing") is None
+
+
+def test_running_jobs_of_dead_workers_are_marked_interrupted(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    job_id, _ = queue.enqueue({"symbol": "MSFT"})
+    queue.claim(f"{os.getpid()}:webhook-worker-0")
+    assert queue.mark_interrupted() == 1
+    assert queue.get(job_id)["status"] == "interrupted"
+
+
+def test_worker_pool_runs_jobs_and_stores_outcome(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    pool = WebhookWorkerPool(
+        queue,
+        lambda payload: ({"symbol": payload["symbol"]}, 403 if payload["symbol"] == "BAD" else 200),
+        workers=2,
+        idle_poll_sec=0.05,
+    )
+    pool.start()
+    try:
+        ok_id, _ = queue.enqueue({"symbol": "AAPL"})
+        bad_id, _ = queue.enqueue({"symbol": "BAD"})
+        pool.notify()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(
+            queue.get(job_id)["status"] not in TERMINAL_STATUSES for job_id in (ok_id, bad_id)
+        ):
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+    assert queue.get(ok_id)["status"] == "done"
+    assert queue.get(bad_id)["status"] == "failed"
+    assert queue.get(bad_id)["http_status"] == 403
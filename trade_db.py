@@ -4,16 +4,24 @@ from models import db, Trade, User
 import os
 from dotenv import load_dotenv
 import time
+from types import SimpleNamespace
 import logging
 from sqlalchemy import inspect, text
-from alpaca_api import AlpacaAPIError, LegacyCompatibleAlpacaClient
-from utils import decrypt_data
+from alpaca_api import AlpacaAPIError, TERMINAL_ORDER_EVENTS
+from alpaca_clients import alpaca_clients, trade_updates as TRADE_UPDATES
+from trade_stats import trade_stats
 
 ENV_PATH = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(ENV_PATH)
 BASE_URL = os.getenv("ALPACA_API_BASE_URL", "https://paper-api.alpaca.markets")
 
+FILL_WAIT_TIMEOUT_SEC = float(os.getenv("FILL_WAIT_TIMEOUT_SEC", "30"))
+FILL_POLL_INITIAL_SEC = 0.25
+FILL_POLL_MAX_SEC = 4.0
+TERMINAL_ORDER_STATUSES = {'filled', 'partially_filled', 'canceled', 'rejected', 'expired'}
+
 logger = logging.getLogger(__name__)
+_TRADE_INDEXES_READY = False
 
 
 def ensure_trade_table_columns():
@@ -31,6 +39,19 @@ def ensure_trade_table_columns():
             db.session.commit()
     except Exception as e:
         logger.warning("[DATABASE] Could not ensure trade metadata columns: %s", e)
+    ensure_trade_indexes()
+
+def ensure_trade_indexes():
+    """Create the Trade indexes on databases created before they existed."""
+    global _TRADE_INDEXES_READY
+    if _TRADE_INDEXES_READY:
+        return
+    try:
+        for index in Trade.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+        _TRADE_INDEXES_READY = True
+    except Exception as e:
+        logger.warning("[DATABASE] Could not ensure trade indexes: %s", e)
 
 def parse_datetime_utc(value):
     if isinstance(value, datetime):
@@ -67,13 +88,63 @@ def get_api_for_user(user_id):
     if not user:
         raise ValueError(f"User with ID {user_id} not found.")
     
-    api_key = decrypt_data(user.encrypted_alpaca_key)
-    api_secret = decrypt_data(user.encrypted_alpaca_secret)
-    
-    if not api_key or not api_secret:
+    api = alpaca_clients.client_for_user(user, BASE_URL)
+    if api is None:
         raise ValueError(f"Alpaca credentials not configured for user {user.username}.")
-        
-    return LegacyCompatibleAlpacaClient(api_key, api_secret, BASE_URL)
+    return api
+
+def wait_for_order_fill(api, order_id, symbol='', timeout_sec=None):
+    """Return ``(fill_price, fill_time)`` once ``order_id`` fills, else ``(None, None)``.
+
+    Waits on the account's trade-updates stream when this process already
+    has it running, and re-checks the order over REST with exponential
+    backoff in case the stream is down or missed it. A process without a
+    running stream (the dashboard) only polls REST: a one-off fill check must
+    not open a socket that would take the account's connection slot.
+    """
+    if not order_id:
+        return None, None
+    timeout_sec = FILL_WAIT_TIMEOUT_SEC if timeout_sec is None else timeout_sec
+    api_key = getattr(api, 'api_key', None)
+    api_secret = getattr(api, 'api_secret', None)
+    use_stream = isinstance(api_key, str) and isinstance(api_secret, str) and api_key and api_secret
+    waited = 0.0
+    delay = FILL_POLL_INITIAL_SEC
+    exit_order = None
+    while True:
+        try:
+            exit_order = api.get_order(order_id)
+            if (exit_order.status or '').lower() in TERMINAL_ORDER_STATUSES:
+                logger.info(f"Close order {order_id} for {symbol} confirmed as '{exit_order.status}'.")
+                break
+        except Exception as e:
+            logger.error(f"Error fetching close order {order_id}: {e}")
+        if waited >= timeout_sec:
+            break
+        step = min(delay, timeout_sec - waited)
+        if use_stream and TRADE_UPDATES.is_ready(api_key, BASE_URL):
+            try:
+                update = TRADE_UPDATES.wait_for_order(api_key, api_secret, BASE_URL, str(order_id), timeout_sec=step)
+            except Exception as e:
+                logger.warning(f"[ALPACA_STREAM] Could not wait for order {order_id}: {e}")
+                update = None
+                time.sleep(step)
+            if update and update.event == 'fill' and update.filled_avg_price is not None:
+                logger.info(f"Close order {order_id} for {symbol} filled (trade update).")
+                return update.filled_avg_price, parse_datetime_utc(update.timestamp) or datetime.now(timezone.utc)
+            if update and update.event in TERMINAL_ORDER_EVENTS:
+                # Terminal but not a clean fill: confirm the final state over REST right away.
+                waited = timeout_sec
+                continue
+        else:
+            time.sleep(step)
+        waited += step
+        delay = min(delay * 2, FILL_POLL_MAX_SEC)
+        logger.warning(f"Waiting for close order {order_id} to fill... waited {waited:.2f}s/{timeout_sec:.0f}s")
+    if exit_order and exit_order.status in ['filled', 'partially_filled']:
+        fill_price = float(exit_order.filled_avg_price) if exit_order.filled_avg_price else None
+        return fill_price, parse_datetime_utc(exit_order.filled_at)
+    return None, None
 
 def record_open_trade(data, payload, user_id):
     ensure_trade_table_columns()
@@ -113,6 +184,7 @@ def record_open_trade(data, payload, user_id):
         )
         db.session.add(t)
         db.session.commit()
+        trade_stats.note_open(user_id, symbol, t.open_time)
         logger.info(f"[DATABASE] Open trade recorded for user_id={user_id}, symbol={symbol}, qty={qty}")
         return t
     else:
@@ -130,6 +202,7 @@ def record_closed_trade(data, payload, user_id, position_obj):
         logger.error(f"[DATABASE] Cannot record closed trade for {symbol}, user_id={user_id}: No pre-close position data available.")
         Trade.query.filter_by(symbol=symbol, status='open', user_id=user_id).delete()
         db.session.commit()
+        trade_stats.invalidate(user_id, symbol)
         logger.info(f"[DATABASE] Cleaned up orphaned open trades for {symbol}, user_id={user_id}.")
         return None
 
@@ -139,15 +212,7 @@ def record_closed_trade(data, payload, user_id, position_obj):
         logger.error(f"[API_FAIL] Failed to get API client for user {user_id}: {e}")
         return None
         
-    avg_entry_price = float(position_obj.avg_entry_price)
-    total_qty = abs(float(position_obj.qty))
-    side_raw = str(position_obj.side).lower() if position_obj.side is not None else ""
-    if side_raw in ("long", "buy"):
-        position_side = "long"
-    elif side_raw in ("short", "sell"):
-        position_side = "short"
-    else:
-        position_side = "long"
+    avg_entry_price, total_qty, position_side = _position_terms(position_obj)
     api_symbol = symbol.replace('/', '')
 
     close_price = None
@@ -155,28 +220,6 @@ def record_closed_trade(data, payload, user_id, position_obj):
     close_price_override = data.get('close_price')
     close_time_override = data.get('close_time')
 
-    def poll_order_fill(order_id):
-        if not order_id:
-            return None, None
-        terminal_statuses = {'filled', 'partially_filled', 'canceled', 'rejected', 'expired'}
-        exit_order = None
-        for i in range(30):
-            try:
-                exit_order = api.get_order(order_id)
-                status = (exit_order.status or '').lower()
-                if status in terminal_statuses:
-                    logger.info(f"Close order {order_id} for {symbol} confirmed as '{exit_order.status}'.")
-                    break
-                logger.warning(f"Waiting for close order {order_id} to fill... Status: '{exit_order.status}'. Attempt {i+1}/30")
-                time.sleep(1)
-            except Exception as e:
-                logger.error(f"Error fetching close order {order_id}: {e}")
-                time.sleep(1)
-        if exit_order and exit_order.status in ['filled', 'partially_filled']:
-            fill_price = float(exit_order.filled_avg_price) if exit_order.filled_avg_price else None
-            return fill_price, parse_datetime_utc(exit_order.filled_at)
-        return None, None
-
     def position_is_still_open():
         try:
             api.get_position(api_symbol)
@@ -196,7 +239,7 @@ def record_closed_trade(data, payload, user_id, position_obj):
         close_price_source = str(data.get('close_price_source', '') or '').lower()
         close_price_authoritative = bool(data.get('close_price_authoritative', True))
         if close_order_id and (not close_price_authoritative or close_price_source.endswith('fallback')):
-            polled_price, polled_time = poll_order_fill(close_order_id)
+            polled_price, polled_time = wait_for_order_fill(api, close_order_id, symbol)
             if polled_price is not None:
                 close_price = polled_price
                 close_time = polled_time or close_time
@@ -223,7 +266,7 @@ def record_closed_trade(data, payload, user_id, position_obj):
             logger.error(f"[DATABASE] Cannot record closed trade for {symbol}: No close_order_id was provided.")
             return None
 
-        close_price, close_time = poll_order_fill(close_order_id)
+        close_price, close_time = wait_for_order_fill(api, close_order_id, symbol)
         if close_price is not None:
             pass
         else:
@@ -257,6 +300,61 @@ def record_closed_trade(data, payload, user_id, position_obj):
         if close_price is None:
             close_price = avg_entry_price
 
+    trade_to_update = _close_open_trade(user_id, symbol, payload, position_obj, close_price, close_time)
+    if not trade_to_update:
+        return None
+    pl = trade_to_update.profit_loss
+    db.session.commit()
+    trade_stats.note_close(user_id, symbol, close_time, pl)
+    logger.info(f"[DATABASE] Closed position for user_id={user_id}, symbol={symbol} with P/L={pl:.2f}")
+    return trade_to_update
+
+
+def record_closed_trades(closes):
+    """Record several already-priced closes in one transaction.
+
+    ``closes`` holds dicts with ``user_id``, ``symbol``, ``payload``,
+    ``position_obj``, ``close_price`` and ``close_time``; a ``position_obj``
+    of None prices the close from the open Trade row itself. Returns the
+    updated Trade (or None when no open row matched) for each entry, in order.
+    """
+    ensure_trade_table_columns()
+    results = []
+    notes = []
+    for item in closes:
+        symbol = str(item.get('symbol') or '').replace('/', '')
+        trade = None
+        if symbol and item.get('close_price') is not None:
+            close_time = parse_datetime_utc(item.get('close_time')) or datetime.now(timezone.utc)
+            trade = _close_open_trade(item['user_id'], symbol, item.get('payload') or {}, item.get('position_obj'), float(item['close_price']), close_time)
+            if trade is not None:
+                notes.append((item['user_id'], symbol, close_time, trade.profit_loss))
+        results.append(trade)
+    db.session.commit()
+    for user_id, symbol, close_time, pl in notes:
+        trade_stats.note_close(user_id, symbol, close_time, pl)
+    logger.info(f"[DATABASE] Recorded {len(notes)}/{len(results)} closes in one transaction.")
+    return results
+
+
+def _position_terms(position_obj):
+    avg_entry_price = float(position_obj.avg_entry_price)
+    total_qty = abs(float(position_obj.qty))
+    side_raw = str(position_obj.side).lower() if position_obj.side is not None else ""
+    if side_raw in ("long", "buy"):
+        position_side = "long"
+    elif side_raw in ("short", "sell"):
+        position_side = "short"
+    else:
+        position_side = "long"
+    return avg_entry_price, total_qty, position_side
+
+
+def _close_open_trade(user_id, symbol, payload, position_obj, close_price, close_time):
+    """Mark the newest open row for (user, symbol) closed; the caller commits.
+
+    Without a ``position_obj`` the row's own qty, open price and side are used.
+    """
     trade_to_update = Trade.query.filter_by(symbol=symbol, status='open', user_id=user_id).order_by(Trade.open_time.desc()).first()
     
     if not trade_to_update:
@@ -266,6 +364,15 @@ def record_closed_trade(data, payload, user_id, position_obj):
         )
         return None
 
+    if position_obj is None:
+        side_raw = (trade_to_update.side or "").lower()
+        position_obj = SimpleNamespace(
+            avg_entry_price=trade_to_update.open_price,
+            qty=trade_to_update.qty,
+            side="short" if "short" in side_raw or side_raw == "sell" else "long",
+        )
+    avg_entry_price, total_qty, position_side = _position_terms(position_obj)
+
     pl = (close_price - avg_entry_price) * total_qty if position_side == 'long' else (avg_entry_price - close_price) * total_qty
     pl_pct = (pl / (avg_entry_price * total_qty)) * 100 if avg_entry_price > 0 and total_qty > 0 else 0
 
@@ -289,6 +396,4 @@ def record_closed_trade(data, payload, user_id, position_obj):
         or None
     )
 
-    db.session.commit()
-    logger.info(f"[DATABASE] Closed position for user_id={user_id}, symbol={symbol} with P/L={pl:.2f}")
     return trade_to_update
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Per-(user, symbol) trade statistics for the entry guards.
+
+The local strategy engine checks a daily guard (trades opened today, losses
+today) and a killswitch (P/L of the most recent closed trades) for every entry
+candidate. ``TradeStatsCache`` loads those numbers once per (user, symbol)
+with indexed ``Trade`` queries and then keeps them current incrementally:
+``trade_db.record_open_trade``/``record_closed_trade`` call ``note_open``/
+``note_close`` right after they commit.
+
+Trades are recorded by the dashboard process while the engine runs in the bot
+process, so every change also appends one byte to
+``instance/trade_stats.version``; its size is a version counter that only
+grows. A process that sees the counter move past what it wrote itself drops
+its cached entries and reloads them on next use; a single ``os.stat`` per
+lookup replaces the per-candidate queries.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from models import Trade
+
+
+MARKER_FILENAME = "trade_stats.version"
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class DailySymbolStats:
+    __slots__ = ("day_start", "day_end", "opened", "losses")
+
+    def __init__(self, day_start: datetime, day_end: datetime, opened: int, losses: List[float]):
+        self.day_start = day_start
+        self.day_end = day_end
+        self.opened = opened
+        self.losses = losses
+
+
+class TradeStatsCache:
+    def __init__(self, marker_path: Optional[str] = None):
+        self.marker_path = marker_path
+        self._lock = threading.Lock()
+        self._daily: Dict[Tuple[int, str], DailySymbolStats] = {}
+        # (user_id, symbol) -> (limit loaded, [(close_time, pl)] newest first)
+        self._recent: Dict[Tuple[int, str], Tuple[int, List[Tuple[datetime, float]]]] = {}
+        self._marker_seen: Optional[int] = None
+
+    def configure(self, instance_path: str) -> None:
+        self.marker_path = os.path.join(instance_path, MARKER_FILENAME)
+        self._marker_seen = self._marker_version()
+
+    # -- reads -------------------------------------------------------------------
+    def daily(self, user_id: int, symbol: str, day_start: datetime, day_end: datetime) -> DailySymbolStats:
+        """Trades opened and losses closed in ``[day_start, day_end)``."""
+        key = (user_id, symbol)
+        self._sync_marker()
+        with self._lock:
+            stats = self._daily.get(key)
+            if stats is not None and stats.day_start == day_start and stats.day_end == day_end:
+                return DailySymbolStats(day_start, day_end, stats.opened, list(stats.losses))
+        opened = (
+            Trade.query
+            .filter(
+                Trade.user_id == user_id,
+                Trade.symbol == symbol,
+                Trade.open_time >= day_start,
+                Trade.open_time < day_end,
+            )
+            .count()
+        )
+        rows = (
+            Trade.query
+            .with_entities(Trade.profit_loss)
+            .filter(
+                Trade.user_id == user_id,
+                Trade.symbol == symbol,
+                Trade.status == "closed",
+                Trade.close_time >= day_start,
+                Trade.close_time < day_end,
+                Trade.profit_loss < 0,
+            )
+            .all()
+        )
+        stats = DailySymbolStats(day_start, day_end, opened, [float(pl) for (pl,) in rows])
+        with self._lock:
+            self._daily[key] = stats
+        return DailySymbolStats(day_start, day_end, stats.opened, list(stats.losses))
+
+    def recent_closed(self, user_id: int, symbol: str, limit: int) -> List[Tuple[datetime, float]]:
+        """The ``limit`` most recently closed trades as ``(close_time, pl)``, newest first."""
+        key = (user_id, symbol)
+        self._sync_marker()
+        with self._lock:
+            cached = self._recent.get(key)
+            if cached is not None and cached[0] >= limit:
+                return cached[1][:limit]
+        rows = (
+            Trade.query
+            .with_entities(Trade.close_time, Trade.profit_loss)
+            .filter(
+                Trade.user_id == user_id,
+                Trade.symbol == symbol,
+                Trade.status == "closed",
+                Trade.close_time.isnot(None),
+            )
+            .order_by(Trade.close_time.desc())
+            .limit(limit)
+            .all()
+        )
+        items = [(_as_utc(close_time), float(pl or 0.0)) for close_time, pl in rows]
+        with self._lock:
+            self._recent[key] = (limit, items)
+        return items[:limit]
+
+    # -- incremental updates ------------------------------------------------------
+    def note_open(self, user_id: int, symbol: str, open_time: Optional[datetime]) -> None:
+        open_time = _as_utc(open_time)
+        with self._lock:
+            stats = self._daily.get((user_id, symbol))
+            if stats is not None and open_time is not None and stats.day_start <= open_time < stats.day_end:
+                stats.opened += 1
+        self._bump_marker()
+
+    def note_close(self, user_id: int, symbol: str, close_time: Optional[datetime], pl: float) -> None:
+        close_time = _as_utc(close_time)
+        pl = float(pl or 0.0)
+        with self._lock:
+            stats = self._daily.get((user_id, symbol))
+            if stats is not None and close_time is not None and pl < 0 and stats.day_start <= close_time < stats.day_end:
+                stats.losses.append(pl)
+            cached = self._recent.get((user_id, symbol))
+            if cached is not None and close_time is not None:
+                limit, items = cached
+                # items are newest first; bisect over negated timestamps.
+                keys = [-ts.timestamp() for ts, _pl in items]
+                items.insert(bisect.bisect_right(keys, -close_time.timestamp()), (close_time, pl))
+                del items[limit:]
+        self._bump_marker()
+
+    def invalidate(self, user_id: Optional[int] = None, symbol: Optional[str] = None) -> None:
+        with self._lock:
+            for cache in (self._daily, self._recent):
+                for key in [k for k in cache if (user_id is None or k[0] == user_id) and (symbol is None or k[1] == symbol)]:
+                    cache.pop(key, None)
+        self._bump_marker()
+
+    # -- cross-process marker -----------------------------------------------------
+    def _marker_version(self) -> Optional[int]:
+        if not self.marker_path:
+            return None
+        try:
+            return os.stat(self.marker_path).st_size
+        except OSError:
+            return None
+
+    def _sync_marker(self) -> None:
+        if not self.marker_path:
+            return
+        current = self._marker_version()
+        if current != self._marker_seen:
+            with self._lock:
+                self._daily.clear()
+                self._recent.clear()
+                self._marker_seen = current
+
+    def _bump_marker(self) -> None:
+        if not self.marker_path:
+            return
+        try:
+            # O_APPEND makes the write atomic, so the offset after it is our version.
+            fd = os.open(self.marker_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, b".")
+                version = os.lseek(fd, 0, os.SEEK_CUR)
+            finally:
+                os.close(fd)
+        except OSError:
+            return
+        with self._lock:
+            seen = self._marker_seen or 0
+            if version > seen + 1:
+                # Someone else bumped the marker since we last looked.
+                self._daily.clear()
+                self._recent.clear()
+            self._marker_seen = max(seen, version)
+
+
+trade_stats = TradeStatsCache()
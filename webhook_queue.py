@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Durable queue for TradingView webhook signals.
+
+The webhook used to run risk checks, order submits and close-fill waits
+before answering, so TradingView could time out and bursts of alerts piled up
+behind the web workers. Now the endpoint only validates the payload, stores it
+here and answers 202 with a job id; ``WebhookWorkerPool`` threads execute the
+jobs and write the outcome back, which ``/webhook/status/<job_id>`` reports.
+
+* The queue is a WAL-mode SQLite table, so several bot processes can share it
+  and jobs survive a restart. Claiming uses ``UPDATE ... RETURNING`` so a job
+  runs exactly once.
+* ``enqueue`` refuses a second job with the same dedup key inside the dedup
+  window (or ever, for an explicit ``Idempotency-Key``) in the same write
+  transaction, so duplicate alerts are dropped across processes as well.
+* Jobs still ``running`` for a process that no longer exists were
+  interrupted mid-order. They are marked ``interrupted`` rather than re-run:
+  an order may already have been sent.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+
+TERMINAL_STATUSES = ("done", "failed", "interrupted")
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class WebhookQueue:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> "_Transaction":
+        # One connection per thread, opened (and the schema ensured) on first use.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            raw = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            raw.row_factory = sqlite3.Row
+            conn = _Transaction(raw)
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS webhook_jobs ("
+                    "id TEXT PRIMARY KEY, dedup_key TEXT, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                    "http_status INTEGER, response TEXT, worker TEXT)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_webhook_jobs_status ON webhook_jobs (status, created_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_webhook_jobs_dedup ON webhook_jobs (dedup_key, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload: Dict, dedup_key: Optional[str] = None, dedup_window_sec: Optional[float] = None) -> Tuple[str, bool]:
+        """Store a job; returns ``(job_id, created)``.
+
+        With ``dedup_key`` an existing job with that key created within
+        ``dedup_window_sec`` (any age when None) is returned instead.
+        """
+        now = _now()
+        with self._connect() as conn:
+            if dedup_key:
+                since = now - dedup_window_sec if dedup_window_sec is not None else 0.0
+                row = conn.execute(
+                    "SELECT id FROM webhook_jobs WHERE dedup_key = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                    (dedup_key, since),
+                ).fetchone()
+                if row:
+                    return row["id"], False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO webhook_jobs (id, dedup_key, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, dedup_key, json.dumps(payload, default=str), now),
+            )
+        return job_id, True
+
+    def claim(self, worker: str) -> Optional[Tuple[str, Dict]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "UPDATE webhook_jobs SET status = 'running', started_at = ?, worker = ? "
+                "WHERE id = (SELECT id FROM webhook_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1) "
+                "RETURNING id, payload",
+                (_now(), worker),
+            ).fetchall()
+        if not rows:
+            return None
+        return rows[0]["id"], json.loads(rows[0]["payload"])
+
+    def finish(self, job_id: str, status: str, http_status: int, response: Dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE webhook_jobs SET status = ?, finished_at = ?, http_status = ?, response = ? WHERE id = ?",
+                (status, _now(), int(http_status), json.dumps(response, default=str), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM webhook_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        started, finished = row["started_at"], row["finished_at"]
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "http_status": row["http_status"],
+            "response": json.loads(row["response"]) if row["response"] else None,
+            "created_utc": _iso(row["created_at"]),
+            "started_utc": _iso(started),
+            "finished_utc": _iso(finished),
+            "queue_ms": round((started - row["created_at"]) * 1000.0, 1) if started else None,
+            "run_ms": round((finished - started) * 1000.0, 1) if started and finished else None,
+        }
+
+    def pending(self) -> int:
+        row = self._connect().execute("SELECT COUNT(*) AS n FROM webhook_jobs WHERE status = 'queued'").fetchone()
+        return int(row["n"])
+
+    def mark_interrupted(self) -> int:
+        """Fail jobs left ``running`` by a process that is no longer alive."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, worker FROM webhook_jobs WHERE status = 'running'").fetchall()
+            dead = [row["id"] for row in rows if not _worker_alive(row["worker"])]
+            for job_id in dead:
+                conn.execute(
+                    "UPDATE webhook_jobs SET status = 'interrupted', finished_at = ?, http_status = 500, response = ? WHERE id = ?",
+                    (_now(), json.dumps({"error": "interrupted before completion"}), job_id),
+                )
+        return len(dead)
+
+    def prune(self, max_age_sec: float) -> int:
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"DELETE FROM webhook_jobs WHERE status IN ({','.join('?' * len(TERMINAL_STATUSES))}) AND created_at < ?",
+                (*TERMINAL_STATUSES, _now() - max_age_sec),
+            )
+        return cur.rowcount
+
+
+def _worker_alive(worker: Optional[str]) -> bool:
+    try:
+        pid = int(str(worker).split(":", 1)[0])
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Transaction:
+    """sqlite3 connection whose ``with`` block is a ``BEGIN IMMEDIATE`` transaction."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def execute(self, *args):
+        return self._conn.execute(*args)
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class WebhookWorkerPool:
+    """Threads that run queued jobs through ``handler(payload) -> (body, http_status)``."""
+
+    def __init__(self, queue: WebhookQueue, handler: Callable[[Dict], Tuple[Dict, int]], workers: int = 2, logger=None,
+                 idle_poll_sec: float = 1.0, retention_sec: float = 72 * 3600):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.logger = logger
+        self.idle_poll_sec = idle_poll_sec
+        self.retention_sec = retention_sec
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        interrupted = self.queue.mark_interrupted()
+        if interrupted and self.logger:
+            self.logger.warning(f"[WEBHOOK_QUEUE] Marked {interrupted} job(s) interrupted by a previous shutdown.")
+        if self.retention_sec > 0:
+            self.queue.prune(self.retention_sec)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self) -> None:
+        with self._wake:
+            self._wake.notify()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        worker = f"{os.getpid()}:{threading.current_thread().name}"
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[WEBHOOK_QUEUE] Claim failed: {e}")
+                job = None
+            if job is None:
+                # Other processes enqueue too, so poll as well as wait for notify().
+                with self._wake:
+                    self._wake.wait(self.idle_poll_sec)
+                continue
+            job_id, payload = job
+            try:
+                body, http_status = self.handler(payload)
+                status = "done" if http_status < 400 else "failed"
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[WEBHOOK_QUEUE] Job {job_id} failed: {e}", exc_info=True)
+                body, http_status, status = {"error": "Internal error while processing webhook"}, 500, "failed"
+            try:
+                self.queue.finish(job_id, status, http_status, body)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[WEBHOOK_QUEUE] Could not store result of job {job_id}: {e}")